@@ -0,0 +1,149 @@
+# -*- coding=utf-8 -*-
+"""Asyncio versions of :func:`~requirementslib.models.dependencies.get_dependencies`.
+
+This module requires Python 3.5 or newer.  The dependency cache is loaded in
+an executor before any lookups are made, after that the cache backed getters
+are answered right away on the event loop.  The JSON API and the package index
+are queried in an executor so that the event loop is never blocked.
+"""
+import asyncio
+import functools
+
+from . import dependencies
+
+# Python 3.7 has get_running_loop(), which can't pick up a loop other than the
+# one running the current coroutine.
+_get_running_loop = getattr(asyncio, "get_running_loop", asyncio.get_event_loop)
+
+
+class _AsyncDependencyGetter(object):
+    """Runs the getter chain of :func:`get_dependencies` for many requirements.
+
+    At most *max_concurrency* lookups hit the network at once.  Lookups which
+    fall back to the package index are also run one at a time, since pip's
+    resolver relies on process wide state.
+    """
+
+    def __init__(self, sources=None, max_concurrency=None, executor=None):
+        self.sources = sources
+        self.executor = executor
+        if max_concurrency is None:
+            max_concurrency = dependencies.JSON_API_WORKERS
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.index_lock = asyncio.Lock()
+        self._pip_options = None
+        #: Dependencies fetched from the JSON API, see :meth:`write_cache`
+        self.fetched = {}
+
+    async def _run(self, func, *args, **kwargs):
+        loop = _get_running_loop()
+        return await loop.run_in_executor(
+            self.executor, functools.partial(func, *args, **kwargs)
+        )
+
+    async def load_cache(self):
+        """Load the dependency cache without blocking the event loop."""
+        cache = dependencies.DEPENDENCY_CACHE
+        await self._run(cache._ensure_loaded)
+
+    def _write_cache(self, fetched):
+        with dependencies.DEPENDENCY_CACHE.transaction():
+            for ireq, reqs in fetched.values():
+                dependencies.DEPENDENCY_CACHE[ireq] = reqs
+
+    async def write_cache(self):
+        """Store everything fetched from the JSON API in the dependency cache at once."""
+        fetched, self.fetched = self.fetched, {}
+        if fetched:
+            await self._run(self._write_cache, fetched)
+
+    async def get_dependencies(self, ireq):
+        ireq = dependencies._as_install_requirement(ireq)
+        for getter in (
+            dependencies.get_dependencies_from_snapshot,
+            dependencies.get_dependencies_from_cache,
+            dependencies.get_dependencies_from_wheel_cache,
+        ):
+            deps = getter(ireq)
+            if deps is not None:
+                return deps
+        key = dependencies.DEPENDENCY_CACHE.as_cache_key(ireq)
+        if key in self.fetched:
+            return set(self.fetched[key][1])
+        if dependencies._can_use_remote_metadata(ireq):
+            async with self.semaphore:
+                reqs = await self._run(dependencies._fetch_dependencies_from_json, ireq)
+            if reqs is not None:
+                self.fetched[key] = (ireq, reqs)
+                return set(reqs)
+        if self._pip_options is None:
+            self._pip_options = dependencies.get_pip_options(sources=self.sources)
+        async with self.semaphore:
+            deps = await self._run(
+                dependencies.get_dependencies_from_wheel_metadata, ireq,
+                pip_options=self._pip_options,
+            )
+        if deps is not None:
+            return deps
+        async with self.semaphore:
+            async with self.index_lock:
+                deps = await self._run(
+                    dependencies.get_dependencies_from_index, ireq,
+                    pip_options=self._pip_options,
+                )
+        if deps is not None:
+            return deps
+        raise RuntimeError('failed to get dependencies for {}'.format(ireq))
+
+
+async def aget_dependencies(ireq, sources=None, parent=None, executor=None):
+    """Get all dependencies for a given install requirement without blocking.
+
+    :param ireq: A single InstallRequirement
+    :type ireq: :class:`~pip._internal.req.req_install.InstallRequirement`
+    :param sources: Pipfile-formatted sources, defaults to None
+    :type sources: list[dict], optional
+    :param parent: The parent of this list of dependencies, defaults to None
+    :type parent: :class:`~pip._internal.req.req_install.InstallRequirement`
+    :param executor: The executor to run network lookups in, defaults to the
+        event loop's default executor
+    :type executor: :class:`concurrent.futures.Executor`, optional
+    :return: A set of dependency lines for generating new InstallRequirements.
+    :rtype: set(str)
+    """
+    getter = _AsyncDependencyGetter(sources=sources, executor=executor)
+    await getter.load_cache()
+    try:
+        return await getter.get_dependencies(ireq)
+    finally:
+        await getter.write_cache()
+
+
+async def aget_dependencies_many(
+    ireqs, sources=None, max_concurrency=None, executor=None
+):
+    """Get the dependencies of many install requirements concurrently.
+
+    :param ireqs: The requirements to look up
+    :type ireqs: list[:class:`~pip._internal.req.req_install.InstallRequirement`]
+    :param sources: Pipfile-formatted sources, defaults to None
+    :type sources: list[dict], optional
+    :param int max_concurrency: The number of lookups allowed to run at once,
+        defaults to :data:`~requirementslib.models.dependencies.JSON_API_WORKERS`
+    :param executor: The executor to run network lookups in, defaults to the
+        event loop's default executor
+    :type executor: :class:`concurrent.futures.Executor`, optional
+    :return: The sets of dependency lines, in the same order as *ireqs*
+    :rtype: list[set(str)]
+    """
+    getter = _AsyncDependencyGetter(
+        sources=sources, max_concurrency=max_concurrency, executor=executor
+    )
+    await getter.load_cache()
+    # The results are written in one go at the end rather than in a transaction
+    # around the whole batch, which would also hold back the writes of other
+    # threads for as long as the batch runs.
+    try:
+        return await asyncio.gather(*[getter.get_dependencies(ireq) for ireq in ireqs])
+    finally:
+        await getter.write_cache()
@@ -2,24 +2,83 @@
 from __future__ import absolute_import, print_function, unicode_literals
 
 import atexit
+import contextlib
 import copy
+import functools
 import hashlib
 import json
 import os
+import sqlite3
+import stat
 import sys
+import tempfile
+import threading
+import time
+import weakref
+from multiprocessing.pool import ThreadPool
 
+import six
 import vistir
+from six.moves.urllib import parse as urllib_parse
 
 from appdirs import user_cache_dir
 from pip_shims.shims import FAVORITE_HASH, SafeFileCache
-from packaging.requirements import Requirement
+from packaging.markers import Variable
+from packaging.requirements import InvalidRequirement, Requirement
+from packaging.utils import canonicalize_name
 
-from .utils import as_tuple, key_from_req, lookup_table, get_pinned_version
+from .metrics import get_cache_metrics
+from .tracing import trace_count, trace_span
+from .utils import (
+    as_tuple, find_all_candidates, get_candidate_link, get_pinned_version, key_from_req,
+    lookup_table
+)
 
 from ..exceptions import FileExistsError
 
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
 
 CACHE_DIR = os.environ.get("PIPENV_CACHE_DIR", user_cache_dir("pipenv"))
+CACHE_BACKEND = os.environ.get("REQUIREMENTSLIB_CACHE_BACKEND", "json")
+#: Seconds to wait for another process to release a cache database
+CACHE_LOCK_TIMEOUT = 30
+#: Default limits for the on-disk caches, unset (0) means unbounded
+CACHE_MAX_ENTRIES = int(os.environ.get("REQUIREMENTSLIB_CACHE_MAX_ENTRIES", 0))
+CACHE_MAX_AGE = int(os.environ.get("REQUIREMENTSLIB_CACHE_MAX_AGE", 0))
+CACHE_MAX_SIZE = int(os.environ.get("REQUIREMENTSLIB_CACHE_MAX_SIZE", 0))
+#: Hosts which never change the file at a URL, such as PyPI's file storage
+IMMUTABLE_FILE_HOSTS = tuple(
+    host for host in os.environ.get(
+        "REQUIREMENTSLIB_IMMUTABLE_FILE_HOSTS", "files.pythonhosted.org"
+    ).split(",") if host
+)
+#: The default number of threads used to hash artifacts
+HASH_WORKERS = int(os.environ.get("REQUIREMENTSLIB_HASH_WORKERS", 8))
+#: Seconds to trust the validators an artifact was last served with before
+#: asking the server again
+HASH_VALIDATORS_TTL = int(os.environ.get("REQUIREMENTSLIB_HASH_VALIDATORS_TTL", 86400))
+#: Seconds to keep the candidates found on an index on disk, unset (0) keeps
+#: them in memory for a single resolution only
+CANDIDATE_CACHE_TTL = int(os.environ.get("REQUIREMENTSLIB_CANDIDATE_CACHE_TTL", 0))
+
+#: Cache file formats which can be read: 1 stores raw requirement lines and 2
+#: stores pre-parsed dependency records, see :func:`make_dependency_record`.
+CACHE_FORMATS = (1, 2)
+
+_MISSING = object()
+#: Every cache which may have changes to write when the interpreter exits
+_OPEN_CACHES = weakref.WeakSet()
+
+
+@atexit.register
+def _close_open_caches():
+    for cache in list(_OPEN_CACHES):
+        cache.close()
 
 
 # Pip-tools cache implementation
@@ -44,109 +103,1316 @@ def read_cache_file(cache_file_path):
             raise CorruptCacheError(cache_file_path)
 
         # Check version and load the contents
-        assert doc['__format__'] == 1, 'Unknown cache file format'
+        assert doc['__format__'] in CACHE_FORMATS, 'Unknown cache file format'
         return doc['dependencies']
 
 
-class DependencyCache(object):
+@contextlib.contextmanager
+def _locked(path):
+    """Hold an exclusive advisory lock on ``<path>.lock`` for the duration of the block.
+
+    The lock is shared between processes, so only one writer at a time can
+    update the cache file at *path*.
     """
-    Creates a new persistent dependency cache for the current Python version.
+    with open("{0}.lock".format(path), "a+") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        else:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _replace_file(source, target):
+    if hasattr(os, "replace"):
+        os.replace(source, target)
+        return
+    # No os.replace() on Python 2, and os.rename() won't overwrite on Windows.
+    if os.name == "nt" and os.path.exists(target):
+        os.remove(target)
+    os.rename(source, target)
+
+
+def _file_fingerprint(*paths):
+    """Identify the current content of files without reading them.
+
+    Files are replaced on every write, so their inode, size and modification
+    time change whenever they are written.
+
+    :return: A string, or None if none of the files exist
+    :rtype: str or None
+    """
+    parts = []
+    for path in paths:
+        try:
+            file_stat = os.stat(path)
+        except OSError:
+            continue
+        mtime = getattr(file_stat, "st_mtime_ns", file_stat.st_mtime)
+        parts.append("{0}:{1}:{2}:{3}".format(
+            os.path.basename(path), file_stat.st_ino, file_stat.st_size, mtime
+        ))
+    if not parts:
+        return None
+    return hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()
+
+
+def _record_write(writes, unit, bases, fingerprint, merged):
+    """Add a write of *unit* to *writes*, see :meth:`JSONCacheBackend.pop_writes`.
+
+    Writes which haven't been popped yet are combined into one.
+    """
+    if unit in writes:
+        bases, _, earlier = writes[unit]
+        merged = None if earlier is None or merged is None else earlier + merged
+    writes[unit] = (bases, fingerprint, merged)
+
+
+def write_cache_file(cache_file_path, doc):
+    """Write *doc* to *cache_file_path* as JSON.
+
+    The document is written to a temporary file in the same directory which is
+    then renamed over the cache file, so readers never observe a partially
+    written cache.
+    """
+    fd, temp_path = tempfile.mkstemp(
+        dir=os.path.dirname(cache_file_path), prefix=".__atomic-write"
+    )
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(doc, f, sort_keys=True)
+        os.chmod(temp_path, stat.S_IWUSR | stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+        _replace_file(temp_path, cache_file_path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+class JSONCacheBackend(object):
+    """Stores cache entries in a single JSON document.
+
+    The whole document is loaded into memory on first access.  Local changes
+    are tracked so that :meth:`write` can take the cache file lock, re-read
+    whatever other processes have written in the meantime and merge the
+    changes on top before replacing the file.
+
+    Until the file exists, the contents of *migrate_from* are used instead.
+
+    The whole document is one unit of storage, named after the file, see
+    :meth:`fingerprints` and :meth:`pop_writes`.
+    """
+
+    def __init__(self, path, migrate_from=None, format_version=1):
+        self.path = path
+        self.migrate_from = migrate_from
+        self.format_version = format_version
+        self.unit = os.path.basename(path)
+        self._data = None
+        self._changes = {}
+        self._cleared = False
+        #: The fingerprint of the file the data in memory was read from
+        self._fingerprint = None
+        self._writes = {}
+
+    @classmethod
+    def for_cache_file(cls, cache_file, migrate_from=None, format_version=1):
+        return cls(cache_file, migrate_from=migrate_from, format_version=format_version)
+
+    @property
+    def loaded(self):
+        return self._data is not None
+
+    @property
+    def data(self):
+        if self._data is None:
+            self.load()
+        return self._data
+
+    def _source_path(self):
+        if not os.path.exists(self.path) and self.migrate_from and \
+                os.path.exists(self.migrate_from):
+            return self.migrate_from
+        return self.path
+
+    def _read(self):
+        """Returns the contents of the cache file and its fingerprint."""
+        path = self._source_path()
+        # Taken first, so a file replaced while it is read looks changed later on
+        fingerprint = _file_fingerprint(path)
+        if fingerprint is None:
+            return {}, None
+        return read_cache_file(path), fingerprint
+
+    def load(self):
+        data, self._fingerprint = self._read()
+        # Keep any changes which haven't been written yet.
+        self._data = self._apply_changes({} if self._cleared else data)
+
+    def _merged_entries(self, data):
+        """The entries of *data* which differ from the ones in memory without
+        being changed here, as ``(name, key, old_value, new_value)`` tuples."""
+        merged = []
+        for name in set(data) | set(self._data):
+            old_entries = self._data.get(name, {})
+            new_entries = data.get(name, {})
+            for key in set(old_entries) | set(new_entries):
+                old, new = old_entries.get(key), new_entries.get(key)
+                if old != new and (name, key) not in self._changes:
+                    merged.append((name, key, old, new))
+        return merged
+
+    def _apply_changes(self, data):
+        for (name, key), value in self._changes.items():
+            if value is _MISSING:
+                data.get(name, {}).pop(key, None)
+            else:
+                data.setdefault(name, {})[key] = value
+        return data
+
+    def write(self, compact=False, remove_empty=False):
+        bases = (self._fingerprint,)
+        with _locked(self.path):
+            if self._cleared:
+                data, merged = {}, []
+            else:
+                try:
+                    data, fingerprint = self._read()
+                except CorruptCacheError:
+                    # We are about to replace it anyway.
+                    data, fingerprint = {}, None
+                if self._data is None:
+                    merged = None
+                elif fingerprint == self._fingerprint:
+                    merged = []
+                else:
+                    merged = self._merged_entries(data)
+                    bases += (fingerprint,)
+            data = self._apply_changes(data)
+            if compact:
+                data = {name: entries for name, entries in data.items() if entries}
+            if remove_empty and not data:
+                if os.path.exists(self.path):
+                    os.remove(self.path)
+            else:
+                doc = {
+                    '__format__': self.format_version,
+                    'dependencies': data,
+                }
+                write_cache_file(self.path, doc)
+            self._fingerprint = _file_fingerprint(self.path)
+        _record_write(self._writes, self.unit, bases, self._fingerprint, merged)
+        self._data = data
+        self._changes = {}
+        self._cleared = False
+
+    def flush(self):
+        if self._changes or self._cleared:
+            self.write()
+
+    def compact(self, remove_empty=False):
+        """Rewrite the cache file without projects that have no entries left.
+
+        :param bool remove_empty: Delete the file instead if nothing is left
+        """
+        self.write(compact=True, remove_empty=remove_empty)
+
+    def close(self):
+        self.flush()
+
+    def get(self, name, key, default=None):
+        return self.data.get(name, {}).get(key, default)
+
+    def contains(self, name, key):
+        return key in self.data.get(name, {})
+
+    def entries(self, name):
+        return dict(self.data.get(name, {}))
+
+    def set(self, name, key, value):
+        self.data.setdefault(name, {})[key] = value
+        self._changes[(name, key)] = value
+
+    def delete(self, name, key):
+        try:
+            del self.data[name][key]
+        except KeyError:
+            return False
+        self._changes[(name, key)] = _MISSING
+        return True
+
+    def clear(self):
+        self._data = {}
+        self._changes = {}
+        self._cleared = True
+
+    def fingerprints(self):
+        """The current fingerprint of each unit of storage on disk, by unit name.
+
+        :rtype: dict[str, str]
+        """
+        fingerprint = _file_fingerprint(self._source_path())
+        return {self.unit: fingerprint} if fingerprint is not None else {}
+
+    def loaded_fingerprints(self):
+        """The fingerprints of the units of storage the data in memory was read from.
+
+        :rtype: dict[str, str]
+        """
+        if self._data is None or self._fingerprint is None:
+            return {}
+        return {self.unit: self._fingerprint}
+
+    def pop_writes(self):
+        """Returns and forgets the units of storage written since the last call.
+
+        Each unit maps to a ``(bases, fingerprint, merged)`` tuple.  The unit's
+        content on disk is what was written on top of a file with any of the
+        *bases* fingerprints, *fingerprint* is the one it has now and *merged*
+        holds the ``(name, key, old_value, new_value)`` entries written by
+        others which were merged in, or None if they aren't known.
+
+        :rtype: dict[str, tuple]
+        """
+        writes, self._writes = self._writes, {}
+        return writes
+
+    def count(self):
+        """The number of entries, or None if the document isn't loaded yet."""
+        if self._data is None:
+            return None
+        return sum(len(entries) for entries in self._data.values())
+
+    def items(self):
+        for name, entries in self.data.items():
+            for key, value in entries.items():
+                yield name, key, value
+
+    def as_dict(self):
+        return self.data
+
+
+class SQLiteCacheBackend(object):
+    """Stores cache entries as rows in an SQLite database.
+
+    Rows are keyed on ``(name, key)`` so lookups are point queries and writes
+    are single-row upserts; nothing is loaded into memory up front.  Changes
+    are committed by :meth:`write`.  SQLite's own locking makes the database
+    safe to share between processes, writers wait up to
+    :data:`CACHE_LOCK_TIMEOUT` seconds for each other.
+
+    If the database does not exist yet and *migrate_from* points at an
+    existing JSON cache file, its contents are imported when the database is
+    first opened.
+    """
+
+    schema = (
+        "CREATE TABLE IF NOT EXISTS entries ("
+        "name TEXT NOT NULL, "
+        "key TEXT NOT NULL, "
+        "value TEXT NOT NULL, "
+        "PRIMARY KEY (name, key))"
+    )
+
+    def __init__(self, path, migrate_from=None):
+        self.path = path
+        self.migrate_from = migrate_from
+        self.unit = os.path.basename(path)
+        self._connection = None
+        self._dirty = False
+        self._writes = {}
+        self._lock = threading.RLock()
+
+    @classmethod
+    def for_cache_file(cls, cache_file, migrate_from=None, format_version=1):
+        path = "{0}.sqlite3".format(os.path.splitext(cache_file)[0])
+        if os.path.exists(cache_file) or not migrate_from:
+            migrate_from = cache_file
+        return cls(path, migrate_from=migrate_from)
+
+    @property
+    def connection(self):
+        with self._lock:
+            if self._connection is None:
+                needs_migration = (
+                    not os.path.exists(self.path) and self.migrate_from and
+                    os.path.exists(self.migrate_from)
+                )
+                self._connection = sqlite3.connect(
+                    self.path, timeout=CACHE_LOCK_TIMEOUT, check_same_thread=False
+                )
+                self._connection.execute(self.schema)
+                self._connection.commit()
+                if needs_migration:
+                    migrate_json_cache(self.migrate_from, self)
+            return self._connection
+
+    def _execute(self, query, params=()):
+        with self._lock:
+            return self.connection.execute(query, params)
+
+    def load(self):
+        pass
+
+    def write(self):
+        with self._lock:
+            # Rows committed by others are read as they are, nothing is merged
+            bases = (_file_fingerprint(self.path),)
+            self.connection.commit()
+            self._dirty = False
+            _record_write(
+                self._writes, self.unit, bases, _file_fingerprint(self.path), []
+            )
+
+    def flush(self):
+        if self._dirty:
+            self.write()
+
+    def compact(self):
+        """Commit pending changes and reclaim the space left by deleted rows."""
+        with self._lock:
+            self.write()
+            self.connection.execute("VACUUM")
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self.flush()
+                self._connection.close()
+                self._connection = None
+
+    def get(self, name, key, default=None):
+        row = self._execute(
+            "SELECT value FROM entries WHERE name = ? AND key = ?", (name, key)
+        ).fetchone()
+        if row is None:
+            return default
+        return json.loads(row[0])
+
+    def contains(self, name, key):
+        row = self._execute(
+            "SELECT 1 FROM entries WHERE name = ? AND key = ?", (name, key)
+        ).fetchone()
+        return row is not None
+
+    def entries(self, name):
+        rows = self._execute(
+            "SELECT key, value FROM entries WHERE name = ?", (name,)
+        ).fetchall()
+        return {key: json.loads(value) for key, value in rows}
+
+    def set(self, name, key, value):
+        self._execute(
+            "INSERT OR REPLACE INTO entries (name, key, value) VALUES (?, ?, ?)",
+            (name, key, json.dumps(value, sort_keys=True)),
+        )
+        self._dirty = True
+
+    def delete(self, name, key):
+        cursor = self._execute(
+            "DELETE FROM entries WHERE name = ? AND key = ?", (name, key)
+        )
+        if not cursor.rowcount:
+            return False
+        self._dirty = True
+        return True
+
+    def clear(self):
+        self._execute("DELETE FROM entries")
+        self._dirty = True
+
+    def fingerprints(self):
+        """See :meth:`JSONCacheBackend.fingerprints`, the database is one unit."""
+        self.connection  # Opening the database imports migrate_from
+        return {self.unit: _file_fingerprint(self.path)}
+
+    def loaded_fingerprints(self):
+        """Nothing is kept in memory, so this is the same as :meth:`fingerprints`."""
+        return self.fingerprints()
+
+    def pop_writes(self):
+        """See :meth:`JSONCacheBackend.pop_writes`."""
+        with self._lock:
+            writes, self._writes = self._writes, {}
+        return writes
+
+    def count(self):
+        """The number of entries, or None if the database isn't open yet."""
+        if self._connection is None:
+            return None
+        return self._execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def items(self):
+        rows = self._execute("SELECT name, key, value FROM entries").fetchall()
+        for name, key, value in rows:
+            yield name, key, json.loads(value)
+
+    def as_dict(self):
+        data = {}
+        for name, key, value in self.items():
+            data.setdefault(name, {})[key] = value
+        return data
+
+
+class ShardedJSONCacheBackend(object):
+    """Stores cache entries in many small JSON documents inside a directory.
+
+    Entries are grouped into shards, either one per canonicalized project name
+    (``layout="name"``) or by the first two hex digits of a hash of the name
+    (``layout="hash"``).  Each shard is a :class:`JSONCacheBackend`, so it is
+    only read when one of its projects is looked up, and it is locked and
+    merged on its own when written.
+
+    If the directory does not exist yet and *migrate_from* points at an
+    existing JSON cache file, its contents are split into shards the first
+    time the cache is used.
+    """
+
+    layouts = ("name", "hash")
+
+    def __init__(self, path, layout="name", migrate_from=None, format_version=1):
+        if layout not in self.layouts:
+            raise ValueError("Unknown cache layout: {0!r}".format(layout))
+        self.path = path
+        self.layout = layout
+        self.migrate_from = migrate_from
+        self.format_version = format_version
+        self._shards = {}
+        self._ready = False
+
+    @classmethod
+    def for_cache_file(cls, cache_file, layout="name", migrate_from=None, format_version=1):
+        path = os.path.splitext(cache_file)[0]
+        if os.path.exists(cache_file) or not migrate_from:
+            migrate_from = cache_file
+        return cls(
+            path, layout=layout, migrate_from=migrate_from, format_version=format_version
+        )
+
+    def _ensure_dir(self):
+        if self._ready:
+            return
+        needs_migration = (
+            not os.path.isdir(self.path) and self.migrate_from and
+            os.path.exists(self.migrate_from)
+        )
+        vistir.path.mkdir_p(self.path)
+        self._ready = True
+        if needs_migration:
+            migrate_json_cache(self.migrate_from, self)
+
+    def _shard_name(self, name):
+        name = canonicalize_name(name)
+        if self.layout == "hash":
+            return hashlib.sha1(name.encode("utf-8")).hexdigest()[:2]
+        return name
+
+    def _get_shard(self, shard_name):
+        try:
+            return self._shards[shard_name]
+        except KeyError:
+            path = os.path.join(self.path, "{0}.json".format(shard_name))
+            shard = JSONCacheBackend(path, format_version=self.format_version)
+            self._shards[shard_name] = shard
+            return shard
+
+    def shard(self, name):
+        """The :class:`JSONCacheBackend` holding the entries for project *name*."""
+        self._ensure_dir()
+        return self._get_shard(self._shard_name(name))
+
+    def _shards_by_name(self):
+        self._ensure_dir()
+        for filename in os.listdir(self.path):
+            if filename.endswith(".json"):
+                self._get_shard(filename[:-len(".json")])
+        return self._shards
+
+    def shards(self):
+        """All of the shards currently on disk or in memory."""
+        return list(self._shards_by_name().values())
+
+    def load(self):
+        for shard in list(self._shards.values()):
+            shard.load()
+
+    def write(self):
+        for shard in list(self._shards.values()):
+            shard.flush()
+
+    def flush(self):
+        self.write()
+
+    def compact(self):
+        """Rewrite every shard without dead entries and delete empty shards."""
+        for shard_name, shard in list(self._shards_by_name().items()):
+            shard.compact(remove_empty=True)
+            if not shard.data:
+                del self._shards[shard_name]
+
+    def close(self):
+        self.flush()
+
+    def get(self, name, key, default=None):
+        return self.shard(name).get(name, key, default)
+
+    def contains(self, name, key):
+        return self.shard(name).contains(name, key)
+
+    def entries(self, name):
+        return self.shard(name).entries(name)
+
+    def set(self, name, key, value):
+        self.shard(name).set(name, key, value)
+
+    def delete(self, name, key):
+        return self.shard(name).delete(name, key)
+
+    def clear(self):
+        for shard in self.shards():
+            shard.clear()
+
+    def fingerprints(self):
+        """See :meth:`JSONCacheBackend.fingerprints`, each shard is a unit."""
+        self._ensure_dir()
+        fingerprints = {}
+        for filename in os.listdir(self.path):
+            if filename.endswith(".json"):
+                fingerprint = _file_fingerprint(os.path.join(self.path, filename))
+                if fingerprint is not None:
+                    fingerprints[filename] = fingerprint
+        return fingerprints
+
+    def loaded_fingerprints(self):
+        """See :meth:`JSONCacheBackend.loaded_fingerprints`."""
+        fingerprints = {}
+        for shard in list(self._shards.values()):
+            fingerprints.update(shard.loaded_fingerprints())
+        return fingerprints
+
+    def pop_writes(self):
+        """See :meth:`JSONCacheBackend.pop_writes`."""
+        writes = {}
+        for shard in list(self._shards.values()):
+            writes.update(shard.pop_writes())
+        return writes
+
+    def count(self):
+        """Always None, counting the entries means reading every shard."""
+        return None
+
+    def items(self):
+        for shard in self.shards():
+            for item in shard.items():
+                yield item
+
+    def as_dict(self):
+        data = {}
+        for name, key, value in self.items():
+            data.setdefault(name, {})[key] = value
+        return data
+
+
+#: Factories for the available storage backends, called with the path to the
+#: JSON cache file and the ``migrate_from`` and ``format_version`` options.
+CACHE_BACKENDS = {
+    "json": JSONCacheBackend.for_cache_file,
+    "sqlite": SQLiteCacheBackend.for_cache_file,
+    "sharded": ShardedJSONCacheBackend.for_cache_file,
+    "sharded-hash": functools.partial(
+        ShardedJSONCacheBackend.for_cache_file, layout="hash"
+    ),
+}
+
+
+def get_cache_backend(backend, cache_file, **options):
+    """Build a storage backend for the given cache file.
+
+    :param backend: The name of a registered backend, a backend instance, or
+        None to use the ``REQUIREMENTSLIB_CACHE_BACKEND`` default
+    :param str cache_file: The path to the JSON cache file
+    :param options: Passed on to the backend factory
+    :return: A storage backend
+    """
+    if backend is None:
+        backend = CACHE_BACKEND
+    if not isinstance(backend, six.string_types):
+        return backend
+    try:
+        backend_factory = CACHE_BACKENDS[backend]
+    except KeyError:
+        raise ValueError("Unknown cache backend: {0!r}".format(backend))
+    return backend_factory(cache_file, **options)
+
+
+def migrate_json_cache(cache_file_path, backend):
+    """Copy every entry of a ``__format__: 1`` JSON cache file into *backend*.
+
+    :param str cache_file_path: The path to the JSON cache file
+    :param backend: The storage backend to import the entries into
+    :return: The number of entries imported
+    :rtype: int
+    """
+    count = 0
+    for name, entries in read_cache_file(cache_file_path).items():
+        for key, value in entries.items():
+            backend.set(name, key, value)
+            count += 1
+    backend.write()
+    return count
+
+
+def _marker_has_extra(markers):
+    for marker in markers:
+        if isinstance(marker, list):
+            if _marker_has_extra(marker):
+                return True
+        elif isinstance(marker, tuple):
+            if any(isinstance(m, Variable) and m.value == "extra" for m in marker):
+                return True
+    return False
+
+
+def make_dependency_record(line):
+    """Parse a dependency line into a record for format 2 dependency caches.
+
+    The record holds everything needed to use a cached dependency without
+    parsing it again::
+
+        >>> make_dependency_record('PySocks!=1.5.7,>=1.5.6; extra == "socks"')
+        {'line': 'PySocks!=1.5.7,>=1.5.6; extra == "socks"', 'name': 'pysocks',
+         'specifier': '!=1.5.7,>=1.5.6', 'extras': [], 'marker': 'extra == "socks"',
+         'has_extra_marker': True}
+
+    :param str line: A PEP 508 requirement line
+    :raises ValueError: If the line can't be parsed
+    :return: A dependency record
+    :rtype: dict
+    """
+    try:
+        req = Requirement(line)
+    except InvalidRequirement as e:
+        raise ValueError("Invalid dependency {0!r}: {1}".format(line, e))
+    return {
+        "line": line,
+        "name": canonicalize_name(req.name),
+        "specifier": str(req.specifier),
+        "extras": sorted(req.extras),
+        "marker": str(req.marker) if req.marker else "",
+        "has_extra_marker": bool(req.marker) and _marker_has_extra(req.marker._markers),
+    }
+
+
+def make_unparsed_dependency_record(line):
+    """Make a record for a dependency line which isn't a PEP 508 requirement,
+    such as a URL or an editable.
+
+    Only the ``line`` is set, the parsed fields are None.
+
+    :param str line: A dependency line
+    :return: A dependency record
+    :rtype: dict
+    """
+    return {
+        "line": line,
+        "name": None,
+        "specifier": None,
+        "extras": None,
+        "marker": None,
+        "has_extra_marker": None,
+    }
+
+
+def _as_dependency_record(value):
+    if not isinstance(value, six.string_types):
+        return value
+    try:
+        return make_dependency_record(value)
+    except ValueError:
+        return make_unparsed_dependency_record(value)
+
+
+class _JSONCache(object):
+    """A persistent cache backed by a JSON file.
+
     The cache file is written to the appropriate user cache dir for the
     current platform, i.e.
 
         ~/.cache/pip-tools/depcache-pyX.Y.json
 
     Where X.Y indicates the Python version.
-    """
-    def __init__(self, cache_dir=None):
-        if cache_dir is None:
-            cache_dir = CACHE_DIR
-        if not vistir.compat.Path(CACHE_DIR).absolute().is_dir():
-            try:
-                vistir.path.mkdir_p(os.path.abspath(cache_dir))
-            except (FileExistsError, OSError):
-                pass
-
-        py_version = '.'.join(str(digit) for digit in sys.version_info[:2])
-        cache_filename = 'depcache-py{}.json'.format(py_version)
 
+    Storage is delegated to a backend, see :data:`CACHE_BACKENDS`.  The
+    default JSON backend keeps the file above, the ``sqlite`` backend stores
+    entries in a database next to it and the ``sharded`` and ``sharded-hash``
+    backends keep one small file per project (or per hash prefix) in a
+    directory next to it.  All of them import the JSON file on first use.
+
+    Every mutation is written straight to disk unless it happens inside of a
+    :meth:`transaction`, in which case writes are buffered and only
+    committed when the outermost transaction exits.  Any pending changes of
+    caches which are still alive are also flushed when the interpreter exits.
+    Changes are serialized with a lock, so a cache can be updated from several
+    threads.
+
+    When *max_entries* or *max_age* (in seconds) are set, the time each entry
+    was last used is recorded in an access log stored next to the cache, and
+    the least recently used entries are evicted by :meth:`prune` when the
+    interpreter exits.  Both default to the ``REQUIREMENTSLIB_CACHE_MAX_ENTRIES``
+    and ``REQUIREMENTSLIB_CACHE_MAX_AGE`` environment variables.
+
+    Hits, misses, evictions and the load and write times are recorded in
+    :attr:`metrics`, see :mod:`~requirementslib.models.metrics`.  The number of
+    entries is kept up to date as they are added and removed, see
+    :attr:`entry_count`.
+    """
+    filename_format = None
+    #: The name the metrics of the cache are recorded under
+    metrics_name = None
+    #: A previous cache file to read from until the cache is first written
+    legacy_filename_format = None
+    #: The cache format version written by the JSON backends
+    format_version = 1
+
+    def __init__(self, cache_dir=CACHE_DIR, backend=None, max_entries=None, max_age=None):
+        try:
+            vistir.path.mkdir_p(os.path.abspath(cache_dir))
+        except (FileExistsError, OSError):
+            pass
+        python_version = ".".join(str(digit) for digit in sys.version_info[:2])
+        cache_filename = self.filename_format.format(
+            python_version=python_version,
+        )
         self._cache_file = os.path.join(cache_dir, cache_filename)
-        self._cache = None
+        legacy_cache_file = None
+        if self.legacy_filename_format:
+            legacy_cache_file = os.path.join(
+                cache_dir,
+                self.legacy_filename_format.format(python_version=python_version),
+            )
+        self._transactions = threading.local()
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._unwritten = False
+        self._entry_count = None
+        self.metrics = get_cache_metrics(self.metrics_name or type(self).__name__)
+        self.backend = get_cache_backend(
+            backend, self._cache_file, migrate_from=legacy_cache_file,
+            format_version=self.format_version,
+        )
+        self.max_entries = CACHE_MAX_ENTRIES if max_entries is None else max_entries
+        self.max_age = CACHE_MAX_AGE if max_age is None else max_age
+        self._backend_name = backend
+        self._access_log = None
+        if self.max_entries or self.max_age:
+            self._access_log = self.access_log
+        _OPEN_CACHES.add(self)
 
     @property
     def cache(self):
+        """A dictionary of the cached contents, keyed by name and then version.
+
+        For the JSON backend this is the actual in-memory cache and is lazily
+        loaded from disk.
         """
-        The dictionary that is the actual in-memory cache.  This property
-        lazily loads the cache from disk.
-        """
-        if self._cache is None:
-            self.read_cache()
-        return self._cache
+        return self.backend.as_dict()
 
     def as_cache_key(self, ireq):
-        """
-        Given a requirement, return its cache key. This behavior is a little weird in order to allow backwards
-        compatibility with cache files. For a requirement without extras, this will return, for example:
+        """Given a requirement, return its cache key.
 
-        ("ipython", "2.1.0")
+        This behavior is a little weird in order to allow backwards
+        compatibility with cache files. For a requirement without extras, this
+        will return, for example::
 
-        For a requirement with extras, the extras will be comma-separated and appended to the version, inside brackets,
-        like so:
+            ("ipython", "2.1.0")
 
-        ("ipython", "2.1.0[nbconvert,notebook]")
+        For a requirement with extras, the extras will be comma-separated and
+        appended to the version, inside brackets, like so::
+
+            ("ipython", "2.1.0[nbconvert,notebook]")
         """
-        name, version, extras = as_tuple(ireq)
+        extras = tuple(sorted(ireq.extras))
         if not extras:
             extras_string = ""
         else:
             extras_string = "[{}]".format(",".join(extras))
+        name = key_from_req(ireq.req)
+        version = get_pinned_version(ireq)
         return name, "{}{}".format(version, extras_string)
 
     def read_cache(self):
-        """Reads the cached contents into memory."""
-        if os.path.exists(self._cache_file):
-            self._cache = read_cache_file(self._cache_file)
-        else:
-            self._cache = {}
+        """Reads the cached contents into memory.
+        """
+        with self.metrics.timed("load"):
+            self.backend.load()
+        self._loaded = True
+
+    def _ensure_loaded(self):
+        # Load lazily loaded backends up front so that the load is timed.
+        if not self._loaded:
+            self._loaded = True
+            if not getattr(self.backend, "loaded", True):
+                self.read_cache()
 
     def write_cache(self):
-        """Writes the cache to disk as JSON."""
-        doc = {
-            '__format__': 1,
-            'dependencies': self._cache,
-        }
-        with open(self._cache_file, 'w') as f:
-            json.dump(doc, f, sort_keys=True)
+        """Writes the cache to disk.
+        """
+        with self._lock:
+            self._write_backend(self.backend.write)
+
+    def _write_backend(self, write):
+        with self.metrics.timed("write"):
+            write()
+        self._unwritten = False
+        # Writes merge in entries added by other processes.
+        count = self.backend.count()
+        if count is not None:
+            self._entry_count = count
+
+    def _get_sidecar_backend(self, suffix):
+        """Build a backend for auxiliary data stored next to the cache file.
+
+        It uses the same kind of storage as the cache itself, or JSON if the
+        cache was given a backend instance.
+        """
+        sidecar_file = "{0}.{1}.json".format(os.path.splitext(self._cache_file)[0], suffix)
+        backend = self._backend_name
+        if backend is not None and not isinstance(backend, six.string_types):
+            backend = "json"
+        return get_cache_backend(backend, sidecar_file)
+
+    def _sidecar_backends(self):
+        """The auxiliary backends which have been opened so far."""
+        return [b for b in (self._access_log,) if b is not None]
+
+    @property
+    def access_log(self):
+        """A backend mapping each cached entry to the time it was last used."""
+        if self._access_log is None:
+            self._access_log = self._get_sidecar_backend("access")
+        return self._access_log
+
+    def _touch(self, pkgname, pkgversion_and_extras):
+        if self._access_log is not None:
+            with self._lock:
+                self._access_log.set(pkgname, pkgversion_and_extras, time.time())
+
+    @property
+    def entry_count(self):
+        """The number of entries in the cache, or None if it isn't known yet.
+
+        The count is taken from the backend when that doesn't mean reading the
+        whole cache, or by ``len()``, and is then updated by every change.
+        """
+        with self._lock:
+            if self._entry_count is None:
+                self._entry_count = self.backend.count()
+            return self._entry_count
+
+    def _set(self, pkgname, pkgversion_and_extras, values):
+        self._ensure_loaded()
+        if self._entry_count is not None and not self.backend.contains(
+            pkgname, pkgversion_and_extras
+        ):
+            self._entry_count += 1
+        self.backend.set(pkgname, pkgversion_and_extras, values)
+        self._unwritten = True
+        self._touch(pkgname, pkgversion_and_extras)
+
+    def _delete(self, pkgname, pkgversion_and_extras):
+        self._ensure_loaded()
+        if not self.backend.delete(pkgname, pkgversion_and_extras):
+            return False
+        if self._entry_count is not None:
+            self._entry_count -= 1
+        self._unwritten = True
+        if self._access_log is not None:
+            self._access_log.delete(pkgname, pkgversion_and_extras)
+        return True
+
+    def flush(self):
+        """Writes any buffered changes to disk.
+
+        This is a no-op if nothing has changed since the last write.
+        """
+        with self._lock:
+            if self._unwritten:
+                self._write_backend(self.backend.flush)
+            else:
+                self.backend.flush()
+            for sidecar in self._sidecar_backends():
+                sidecar.flush()
+
+    def close(self):
+        """Flush pending changes and evict entries over the configured limits."""
+        self.flush()
+        if self.max_entries or self.max_age:
+            self.prune()
+
+    def prune(self, max_entries=None, max_age=None):
+        """Evict the least recently used entries from the cache.
+
+        Entries which have no access record yet are treated as having been
+        used just now.
+
+        :param int max_entries: The number of entries to keep, defaults to
+            :attr:`max_entries`
+        :param max_age: Evict entries unused for this many seconds, defaults to
+            :attr:`max_age`
+        :return: The number of evicted entries
+        :rtype: int
+        """
+        if max_entries is None:
+            max_entries = self.max_entries
+        if max_age is None:
+            max_age = self.max_age
+        with self._lock:
+            return self._prune(max_entries, max_age)
+
+    def _prune(self, max_entries, max_age):
+        access_log = self.access_log
+        now = time.time()
+        entries = []
+        for pkgname, pkgversion_and_extras, _ in self.backend.items():
+            last_used = access_log.get(pkgname, pkgversion_and_extras)
+            if last_used is None:
+                last_used = now
+                access_log.set(pkgname, pkgversion_and_extras, now)
+            entries.append((last_used, pkgname, pkgversion_and_extras))
+        self._entry_count = len(entries)
+        entries.sort()
+        evicted = []
+        if max_age:
+            cutoff = now - max_age
+            while entries and entries[0][0] < cutoff:
+                evicted.append(entries.pop(0))
+        if max_entries and len(entries) > max_entries:
+            evicted.extend(entries[:len(entries) - max_entries])
+        for _, pkgname, pkgversion_and_extras in evicted:
+            self._delete(pkgname, pkgversion_and_extras)
+        self.metrics.evict(len(evicted))
+        self.flush()
+        return len(evicted)
+
+    def compact(self):
+        """Rewrite the cache without any dead entries left behind by deletions."""
+        with self._lock:
+            self.flush()
+            self.backend.compact()
+            for sidecar in self._sidecar_backends():
+                sidecar.compact()
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """Buffer all changes to the cache and write them out once on exit.
+
+        Transactions may be nested, only the outermost one writes to disk::
+
+            with DEPENDENCY_CACHE.transaction():
+                for ireq in ireqs:
+                    DEPENDENCY_CACHE[ireq] = get_dependencies(ireq)
+
+        Transactions belong to the thread which opened them, changes made by
+        other threads are still written right away.
+        """
+        self._transactions.depth = self._transaction_depth + 1
+        try:
+            yield self
+        finally:
+            self._transactions.depth -= 1
+            if not self._transaction_depth:
+                self.flush()
+
+    @property
+    def _transaction_depth(self):
+        return getattr(self._transactions, "depth", 0)
+
+    def _changed(self):
+        if not self._transaction_depth:
+            self.flush()
 
     def clear(self):
-        self._cache = {}
-        self.write_cache()
+        with self._lock:
+            self.backend.clear()
+            self._entry_count = 0
+            self._unwritten = True
+            for sidecar in self._sidecar_backends():
+                sidecar.clear()
+            self._changed()
+
+    def __len__(self):
+        count = self.entry_count
+        if count is None:
+            self._ensure_loaded()
+            with self._lock:
+                count = self._entry_count = sum(1 for _ in self.backend.items())
+        return count
 
     def __contains__(self, ireq):
         pkgname, pkgversion_and_extras = self.as_cache_key(ireq)
-        return pkgversion_and_extras in self.cache.get(pkgname, {})
+        return self.backend.contains(pkgname, pkgversion_and_extras)
 
     def __getitem__(self, ireq):
-        pkgname, pkgversion_and_extras = self.as_cache_key(ireq)
-        return self.cache[pkgname][pkgversion_and_extras]
+        value = self.get(ireq, _MISSING)
+        if value is _MISSING:
+            raise KeyError(ireq)
+        return value
 
     def __setitem__(self, ireq, values):
         pkgname, pkgversion_and_extras = self.as_cache_key(ireq)
-        self.cache.setdefault(pkgname, {})
-        self.cache[pkgname][pkgversion_and_extras] = values
-        self.write_cache()
+        with self._lock:
+            self._set(pkgname, pkgversion_and_extras, values)
+            self._changed()
 
     def __delitem__(self, ireq):
         pkgname, pkgversion_and_extras = self.as_cache_key(ireq)
-        try:
-            del self.cache[pkgname][pkgversion_and_extras]
-        except KeyError:
-            return
-        self.write_cache()
+        with self._lock:
+            if self._delete(pkgname, pkgversion_and_extras):
+                self._changed()
 
     def get(self, ireq, default=None):
         pkgname, pkgversion_and_extras = self.as_cache_key(ireq)
-        return self.cache.get(pkgname, {}).get(pkgversion_and_extras, default)
+        self._ensure_loaded()
+        value = self.backend.get(pkgname, pkgversion_and_extras, _MISSING)
+        if value is _MISSING:
+            self.metrics.miss()
+            return default
+        self.metrics.hit()
+        self._touch(pkgname, pkgversion_and_extras)
+        return value
+
+
+class DependencyCache(_JSONCache):
+    """
+    Creates a new persistent dependency cache for the current Python version.
+    The cache file is written to the appropriate user cache dir for the
+    current platform, i.e.
+
+        ~/.cache/pip-tools/depcache-pyX.Y.json
+
+    Where X.Y indicates the Python version.
+
+    Dependencies are stored in cache format 2, as records created by
+    :func:`make_dependency_record`, in ``depcache-v2-pyX.Y.json``.  Lines
+    which aren't PEP 508 requirements are stored as records created by
+    :func:`make_unparsed_dependency_record`.  Entries from the format 1
+    ``depcache-pyX.Y.json`` file are read when no format 2 file exists yet and
+    are converted in memory when they are first looked up, they are written
+    with the next change to the cache.
+
+    A reverse index, mapping each dependency to the cached entries which
+    require it, is kept up to date as entries are added and removed, and as
+    entries written by others are merged in, and is stored next to the cache.
+    """
+    filename_format = "depcache-v2-py{python_version}.json"
+    legacy_filename_format = "depcache-py{python_version}.json"
+    metrics_name = "dependencies"
+    format_version = 2
+    #: Where the reverse index stores the fingerprint of each unit of storage of
+    #: the cache, it can't clash with the canonical name of a dependency
+    _index_meta_name = "__meta__"
+
+    def __init__(self, cache_dir=None, backend=None, max_entries=None, max_age=None):
+        if cache_dir is None:
+            cache_dir = CACHE_DIR
+        super(DependencyCache, self).__init__(
+            cache_dir=cache_dir, backend=backend, max_entries=max_entries, max_age=max_age
+        )
+        self._reverse_index = None
+
+    @property
+    def reverse_index(self):
+        """A backend mapping each dependency name to the entries which require it.
+
+        Entries are keyed on ``"<name>==<version_and_extras>"`` of the parent
+        and hold the parent's ``[name, version_and_extras]`` cache key.
+
+        The index also records the fingerprint of each unit of storage of the
+        cache, e.g. each shard, it is in sync with.  :meth:`dependents` rebuilds
+        it from the cache contents if any unit was written by something which
+        didn't update the index, e.g. an older version or a process which
+        failed half way.
+        """
+        if self._reverse_index is None:
+            with self._lock:
+                if self._reverse_index is None:
+                    self._reverse_index = self._get_sidecar_backend("reverse")
+        return self._reverse_index
+
+    def _stamp_reverse_index(self, reverse_index, unit, fingerprint):
+        if fingerprint is None:
+            reverse_index.delete(self._index_meta_name, unit)
+        else:
+            reverse_index.set(self._index_meta_name, unit, fingerprint)
+
+    def _reverse_index_is_stale(self, reverse_index):
+        return reverse_index.entries(self._index_meta_name) != self.backend.fingerprints()
+
+    def _write_backend(self, write):
+        super(DependencyCache, self)._write_backend(write)
+        writes = self.backend.pop_writes()
+        reverse_index = self._reverse_index
+        if reverse_index is None:
+            return
+        for unit, (bases, fingerprint, merged) in writes.items():
+            if merged is None:
+                continue
+            # Entries written by others are indexed as they are merged in
+            for pkgname, pkgversion_and_extras, old_values, values in merged:
+                self._index_entry(
+                    pkgname, pkgversion_and_extras, old_values, remove=True,
+                    reverse_index=reverse_index,
+                )
+                self._index_entry(
+                    pkgname, pkgversion_and_extras, values, reverse_index=reverse_index
+                )
+            if reverse_index.get(self._index_meta_name, unit) in bases:
+                self._stamp_reverse_index(reverse_index, unit, fingerprint)
+
+    def flush(self):
+        with self._lock:
+            super(DependencyCache, self).flush()
+            reverse_index = self._reverse_index
+            if reverse_index is None:
+                return
+            for _, _, merged in reverse_index.pop_writes().values():
+                if merged is None or any(
+                    entry[0] == self._index_meta_name for entry in merged
+                ):
+                    # The stamps of others were merged in, read the entries
+                    # they indexed along with them
+                    reverse_index.load()
+                    break
+
+    def _sidecar_backends(self):
+        backends = super(DependencyCache, self)._sidecar_backends()
+        if self._reverse_index is not None:
+            backends.append(self._reverse_index)
+        return backends
+
+    @staticmethod
+    def _dependency_names(values):
+        names = set()
+        for value in values or ():
+            name = _as_dependency_record(value)["name"]
+            if name is not None:
+                names.add(name)
+        return names
+
+    def _index_entry(self, pkgname, pkgversion_and_extras, values, remove=False,
+                     reverse_index=None):
+        if reverse_index is None:
+            reverse_index = self.reverse_index
+        parent_key = "{0}=={1}".format(pkgname, pkgversion_and_extras)
+        for dep_name in self._dependency_names(values):
+            if remove:
+                reverse_index.delete(dep_name, parent_key)
+            else:
+                reverse_index.set(dep_name, parent_key, [pkgname, pkgversion_and_extras])
+
+    def rebuild_reverse_index(self, reverse_index=None):
+        """Rebuild the reverse dependency index from the cache contents."""
+        with self._lock:
+            if reverse_index is None:
+                reverse_index = self.reverse_index
+            reverse_index.clear()
+            # Read the cache again, what is in memory may be out of date
+            self.backend.load()
+            for pkgname, pkgversion_and_extras, values in self.backend.items():
+                self._index_entry(
+                    pkgname, pkgversion_and_extras, values, reverse_index=reverse_index
+                )
+            for unit, fingerprint in self.backend.loaded_fingerprints().items():
+                self._stamp_reverse_index(reverse_index, unit, fingerprint)
+            reverse_index.write()
+
+    def _set(self, pkgname, pkgversion_and_extras, values):
+        old_values = self.backend.get(pkgname, pkgversion_and_extras)
+        if old_values:
+            self._index_entry(pkgname, pkgversion_and_extras, old_values, remove=True)
+        super(DependencyCache, self)._set(pkgname, pkgversion_and_extras, values)
+        self._index_entry(pkgname, pkgversion_and_extras, values)
+
+    def _delete(self, pkgname, pkgversion_and_extras):
+        old_values = self.backend.get(pkgname, pkgversion_and_extras)
+        if not super(DependencyCache, self)._delete(pkgname, pkgversion_and_extras):
+            return False
+        self._index_entry(pkgname, pkgversion_and_extras, old_values, remove=True)
+        return True
+
+    def clear(self):
+        # Open the index first so it is cleared along with the cache
+        self.reverse_index
+        super(DependencyCache, self).clear()
+
+    def get_records(self, ireq, default=None):
+        """Returns the cached dependency records for the given requirement.
+
+        Format 1 entries are converted to records in memory, they are only
+        written to disk with the next flush of the cache.
+
+        :param ireq: A pinned InstallRequirement
+        :return: A list of records created by :func:`make_dependency_record`
+        :rtype: list[dict]
+        """
+        pkgname, pkgversion_and_extras = self.as_cache_key(ireq)
+        self._ensure_loaded()
+        values = self.backend.get(pkgname, pkgversion_and_extras, _MISSING)
+        if values is _MISSING:
+            self.metrics.miss()
+            return default
+        if any(isinstance(value, six.string_types) for value in values):
+            values = [_as_dependency_record(value) for value in values]
+            with self._lock:
+                self.backend.set(pkgname, pkgversion_and_extras, values)
+                self._unwritten = True
+        self.metrics.hit()
+        self._touch(pkgname, pkgversion_and_extras)
+        return values
+
+    def __getitem__(self, ireq):
+        records = self.get_records(ireq, _MISSING)
+        if records is _MISSING:
+            raise KeyError(ireq)
+        return [record["line"] for record in records]
+
+    def __setitem__(self, ireq, values):
+        records = [_as_dependency_record(line) for line in values]
+        super(DependencyCache, self).__setitem__(ireq, records)
+
+    def get(self, ireq, default=None):
+        records = self.get_records(ireq, _MISSING)
+        if records is _MISSING:
+            return default
+        return [record["line"] for record in records]
+
+    def as_cache_key(self, ireq):
+        """
+        Given a requirement, return its cache key. This behavior is a little weird in order to allow backwards
+        compatibility with cache files. For a requirement without extras, this will return, for example:
+
+        ("ipython", "2.1.0")
+
+        For a requirement with extras, the extras will be comma-separated and appended to the version, inside brackets,
+        like so:
+
+        ("ipython", "2.1.0[nbconvert,notebook]")
+        """
+        name, version, extras = as_tuple(ireq)
+        if not extras:
+            extras_string = ""
+        else:
+            extras_string = "[{}]".format(",".join(extras))
+        return name, "{}{}".format(version, extras_string)
 
     def reverse_dependencies(self, ireqs):
         """
@@ -181,18 +1447,104 @@ class DependencyCache(object):
         """
         # First, collect all the dependencies into a sequence of (parent, child) tuples, like [('flake8', 'pep8'),
         # ('flake8', 'mccabe'), ...]
-        return lookup_table((key_from_req(Requirement(dep_name)), name)
+        self._ensure_loaded()
+        return lookup_table((record["name"], name)
                             for name, version_and_extras in cache_keys
-                            for dep_name in self.cache[name][version_and_extras])
+                            for record in self._get_entry_records(name, version_and_extras)
+                            if record["name"] is not None)
+
+    def _get_entry_records(self, pkgname, pkgversion_and_extras):
+        values = self.backend.get(pkgname, pkgversion_and_extras, _MISSING)
+        if values is _MISSING:
+            raise KeyError((pkgname, pkgversion_and_extras))
+        return [_as_dependency_record(value) for value in values]
+
+    def dependents(self, name):
+        """Returns the cache keys of all cached entries which depend on *name*.
+
+        :param str name: The name of a dependency
+        :return: A list of ``(name, version_and_extras)`` cache keys
+        :rtype: list[tuple[str, str]]
+        """
+        reverse_index = self.reverse_index
+        with self._lock:
+            if self._reverse_index_is_stale(reverse_index):
+                # Others which keep the index up to date may have written it
+                reverse_index.load()
+                if self._reverse_index_is_stale(reverse_index):
+                    self.rebuild_reverse_index(reverse_index)
+        entries = reverse_index.entries(canonicalize_name(name))
+        return [tuple(parent) for parent in entries.values()]
+
+
+def prune_directories(paths, max_size=None, max_age=None):
+    """Trim directories of cached artifacts, removing the least recently used files first.
+
+    Files not used for more than *max_age* seconds are removed, then the
+    oldest remaining files are removed until the combined size of all of the
+    directories is no more than *max_size* bytes.  A file counts as used when
+    it was last read or modified, whichever is later.
+
+    :param paths: The directories to prune
+    :type paths: list[str]
+    :param int max_size: The combined size budget in bytes, defaults to :data:`CACHE_MAX_SIZE`
+    :param int max_age: The maximum age in seconds, defaults to :data:`CACHE_MAX_AGE`
+    :return: The number of bytes removed
+    :rtype: int
+    """
+    if max_size is None:
+        max_size = CACHE_MAX_SIZE
+    if max_age is None:
+        max_age = CACHE_MAX_AGE
+    files = []
+    total_size = 0
+    for path in set(os.path.abspath(p) for p in paths):
+        for root, _, filenames in os.walk(path):
+            for filename in filenames:
+                file_path = os.path.join(root, filename)
+                try:
+                    file_stat = os.stat(file_path)
+                except OSError:
+                    continue
+                last_used = max(file_stat.st_atime, file_stat.st_mtime)
+                files.append((last_used, file_stat.st_size, file_path))
+                total_size += file_stat.st_size
+    files.sort()
+    cutoff = time.time() - max_age if max_age else None
+    removed = 0
+    for last_used, size, file_path in files:
+        expired = cutoff is not None and last_used < cutoff
+        if not expired and not (max_size and total_size > max_size):
+            break
+        try:
+            os.remove(file_path)
+        except OSError:
+            continue
+        total_size -= size
+        removed += size
+    return removed
 
 
 class HashCache(SafeFileCache):
     """Caches hashes of PyPI artifacts so we do not need to re-download them.
 
-    Hashes are only cached when the URL appears to contain a hash in it and the
-    cache key includes the hash value returned from the server). This ought to
-    avoid ssues where the location on the server changes.
+    Hashes are stored under the normalized URL of the artifact plus whatever
+    identifies its content: the hash in the URL fragment if there is one,
+    nothing for files on one of the :data:`IMMUTABLE_FILE_HOSTS`, otherwise the
+    ``ETag`` and ``Last-Modified`` headers returned by the server (or the size
+    and modification time of local files).  If the artifact changes, so does
+    the cache key, which avoids issues where the file at a location on the
+    server changes.  Artifacts which offer none of these are hashed every time.
+
+    The headers are recorded from the response the artifact was downloaded
+    with and trusted for *validators_ttl* seconds, after that a ``HEAD``
+    request checks them again.  No requests are made for validators while a
+    snapshot is active.
     """
+
+    #: Size of the reads used when hashing artifacts
+    chunk_size = 1024 * 1024
+
     def __init__(self, *args, **kwargs):
         session = kwargs.pop("session", None)
         if not session:
@@ -200,142 +1552,314 @@ class HashCache(SafeFileCache):
             session = requests.session()
             atexit.register(session.close)
         cache_dir = kwargs.pop('cache_dir', CACHE_DIR)
+        validators_ttl = kwargs.pop("validators_ttl", None)
+        self.validators_ttl = (
+            HASH_VALIDATORS_TTL if validators_ttl is None else validators_ttl
+        )
         self.session = session
         kwargs.setdefault('directory', os.path.join(cache_dir, 'hash-cache'))
         super(HashCache, self).__init__(*args, **kwargs)
+        self.metrics = get_cache_metrics("hashes")
+
+    def prune(self, max_size=None, max_age=None):
+        """Remove the least recently used hashes, see :func:`prune_directories`."""
+        return prune_directories([self.directory], max_size=max_size, max_age=max_age)
+
+    @staticmethod
+    def _get_response_validators(headers):
+        validators = [
+            "{0}={1}".format(header.lower(), headers[header])
+            for header in ("ETag", "Last-Modified")
+            if headers.get(header)
+        ]
+        if not validators:
+            return None
+        return "&".join(validators)
+
+    def _load_validators(self, location):
+        """Returns the validators recorded for *location* and when they were checked.
+
+        :rtype: tuple(str, float) or None
+        """
+        raw = self.get("validators:{0}".format(location.url_without_fragment))
+        if not raw:
+            return None
+        try:
+            record = json.loads(raw.decode("utf-8"))
+            return record["validators"], float(record["checked"])
+        except (ValueError, KeyError, TypeError):
+            return None
+
+    def _store_validators(self, location, validators):
+        record = {"validators": validators, "checked": time.time()}
+        self.set(
+            "validators:{0}".format(location.url_without_fragment),
+            json.dumps(record).encode("utf-8"),
+        )
+
+    def _get_validators(self, location):
+        """Returns a string identifying the current content at the given location.
+
+        Remote validators are taken from the record of the last response while
+        it is fresh, otherwise they are checked with a ``HEAD`` request.  Nothing
+        is requested for artifacts without a record, they haven't been hashed yet
+        and the download records them.
+
+        :return: The validators, or None if the location doesn't offer any
+        :rtype: str or None
+        """
+        if location.scheme == "file":
+            try:
+                file_stat = os.stat(vistir.path.url_to_path(location.url_without_fragment))
+            except OSError:
+                return None
+            return "size={0}&mtime={1}".format(file_stat.st_size, file_stat.st_mtime)
+        if location.scheme not in ("http", "https"):
+            return None
+        record = self._load_validators(location)
+        if record is None:
+            return None
+        validators, checked = record
+        if time.time() - checked < self.validators_ttl:
+            return validators
+        from .snapshot import get_active_snapshot
+        if get_active_snapshot() is not None:
+            return None
+        try:
+            response = self.session.head(location.url_without_fragment, allow_redirects=True)
+            response.raise_for_status()
+        except Exception:
+            return None
+        validators = self._get_response_validators(response.headers)
+        if validators:
+            self._store_validators(location, validators)
+        return validators
+
+    def get_cache_key(self, location):
+        """Returns the key the hash of the artifact at *location* is stored under.
+
+        :param location: The location of an artifact
+        :type location: :class:`~pip._internal.models.link.Link`
+        :return: The cache key, or None if the content can't be identified
+        :rtype: str or None
+        """
+        scheme, netloc, path, query, _ = urllib_parse.urlsplit(location.url)
+        url = urllib_parse.urlunsplit((scheme.lower(), netloc.lower(), path, query, ""))
+        if location.hash:
+            content_id = "{0}={1}".format(location.hash_name, location.hash)
+        elif scheme.lower() == "https" and netloc.lower() in IMMUTABLE_FILE_HOSTS:
+            return url
+        else:
+            content_id = self._get_validators(location)
+        if not content_id:
+            return None
+        return "{0}#{1}".format(url, content_id)
 
     def get_hash(self, location):
         from pip_shims import VcsSupport
-        # if there is no location hash (i.e., md5 / sha256 / etc) we on't want to store it
-        hash_value = None
         vcs = VcsSupport()
         orig_scheme = location.scheme
         new_location = copy.deepcopy(location)
         if orig_scheme in vcs.all_schemes:
             new_location.url = new_location.url.split("+", 1)[-1]
-        can_hash = new_location.hash
-        if can_hash:
-            # hash url WITH fragment
-            hash_value = self._get_file_hash(new_location.url) if not new_location.url.startswith("ssh") else None
-        if not hash_value:
+        from .snapshot import get_active_snapshot
+        snapshot = get_active_snapshot()
+        if snapshot is not None:
+            hash_value = snapshot.get_hash(new_location)
+            if hash_value:
+                self.metrics.hit()
+                return hash_value
+        cache_key = self.get_cache_key(new_location)
+        if cache_key:
+            with self.metrics.timed("load"):
+                hash_value = self.get(cache_key)
+            if hash_value:
+                self.metrics.hit()
+                return hash_value.decode('utf8')
+        self.metrics.miss()
+        with trace_span("hash", category="hashes", url=new_location.url_without_fragment):
             hash_value = self._get_file_hash(new_location)
-            hash_value = hash_value.encode('utf8')
-        if can_hash:
-            self.set(new_location.url, hash_value)
-        return hash_value.decode('utf8')
+        if not cache_key:
+            # The download may have recorded validators
+            cache_key = self.get_cache_key(new_location)
+        if cache_key:
+            with self.metrics.timed("write"):
+                self.set(cache_key, hash_value.encode('utf8'))
+        return hash_value
+
+    def get_hashes(self, locations, max_workers=None):
+        """Hash many artifacts at once using a pool of threads.
+
+        :param locations: The locations of the artifacts to hash
+        :type locations: list[:class:`~pip._internal.models.link.Link`]
+        :param int max_workers: The number of threads to use, defaults to
+            :data:`HASH_WORKERS`
+        :return: A mapping of each location to its hash
+        :rtype: dict
+        """
+        locations = list(locations)
+        if not locations:
+            return {}
+        workers = min(max_workers or HASH_WORKERS, len(locations))
+        if workers < 2:
+            return {location: self.get_hash(location) for location in locations}
+        pool = ThreadPool(workers)
+        try:
+            hashes = pool.map(self.get_hash, locations)
+        finally:
+            pool.close()
+            pool.join()
+        return dict(zip(locations, hashes))
 
     def _get_file_hash(self, location):
         h = hashlib.new(FAVORITE_HASH)
+        size = 0
         with vistir.contextmanagers.open_file(location, self.session) as fp:
-            for chunk in iter(lambda: fp.read(8096), b""):
+            for chunk in iter(lambda: fp.read(self.chunk_size), b""):
                 h.update(chunk)
+                size += len(chunk)
+            headers = getattr(fp, "headers", None)
+        if location.scheme != "file":
+            trace_count("bytes_downloaded", size)
+        if location.scheme in ("http", "https") and headers:
+            validators = self._get_response_validators(headers)
+            if validators:
+                self._store_validators(location, validators)
         return ":".join([FAVORITE_HASH, h.hexdigest()])
 
 
-class _JSONCache(object):
-    """A persistent cache backed by a JSON file.
-
-    The cache file is written to the appropriate user cache dir for the
-    current platform, i.e.
-
-        ~/.cache/pip-tools/depcache-pyX.Y.json
-
-    Where X.Y indicates the Python version.
+class RequiresPythonCache(_JSONCache):
+    """Cache a candidate's Requires-Python information.
     """
-    filename_format = None
-
-    def __init__(self, cache_dir=CACHE_DIR):
-        vistir.mkdir_p(cache_dir)
-        python_version = ".".join(str(digit) for digit in sys.version_info[:2])
-        cache_filename = self.filename_format.format(
-            python_version=python_version,
-        )
-        self._cache_file = os.path.join(cache_dir, cache_filename)
-        self._cache = None
-
-    @property
-    def cache(self):
-        """The dictionary that is the actual in-memory cache.
-
-        This property lazily loads the cache from disk.
-        """
-        if self._cache is None:
-            self.read_cache()
-        return self._cache
-
-    def as_cache_key(self, ireq):
-        """Given a requirement, return its cache key.
-
-        This behavior is a little weird in order to allow backwards
-        compatibility with cache files. For a requirement without extras, this
-        will return, for example::
+    filename_format = "pyreqcache-py{python_version}.json"
+    metrics_name = "requires_python"
 
-            ("ipython", "2.1.0")
 
-        For a requirement with extras, the extras will be comma-separated and
-        appended to the version, inside brackets, like so::
+class CandidateCache(_JSONCache):
+    """Cache the candidates found on each index for a project.
 
-            ("ipython", "2.1.0[nbconvert,notebook]")
-        """
-        extras = tuple(sorted(ireq.extras))
-        if not extras:
-            extras_string = ""
-        else:
-            extras_string = "[{}]".format(",".join(extras))
-        name = key_from_req(ireq.req)
-        version = get_pinned_version(ireq)
-        return name, "{}{}".format(version, extras_string)
+    Entries are keyed on the canonical project name and the sources searched,
+    and store the time they were fetched along with the version, link and
+    Requires-Python of each candidate.
+    """
+    filename_format = "candidates-py{python_version}.json"
+    metrics_name = "candidates"
+
+    def get_candidates(self, name, sources_key, ttl):
+        """Returns the cached ``(version, url, requires_python)`` tuples, or None
+        if there are none younger than *ttl* seconds."""
+        self._ensure_loaded()
+        entry = self.backend.get(name, sources_key)
+        if not entry or entry["fetched"] < time.time() - ttl:
+            self.metrics.miss()
+            return None
+        self.metrics.hit()
+        self._touch(name, sources_key)
+        return [tuple(candidate) for candidate in entry["candidates"]]
+
+    def set_candidates(self, name, sources_key, candidates):
+        with self._lock:
+            self._set(name, sources_key, {
+                "fetched": time.time(),
+                "candidates": [list(candidate) for candidate in candidates],
+            })
+            self._changed()
+
+
+def make_installation_candidate(name, version, url, requires_python=None):
+    """Create one of pip's installation candidates.
+
+    :param str name: The project name
+    :param str version: The version of the candidate
+    :param str url: The URL of the candidate's artifact
+    :param str requires_python: The Requires-Python of the candidate, if any
+    :rtype: :class:`~pip._internal.index.InstallationCandidate`
+    """
+    from pip_shims.shims import Link
+    try:
+        from pip_shims.shims import InstallationCandidate
+    except ImportError:
+        from pip._internal.models.candidate import InstallationCandidate
+
+    return InstallationCandidate(name, version, Link(url, requires_python=requires_python))
+
+
+def _get_sources_key(finder, all_wheels=False):
+    search_scope = getattr(finder, "search_scope", finder)
+    sources = {
+        "index_urls": list(getattr(search_scope, "index_urls", [])),
+        "find_links": list(getattr(search_scope, "find_links", [])),
+        "all_wheels": bool(all_wheels),
+    }
+    return json.dumps(sources, sort_keys=True)
+
+
+class CandidateIndex(object):
+    """An index of the candidates available for each project.
+
+    Each project is only looked up once per set of sources, later lookups are
+    answered from memory so that specifiers can be applied to the candidate
+    list without fetching and parsing the index pages again.  When *ttl* is
+    set, candidates are also kept in a :class:`CandidateCache` on disk for that
+    many seconds.
+
+    :param int ttl: Seconds to keep candidates on disk, defaults to
+        :data:`CANDIDATE_CACHE_TTL`, 0 disables the on-disk cache
+    :param cache: The on-disk cache to use, defaults to a new :class:`CandidateCache`
+    :type cache: :class:`CandidateCache`
+    """
 
-    def read_cache(self):
-        """Reads the cached contents into memory.
-        """
-        if os.path.exists(self._cache_file):
-            self._cache = read_cache_file(self._cache_file)
-        else:
-            self._cache = {}
+    def __init__(self, ttl=None, cache=None):
+        self.ttl = CANDIDATE_CACHE_TTL if ttl is None else ttl
+        if cache is None and self.ttl:
+            cache = CandidateCache()
+        self.cache = cache
+        self._candidates = {}
+        self._lock = threading.Lock()
 
-    def write_cache(self):
-        """Writes the cache to disk as JSON.
-        """
-        doc = {
-            '__format__': 1,
-            'dependencies': self._cache,
-        }
-        with open(self._cache_file, 'w') as f:
-            json.dump(doc, f, sort_keys=True)
+    def __len__(self):
+        return len(self._candidates)
 
     def clear(self):
-        self._cache = {}
-        self.write_cache()
-
-    def __contains__(self, ireq):
-        pkgname, pkgversion_and_extras = self.as_cache_key(ireq)
-        return pkgversion_and_extras in self.cache.get(pkgname, {})
-
-    def __getitem__(self, ireq):
-        pkgname, pkgversion_and_extras = self.as_cache_key(ireq)
-        return self.cache[pkgname][pkgversion_and_extras]
-
-    def __setitem__(self, ireq, values):
-        pkgname, pkgversion_and_extras = self.as_cache_key(ireq)
-        self.cache.setdefault(pkgname, {})
-        self.cache[pkgname][pkgversion_and_extras] = values
-        self.write_cache()
-
-    def __delitem__(self, ireq):
-        pkgname, pkgversion_and_extras = self.as_cache_key(ireq)
-        try:
-            del self.cache[pkgname][pkgversion_and_extras]
-        except KeyError:
-            return
-        self.write_cache()
-
-    def get(self, ireq, default=None):
-        pkgname, pkgversion_and_extras = self.as_cache_key(ireq)
-        return self.cache.get(pkgname, {}).get(pkgversion_and_extras, default)
-
-
-class RequiresPythonCache(_JSONCache):
-    """Cache a candidate's Requires-Python information.
-    """
-    filename_format = "pyreqcache-py{python_version}.json"
+        with self._lock:
+            self._candidates.clear()
+
+    def get_candidates(self, finder, name, all_wheels=False):
+        """Returns all of the candidates *finder* can find for a project.
+
+        :param finder: The finder to search with
+        :type finder: :class:`~pip._internal.index.PackageFinder`
+        :param str name: The name of the project
+        :param bool all_wheels: Whether wheels for all platforms are being
+            allowed, see :meth:`~requirementslib.models.resolvers.DependencyResolver.allow_all_wheels`
+        :rtype: list[:class:`~pip._internal.index.InstallationCandidate`]
+        """
+        key = (canonicalize_name(name), _get_sources_key(finder, all_wheels))
+        with self._lock:
+            candidates = self._candidates.get(key)
+        if candidates is not None:
+            return list(candidates)
+        if self.cache is not None and self.ttl:
+            cached = self.cache.get_candidates(key[0], key[1], self.ttl)
+            if cached is not None:
+                candidates = [make_installation_candidate(name, *c) for c in cached]
+        if candidates is None:
+            candidates = find_all_candidates(finder, name)
+            if self.cache is not None and self.ttl:
+                links = [(c, get_candidate_link(c)) for c in candidates]
+                self.cache.set_candidates(key[0], key[1], [
+                    (str(c.version), link.url, getattr(link, "requires_python", None))
+                    for c, link in links
+                ])
+        with self._lock:
+            self._candidates[key] = candidates
+        return list(candidates)
+
+    def items(self):
+        """Returns ``(name, candidates)`` pairs for each project and set of sources
+        which was looked up."""
+        with self._lock:
+            return [
+                (name, list(candidates))
+                for (name, _), candidates in self._candidates.items()
+            ]
@@ -5,11 +5,15 @@ import contextlib
 import copy
 import functools
 import os
+import threading
+import zipfile
+from multiprocessing.pool import ThreadPool
 
 import attr
 import packaging.markers
 import packaging.version
 import requests
+import requests.adapters
 
 from first import first
 from packaging.utils import canonicalize_name
@@ -18,15 +22,25 @@ import pip_shims.shims
 from vistir.compat import JSONDecodeError, fs_str, ResourceWarning
 from vistir.contextmanagers import cd, temp_environ
 from vistir.misc import partialclass
-from vistir.path import create_tracked_tempdir
+from vistir.path import create_tracked_tempdir, rmtree, url_to_path
 
 from ..environment import MYPY_RUNNING
 from ..utils import prepare_pip_source_args, _ensure_dir
-from .cache import CACHE_DIR, DependencyCache
+from .cache import (
+    CACHE_DIR, CandidateIndex, DependencyCache, RequiresPythonCache, prune_directories
+)
+from .metrics import get_cache_metrics
+from .snapshot import get_active_snapshot
+from .tracing import trace_count, trace_span
+from .lazy_wheel import (
+    HTTPRangeRequestUnsupported, get_remote_wheel_metadata, get_requires_dist,
+    read_wheel_metadata
+)
 from .utils import (
-    clean_requires_python, fix_requires_python_marker, format_requirement,
-    full_groupby, is_pinned_requirement, key_from_ireq,
-    make_install_requirement, name_from_req, version_from_ireq
+    clean_requires_python, find_all_candidates, fix_requires_python_marker,
+    format_requirement, full_groupby, get_candidate_link, get_candidate_name,
+    is_pinned_requirement, key_from_ireq, make_install_requirement, name_from_req,
+    version_from_ireq
 )
 
 
@@ -34,6 +48,7 @@ if MYPY_RUNNING:
     from typing import Any, Dict, List, Generator, Optional, Union, Tuple, TypeVar, Text, Set, AnyStr
     from pip_shims.shims import InstallRequirement, InstallationCandidate, PackageFinder, Command
     from packaging.requirements import Requirement as PackagingRequirement
+    from .markers import TargetEnvironment
     TRequirement = TypeVar("TRequirement")
     RequirementType = TypeVar('RequirementType', covariant=True, bound=PackagingRequirement)
     MarkerType = TypeVar('MarkerType', covariant=True, bound=Marker)
@@ -45,17 +60,111 @@ PKGS_DOWNLOAD_DIR = fs_str(os.path.join(CACHE_DIR, "pkgs"))
 WHEEL_DOWNLOAD_DIR = fs_str(os.path.join(CACHE_DIR, "wheels"))
 
 DEPENDENCY_CACHE = DependencyCache()
+DEPENDENCY_CACHE.metrics.track_size(DEPENDENCY_CACHE)
 WHEEL_CACHE = pip_shims.shims.WheelCache(
     CACHE_DIR, pip_shims.shims.FormatControl(set(), set())
 )
 
+#: The simple index searched when no sources are given
+INDEX_URL = os.environ.get("REQUIREMENTSLIB_INDEX_URL", "https://pypi.org/simple")
+#: The base URL of the JSON API used by :func:`get_dependencies_from_json`
+JSON_API_URL = os.environ.get("REQUIREMENTSLIB_JSON_API_URL", "https://pypi.org/pypi")
+#: The number of concurrent requests made by :func:`prefetch_dependencies`
+JSON_API_WORKERS = int(os.environ.get("REQUIREMENTSLIB_JSON_API_WORKERS", 8))
+_JSON_API_SESSION = None
+_JSON_API_SESSION_LOCK = threading.Lock()
+#: The candidate index used by :func:`find_all_matches`, see :func:`candidate_index`
+_CANDIDATE_INDEX = None
+_TARGET_PYTHON_VERSIONS = None
+
+
+def get_default_sources():
+    """Returns the pipfile-formatted sources used when none are given.
+
+    :return: A list with a single source for :data:`INDEX_URL`
+    :rtype: list[dict]
+    """
+    return [{"url": INDEX_URL, "name": "pypi", "verify_ssl": True}]
+
+
+def prune_caches(max_entries=None, max_age=None, max_size=None):
+    """Bring all of the on-disk caches under :data:`~requirementslib.models.cache.CACHE_DIR`
+    within the given limits.
+
+    Evicts the least recently used entries from the dependency and
+    requires-python caches, rewrites them without dead entries, and trims the
+    hash cache, the wheel cache and the package download directories down to
+    a combined *max_size* bytes.  Each limit defaults to its
+    ``REQUIREMENTSLIB_CACHE_MAX_*`` environment variable.
+
+    :param int max_entries: The number of entries to keep in each dependency cache
+    :param int max_age: Evict anything unused for this many seconds
+    :param int max_size: The size budget in bytes for the artifact directories
+    :return: The number of bytes removed from the artifact directories
+    :rtype: int
+    """
+    for cache in (DEPENDENCY_CACHE, RequiresPythonCache()):
+        cache.prune(max_entries=max_entries, max_age=max_age)
+        cache.compact()
+    artifact_dirs = [
+        os.path.join(CACHE_DIR, "hash-cache"),
+        os.path.join(WHEEL_CACHE.cache_dir, "wheels"),
+        PKGS_DOWNLOAD_DIR,
+        WHEEL_DOWNLOAD_DIR,
+    ]
+    return prune_directories(artifact_dirs, max_size=max_size, max_age=max_age)
+
 
 def _get_filtered_versions(ireq, versions, prereleases):
     return set(ireq.specifier.filter(versions, prereleases=prereleases))
 
 
-def find_all_matches(finder, ireq, pre=False):
-    # type: (PackageFinder, InstallRequirement, bool) -> List[InstallationCandidate]
+@contextlib.contextmanager
+def candidate_index(index=None):
+    """Memoize the candidates found by :func:`find_all_matches` inside of the block.
+
+    Every project is only looked up on the index once, the candidates of later
+    lookups are filtered in memory.  Nested blocks share the outer index unless
+    given their own.
+
+    :param index: The index to use, defaults to the active index or a new one
+    :type index: :class:`~requirementslib.models.cache.CandidateIndex`
+    """
+    global _CANDIDATE_INDEX
+    previous = _CANDIDATE_INDEX
+    if index is None:
+        index = previous if previous is not None else CandidateIndex()
+    _CANDIDATE_INDEX = index
+    try:
+        yield index
+    finally:
+        _CANDIDATE_INDEX = previous
+
+
+@contextlib.contextmanager
+def target_environments(environments):
+    """Keep the candidates of every target environment inside of the block.
+
+    :func:`find_all_matches` normally drops candidates whose ``Requires-Python``
+    excludes the running interpreter, inside of the block it keeps candidates
+    which support any of the given environments instead.
+
+    :param environments: The environments to keep candidates for
+    :type environments: list[:class:`~requirementslib.models.markers.TargetEnvironment`]
+    """
+    global _TARGET_PYTHON_VERSIONS
+    previous = _TARGET_PYTHON_VERSIONS
+    _TARGET_PYTHON_VERSIONS = sorted(
+        set(environment.python_full_version for environment in environments)
+    )
+    try:
+        yield
+    finally:
+        _TARGET_PYTHON_VERSIONS = previous
+
+
+def find_all_matches(finder, ireq, pre=False, index=None):
+    # type: (PackageFinder, InstallRequirement, bool, Optional[CandidateIndex]) -> List[InstallationCandidate]
     """Find all matching dependencies using the supplied finder and the
     given ireq.
 
@@ -63,17 +172,35 @@ def find_all_matches(finder, ireq, pre=False):
     :type finder: :class:`~pip._internal.index.PackageFinder`
     :param ireq: An install requirement.
     :type ireq: :class:`~pip._internal.req.req_install.InstallRequirement`
+    :param index: A candidate index to look projects up in, defaults to the one
+        activated by :func:`candidate_index`, if any
+    :type index: :class:`~requirementslib.models.cache.CandidateIndex`
     :return: A list of matching candidates.
     :rtype: list[:class:`~pip._internal.index.InstallationCandidate`]
     """
 
-
-    candidates = clean_requires_python(finder.find_all_candidates(ireq.name))
-    versions = {candidate.version for candidate in candidates}
-    allowed_versions = _get_filtered_versions(ireq, versions, pre)
-    if not pre and not allowed_versions:
-        allowed_versions = _get_filtered_versions(ireq, versions, True)
-    candidates = {c for c in candidates if c.version in allowed_versions}
+    if index is None:
+        index = _CANDIDATE_INDEX
+    with trace_span("find_all_matches", package=ireq.name):
+        snapshot = get_active_snapshot()
+        if snapshot is not None:
+            all_candidates = snapshot.get_candidates(ireq.name)
+        elif index is not None:
+            from .resolvers import all_wheels_allowed
+            all_candidates = index.get_candidates(
+                finder, ireq.name, all_wheels=all_wheels_allowed()
+            )
+        else:
+            all_candidates = find_all_candidates(finder, ireq.name)
+        candidates = clean_requires_python(
+            all_candidates, python_versions=_TARGET_PYTHON_VERSIONS
+        )
+        versions = {candidate.version for candidate in candidates}
+        allowed_versions = _get_filtered_versions(ireq, versions, pre)
+        if not pre and not allowed_versions:
+            allowed_versions = _get_filtered_versions(ireq, versions, True)
+        candidates = {c for c in candidates if c.version in allowed_versions}
+    trace_count("candidates", len(candidates), package=canonicalize_name(ireq.name))
     return candidates
 
 
@@ -111,6 +238,32 @@ class AbstractDependency(object):
     parent = attr.ib()
     finder = attr.ib()
     dep_dict = attr.ib(default=attr.Factory(dict))
+    #: The parsed version of each candidate, see :attr:`versions`
+    _versions = attr.ib(default=None, init=False, repr=False, cmp=False)
+    #: The position of each version in :attr:`candidates`
+    _version_positions = attr.ib(default=None, init=False, repr=False, cmp=False)
+
+    @property
+    def versions(self):
+        """The parsed versions of the candidates, in the same order as the candidates.
+
+        Versions are parsed once and reused by every comparison and merge.  Editable
+        candidates have no version and are represented by None.
+
+        :rtype: tuple[:class:`~packaging.version.Version`]
+        """
+        if self._versions is None:
+            self._set_versions(tuple(
+                None if c.editable else packaging.version.parse(version_from_ireq(c))
+                for c in self.candidates
+            ))
+        return self._versions
+
+    def _set_versions(self, versions):
+        self._versions = versions
+        self._version_positions = {
+            version: i for i, version in enumerate(versions) if version is not None
+        }
 
     @property
     def version_set(self):
@@ -122,7 +275,23 @@ class AbstractDependency(object):
 
         if len(self.candidates) == 1:
             return set()
-        return set(packaging.version.parse(version_from_ireq(c)) for c in self.candidates)
+        self.versions
+        return set(self._version_positions)
+
+    def get_candidates(self, versions):
+        """Returns the candidates with the given versions, in candidate order.
+
+        :param versions: The versions to select
+        :type versions: set[:class:`~packaging.version.Version`]
+        :rtype: list[:class:`~pip._internal.req.req_install.InstallRequirement`]
+        """
+        return [self.candidates[i] for i in self._get_positions(versions)]
+
+    def _get_positions(self, versions):
+        self.versions
+        return sorted(
+            self._version_positions[v] for v in versions if v in self._version_positions
+        )
 
     def compatible_versions(self, other):
         """Find compatible version numbers between this abstract
@@ -138,7 +307,9 @@ class AbstractDependency(object):
             return self
         elif len(other.candidates) == 1 and first(other.candidates).editable:
             return other
-        return self.version_set & other.version_set
+        self.versions
+        other.versions
+        return set(self._version_positions) & set(other._version_positions)
 
     def compatible_abstract_dep(self, other):
         """Merge this abstract dependency with another one.
@@ -158,28 +329,26 @@ class AbstractDependency(object):
         elif len(other.candidates) == 1 and first(other.candidates).editable:
             return other
         new_specifiers = self.specifiers & other.specifiers
-        markers = set(self.markers,) if self.markers else set()
-        if other.markers:
-            markers.add(other.markers)
-        new_markers = packaging.markers.Marker(" or ".join(str(m) for m in sorted(markers)))
+        markers = set(str(m) for m in (self.markers, other.markers) if m)
+        new_markers = None
+        if markers:
+            new_markers = packaging.markers.Marker(" or ".join(sorted(markers)))
         new_ireq = copy.deepcopy(self.requirement.ireq)
         new_ireq.req.specifier = new_specifiers
         new_ireq.req.marker = new_markers
+        new_ireq.markers = new_markers
         new_requirement = Requirement.from_line(format_requirement(new_ireq))
         compatible_versions = self.compatible_versions(other)
         if isinstance(compatible_versions, AbstractDependency):
             return compatible_versions
-        candidates = [
-            c
-            for c in self.candidates
-            if packaging.version.parse(version_from_ireq(c)) in compatible_versions
-        ]
+        positions = self._get_positions(compatible_versions)
+        candidates = [self.candidates[i] for i in positions]
         dep_dict = {}
         candidate_strings = [format_requirement(c) for c in candidates]
         for c in candidate_strings:
             if c in self.dep_dict:
                 dep_dict[c] = self.dep_dict.get(c)
-        return AbstractDependency(
+        dep = AbstractDependency(
             name=self.name,
             specifiers=new_specifiers,
             markers=new_markers,
@@ -189,23 +358,32 @@ class AbstractDependency(object):
             dep_dict=dep_dict,
             finder=self.finder
         )
+        dep._set_versions(tuple(self._versions[i] for i in positions))
+        return dep
 
-    def get_deps(self, candidate):
+    def get_deps(self, candidate, environment=None):
         """Get the dependencies of the supplied candidate.
 
         :param candidate: An installrequirement
         :type candidate: :class:`~pip._internal.req.req_install.InstallRequirement`
+        :param environment: The environment to look the dependencies up for,
+            defaults to the running interpreter
+        :type environment: :class:`~requirementslib.models.markers.TargetEnvironment`
         :return: A list of abstract dependencies
         :rtype: list[:class:`~requirementslib.models.dependency.AbstractDependency`]
         """
 
-        key = format_requirement(candidate)
+        line = format_requirement(candidate)
+        key = line if environment is None else (environment.name, line)
         if key not in self.dep_dict:
             from .requirements import Requirement
 
-            req = Requirement.from_line(key)
-            req.merge_markers(self.markers)
-            self.dep_dict[key] = req.get_abstract_dependencies()
+            with trace_span("get_deps", package=self.name, candidate=line):
+                req = Requirement.from_line(line)
+                req.merge_markers(self.markers)
+                self.dep_dict[key] = req.get_abstract_dependencies(
+                    environment=environment
+                )
         return self.dep_dict[key]
 
     @classmethod
@@ -227,20 +405,26 @@ class AbstractDependency(object):
         is_constraint = bool(parent)
         finder = get_finder(sources=None)
         candidates = []
+        versions = None
         if not is_pinned and not requirement.editable:
+            # Keep one candidate per version and sort them once, parsing each
+            # version a single time.
+            matches = {}
             for r in requirement.find_all_matches(finder=finder):
+                version = packaging.version.parse(str(r.version))
+                if version in matches:
+                    continue
                 req = make_install_requirement(
                     name, r.version, extras=extras, markers=markers, constraint=is_constraint,
                 )
-                req.req.link = r.location
+                req.req.link = get_candidate_link(r)
                 req.parent = parent
-                candidates.append(req)
-                candidates = sorted(
-                    set(candidates), key=lambda k: packaging.version.parse(version_from_ireq(k)),
-                )
+                matches[version] = req
+            versions = tuple(sorted(matches))
+            candidates = [matches[version] for version in versions]
         else:
             candidates = [requirement.ireq]
-        return cls(
+        dep = cls(
             name=name,
             specifiers=specifiers,
             markers=markers,
@@ -249,6 +433,9 @@ class AbstractDependency(object):
             parent=parent,
             finder=finder,
         )
+        if versions is not None:
+            dep._set_versions(versions)
+        return dep
 
     @classmethod
     def from_string(cls, line, parent=None):
@@ -297,8 +484,20 @@ def get_abstract_dependencies(reqs, sources=None, parent=None):
     return deps
 
 
-def get_dependencies(ireq, sources=None, parent=None):
-    # type: (Union[InstallRequirement, InstallationCandidate], Optional[List[Dict[S, Union[S, bool]]]], Optional[AbstractDependency]) -> Set[S, ...]
+def _as_install_requirement(ireq):
+    # type: (Union[InstallRequirement, InstallationCandidate]) -> InstallRequirement
+    # Candidates have no parsed requirement, install requirements always do
+    if getattr(ireq, "req", None) is not None:
+        return ireq
+    name = get_candidate_name(ireq)
+    version = getattr(ireq, "version", None)
+    if not version:
+        return pip_shims.shims.InstallRequirement.from_line("{0}".format(name))
+    return pip_shims.shims.InstallRequirement.from_line("{0}=={1}".format(name, version))
+
+
+def get_dependencies(ireq, sources=None, parent=None, environment=None):
+    # type: (Union[InstallRequirement, InstallationCandidate], Optional[List[Dict[S, Union[S, bool]]]], Optional[AbstractDependency], Optional[TargetEnvironment]) -> Set[S, ...]
     """Get all dependencies for a given install requirement.
 
     :param ireq: A single InstallRequirement
@@ -307,30 +506,35 @@ def get_dependencies(ireq, sources=None, parent=None):
     :type sources: list[dict], optional
     :param parent: The parent of this list of dependencies, defaults to None
     :type parent: :class:`~pip._internal.req.req_install.InstallRequirement`
+    :param environment: The environment to pick wheels and evaluate markers for,
+        defaults to the running interpreter
+    :type environment: :class:`~requirementslib.models.markers.TargetEnvironment`
     :return: A set of dependency lines for generating new InstallRequirements.
     :rtype: set(str)
     """
-    if not isinstance(ireq, pip_shims.shims.InstallRequirement):
-        name = getattr(
-            ireq, "project_name",
-            getattr(ireq, "project", ireq.name),
-        )
-        version = getattr(ireq, "version", None)
-        if not version:
-            ireq = pip_shims.shims.InstallRequirement.from_line("{0}".format(name))
-        else:
-            ireq = pip_shims.shims.InstallRequirement.from_line("{0}=={1}".format(name, version))
-    pip_options = get_pip_options(sources=sources)
+    ireq = _as_install_requirement(ireq)
+    # The finders are pooled by their sources, pip options are only parsed when
+    # a finder has to be built
     getters = [
+        get_dependencies_from_snapshot,
         get_dependencies_from_cache,
         get_dependencies_from_wheel_cache,
         get_dependencies_from_json,
-        functools.partial(get_dependencies_from_index, pip_options=pip_options)
+        functools.partial(
+            get_dependencies_from_wheel_metadata, sources=sources, environment=environment
+        ),
+        functools.partial(
+            get_dependencies_from_index, sources=sources, environment=environment
+        ),
     ]
     for getter in getters:
-        deps = getter(ireq)
+        name = getattr(getter, "func", getter).__name__
+        with trace_span(name, category="dependencies", package=ireq.name):
+            deps = getter(ireq)
         if deps is not None:
+            trace_count("{0}.hit".format(name))
             return deps
+        trace_count("{0}.miss".format(name))
     raise RuntimeError('failed to get dependencies for {}'.format(ireq))
 
 
@@ -345,12 +549,16 @@ def get_dependencies_from_wheel_cache(ireq):
 
     if ireq.editable or not is_pinned_requirement(ireq):
         return
-    matches = WHEEL_CACHE.get(ireq.link, name_from_req(ireq.req))
+    metrics = get_cache_metrics("wheel_cache")
+    with metrics.timed("load"):
+        matches = WHEEL_CACHE.get(ireq.link, name_from_req(ireq.req))
     if matches:
+        metrics.hit()
         matches = set(matches)
         if not DEPENDENCY_CACHE.get(ireq):
             DEPENDENCY_CACHE[ireq] = [format_requirement(m) for m in matches]
         return matches
+    metrics.miss()
     return
 
 
@@ -359,53 +567,228 @@ def _marker_contains_extra(ireq):
     return "extra" in repr(ireq.markers)
 
 
-def get_dependencies_from_json(ireq):
+def get_json_api_session():
+    """Returns the keep-alive HTTP session shared by all JSON API requests.
+
+    The session is created on first use and closed when the interpreter exits.
+    """
+    global _JSON_API_SESSION
+    with _JSON_API_SESSION_LOCK:
+        if _JSON_API_SESSION is None:
+            session = requests.session()
+            adapter = requests.adapters.HTTPAdapter(
+                pool_connections=JSON_API_WORKERS, pool_maxsize=JSON_API_WORKERS
+            )
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            atexit.register(session.close)
+            _JSON_API_SESSION = session
+        return _JSON_API_SESSION
+
+
+def _can_use_remote_metadata(ireq):
+    # It is technically possible to parse extras out of the JSON API's
+    # requirement format, but it is such a chore let's just use the simple API.
+    return not ireq.editable and is_pinned_requirement(ireq) and not ireq.extras
+
+
+def _fetch_dependencies_from_json(ireq, session=None, json_api_url=None):
+    """Fetch the dependency lines of a pinned requirement from the json api.
+
+    :return: A list of dependency lines, or None if the API has no usable answer.
+    :rtype: list[str] or None
+    """
+    if get_active_snapshot() is not None:
+        # Resolving offline
+        return None
+    if session is None:
+        session = get_json_api_session()
+    if json_api_url is None:
+        json_api_url = JSON_API_URL
+    version = str(ireq.req.specifier).lstrip("=")
+    url = "{0}/{1}/{2}/json".format(json_api_url.rstrip("/"), ireq.req.name, version)
+    try:
+        response = session.get(url)
+        trace_count("bytes_downloaded", len(response.content))
+        if not response.ok:
+            return None
+        info = response.json()["info"]
+    except (JSONDecodeError, KeyError, requests.RequestException):
+        return None
+    requires_dist = info.get("requires_dist", info.get("requires"))
+    # The API can return None for this.
+    return _get_dependency_lines(requires_dist or [])
+
+
+def _get_dependency_lines(requires_dist):
+    reqs = []
+    for requires in requires_dist:
+        i = pip_shims.shims.InstallRequirement.from_line(requires)
+        # We don't handle requirements with extras, see _can_use_remote_metadata.
+        if not _marker_contains_extra(i):
+            reqs.append(format_requirement(i))
+    return reqs
+
+
+def get_dependencies_from_json(ireq, session=None, json_api_url=None):
     """Retrieves dependencies for the given install requirement from the json api.
 
     :param ireq: A single InstallRequirement
     :type ireq: :class:`~pip._internal.req.req_install.InstallRequirement`
+    :param session: The session to use, defaults to :func:`get_json_api_session`
+    :type session: :class:`requests.Session`
+    :param str json_api_url: The JSON API base URL, defaults to :data:`JSON_API_URL`
     :return: A set of dependency lines for generating new InstallRequirements.
     :rtype: set(str) or None
     """
 
-    if ireq.editable or not is_pinned_requirement(ireq):
+    if not _can_use_remote_metadata(ireq):
         return
 
-    # It is technically possible to parse extras out of the JSON API's
-    # requirement format, but it is such a chore let's just use the simple API.
-    if ireq.extras:
+    # Cached dependencies are answered by get_dependencies_from_cache earlier
+    # in the getter chain, this always asks the API and stores the result.
+    reqs = _fetch_dependencies_from_json(ireq, session=session, json_api_url=json_api_url)
+    if reqs is None:
         return
+    DEPENDENCY_CACHE[ireq] = reqs
+    return set(reqs)
+
+
+def prefetch_dependencies(ireqs, max_workers=None, session=None, json_api_url=None):
+    """Fetch the dependencies of many pinned requirements from the json api at once.
+
+    Requirements which aren't in :data:`DEPENDENCY_CACHE` yet are looked up
+    concurrently over a shared session and the results are stored in the cache,
+    so later calls to :func:`get_dependencies` are answered from it.
+    Requirements the json api can't handle are skipped.
+
+    :param ireqs: The requirements to prefetch
+    :type ireqs: list[:class:`~pip._internal.req.req_install.InstallRequirement`]
+    :param int max_workers: The number of threads to use, defaults to :data:`JSON_API_WORKERS`
+    :param session: The session to use, defaults to :func:`get_json_api_session`
+    :type session: :class:`requests.Session`
+    :param str json_api_url: The JSON API base URL, defaults to :data:`JSON_API_URL`
+    :return: The number of requirements which were fetched and cached
+    :rtype: int
+    """
+    pending = [
+        ireq for ireq in ireqs
+        if _can_use_remote_metadata(ireq) and ireq not in DEPENDENCY_CACHE
+    ]
+    if not pending:
+        return 0
+    if session is None:
+        session = get_json_api_session()
+    fetch = functools.partial(
+        _fetch_dependencies_from_json, session=session, json_api_url=json_api_url
+    )
+    pool = ThreadPool(min(max_workers or JSON_API_WORKERS, len(pending)))
+    try:
+        results = pool.map(fetch, pending)
+    finally:
+        pool.close()
+        pool.join()
+    fetched = 0
+    # The cache is only written from this thread.
+    with DEPENDENCY_CACHE.transaction():
+        for ireq, reqs in zip(pending, results):
+            if reqs is not None:
+                DEPENDENCY_CACHE[ireq] = reqs
+                fetched += 1
+    return fetched
+
+
+def _is_supported_wheel(link, environment=None):
+    if not link.is_wheel:
+        return False
+    try:
+        wheel = pip_shims.shims.Wheel(link.filename)
+        if environment is not None:
+            return environment.supports_wheel(wheel)
+        return wheel.supported(pip_shims.shims.get_supported())
+    # Invalid wheel filenames are skipped along with anything else that goes wrong.
+    except Exception:
+        return False
 
-    session = requests.session()
-    atexit.register(session.close)
-    version = str(ireq.req.specifier).lstrip("=")
 
-    def gen(ireq):
-        info = None
-        try:
-            info = session.get(
-                "https://pypi.org/pypi/{0}/{1}/json".format(ireq.req.name, version)
-            ).json()["info"]
-        finally:
-            session.close()
-        requires_dist = info.get("requires_dist", info.get("requires"))
-        if not requires_dist:   # The API can return None for this.
-            return
-        for requires in requires_dist:
-            i = pip_shims.shims.InstallRequirement.from_line(requires)
-            # See above, we don't handle requirements with extras.
-            if not _marker_contains_extra(i):
-                yield format_requirement(i)
-
-    if ireq not in DEPENDENCY_CACHE:
+def get_dependencies_from_wheel_metadata(
+    ireq, sources=None, pip_options=None, environment=None
+):
+    """Retrieves dependencies for the given install requirement from the metadata of
+    a wheel on the index.
+
+    Only the metadata is transferred: the index's ``.metadata`` file is used if it
+    provides one, otherwise ``METADATA`` is read out of the remote wheel using
+    HTTP range requests.  Local wheels are read directly.
+
+    :param ireq: A single InstallRequirement
+    :type ireq: :class:`~pip._internal.req.req_install.InstallRequirement`
+    :param sources: Pipfile-formatted sources, defaults to None
+    :type sources: list[dict], optional
+    :param environment: The environment to pick a wheel for, defaults to the
+        running interpreter
+    :type environment: :class:`~requirementslib.models.markers.TargetEnvironment`
+    :return: A set of dependency lines for generating new InstallRequirements.
+    :rtype: set(str) or None
+    """
+
+    if not _can_use_remote_metadata(ireq):
+        return
+    finder = get_finder(sources=sources, pip_options=pip_options)
+    links = sorted(
+        (
+            link for link in (
+                get_candidate_link(c) for c in find_all_matches(finder, ireq, pre=True)
+            )
+            if _is_supported_wheel(link, environment)
+        ),
+        key=lambda link: link.filename,
+    )
+    for link in links:
         try:
-            reqs = DEPENDENCY_CACHE[ireq] = list(gen(ireq))
-        except JSONDecodeError:
-            return
-        req_iter = iter(reqs)
-    else:
-        req_iter = gen(ireq)
-    return set(req_iter)
+            if pip_shims.shims.is_file_url(link):
+                with open(url_to_path(link.url_without_fragment), "rb") as fh:
+                    metadata = read_wheel_metadata(fh)
+            else:
+                metadata = get_remote_wheel_metadata(link, finder.session)
+        except (
+            EnvironmentError, KeyError, zipfile.BadZipfile, requests.RequestException,
+            HTTPRangeRequestUnsupported
+        ):
+            continue
+        reqs = _get_dependency_lines(get_requires_dist(metadata))
+        DEPENDENCY_CACHE[ireq] = reqs
+        return set(reqs)
+    return
+
+
+def get_dependencies_from_snapshot(ireq):
+    """Retrieves dependencies for the given install requirement from the active snapshot.
+
+    :param ireq: A single InstallRequirement
+    :type ireq: :class:`~pip._internal.req.req_install.InstallRequirement`
+    :return: A set of dependency lines for generating new InstallRequirements.
+    :rtype: set(str) or None
+    """
+
+    snapshot = get_active_snapshot()
+    if snapshot is None:
+        return
+    deps = snapshot.get_dependencies(ireq)
+    if deps is None:
+        return
+    return set(deps)
+
+
+def _is_broken_dependency_line(line, name):
+    """Check a cached line which isn't a PEP 508 requirement the slow way."""
+    try:
+        dep_ireq = pip_shims.shims.InstallRequirement.from_line(line)
+        return (
+            _marker_contains_extra(dep_ireq) or canonicalize_name(dep_ireq.name) == name
+        )
+    except Exception:
+        return True
 
 
 def get_dependencies_from_cache(ireq):
@@ -418,57 +801,93 @@ def get_dependencies_from_cache(ireq):
     """
     if ireq.editable or not is_pinned_requirement(ireq):
         return
-    if ireq not in DEPENDENCY_CACHE:
+    # Records are validated when they are written to the cache, so there is no
+    # need to parse every line again here.
+    records = DEPENDENCY_CACHE.get_records(ireq)
+    if records is None:
         return
-    cached = set(DEPENDENCY_CACHE[ireq])
 
     # Preserving sanity: Run through the cache and make sure every entry if
     # valid. If this fails, something is wrong with the cache. Drop it.
-    try:
-        broken = False
-        for line in cached:
-            dep_ireq = pip_shims.shims.InstallRequirement.from_line(line)
-            name = canonicalize_name(dep_ireq.name)
-            if _marker_contains_extra(dep_ireq):
-                broken = True   # The "extra =" marker breaks everything.
-            elif name == canonicalize_name(ireq.name):
-                broken = True   # A package cannot depend on itself.
-            if broken:
-                break
-    except Exception:
-        broken = True
+    name = canonicalize_name(ireq.name)
+    broken = any(
+        # The "extra =" marker breaks everything, and a package cannot depend on itself.
+        record["has_extra_marker"] or record["name"] == name
+        if record["name"] is not None else _is_broken_dependency_line(record["line"], name)
+        for record in records
+    )
 
     if broken:
         del DEPENDENCY_CACHE[ireq]
         return
 
-    return cached
+    return set(record["line"] for record in records)
 
 
 def is_python(section):
     return section.startswith('[') and ':' in section
 
 
-def get_dependencies_from_index(dep, sources=None, pip_options=None, wheel_cache=None):
+def _match_markers_in(reqset, environment):
+    """Make *reqset* evaluate the markers of the requirements added to it in
+    *environment*, pip drops the ones which don't hold for the running interpreter."""
+    add_requirement = reqset.add_requirement
+    marker_environment = environment.marker_environment
+
+    def _add_requirement(install_req, *args, **kwargs):
+        def match_markers(extras_requested=None):
+            if install_req.markers is None:
+                return True
+            return any(
+                install_req.markers.evaluate(dict(marker_environment, extra=extra))
+                for extra in extras_requested or ("",)
+            )
+
+        install_req.match_markers = match_markers
+        try:
+            return add_requirement(install_req, *args, **kwargs)
+        finally:
+            del install_req.match_markers
+
+    reqset.add_requirement = _add_requirement
+
+
+def get_dependencies_from_index(
+    dep, sources=None, pip_options=None, wheel_cache=None, resolver_context=None,
+    environment=None
+):
     """Retrieves dependencies for the given install requirement from the pip resolver.
 
     :param dep: A single InstallRequirement
     :type dep: :class:`~pip._internal.req.req_install.InstallRequirement`
     :param sources: Pipfile-formatted sources, defaults to None
     :type sources: list[dict], optional
+    :param resolver_context: A resolver setup to reuse, defaults to the entered
+        :class:`ResolverContext` for the same finder, if any, or a new one
+    :type resolver_context: :class:`ResolverContext`
+    :param environment: The environment to evaluate markers for, defaults to the
+        running interpreter.  The result only holds for that environment, so it
+        isn't written to the dependency cache.
+    :type environment: :class:`~requirementslib.models.markers.TargetEnvironment`
     :return: A set of dependency lines for generating new InstallRequirements.
     :rtype: set(str) or None
     """
 
-    finder = get_finder(sources=sources, pip_options=pip_options)
-    if not wheel_cache:
-        wheel_cache = WHEEL_CACHE
+    finder = None
+    if resolver_context is None:
+        finder = get_finder(sources=sources, pip_options=pip_options)
     dep.is_direct = True
     reqset = pip_shims.shims.RequirementSet()
+    if environment is not None:
+        _match_markers_in(reqset, environment)
     reqset.add_requirement(dep)
     requirements = None
     setup_requires = {}
-    with temp_environ(), start_resolver(finder=finder, wheel_cache=wheel_cache) as resolver:
+    with temp_environ(), _use_resolver_context(
+        resolver_context, finder, wheel_cache
+    ) as context:
+        resolver = context.get_resolver()
+        wheel_cache = context.wheel_cache
         os.environ['PIP_EXISTS_ACTION'] = 'i'
         dist = None
         if dep.editable and not dep.prepared and not dep.req:
@@ -488,12 +907,17 @@ def get_dependencies_from_index(dep, sources=None, pip_options=None, wheel_cache
                     else:
                         setup_requires[dist.get_name()] = dist.setup_requires
         resolver.require_hashes = False
+        ignore_requires_python = getattr(resolver, "ignore_requires_python", False)
+        if environment is not None:
+            # Candidates were already checked against the environment's Python
+            resolver.ignore_requires_python = True
         try:
             results = resolver._resolve_one(reqset, dep)
         except Exception:
             # FIXME: Needs to bubble the exception somehow to the user.
             results = []
         finally:
+            resolver.ignore_requires_python = ignore_requires_python
             try:
                 wheel_cache.cleanup()
             except AttributeError:
@@ -504,7 +928,9 @@ def get_dependencies_from_index(dep, sources=None, pip_options=None, wheel_cache
             add_marker = fix_requires_python_marker(requires_python)
             reqset.remove(dep)
             if dep.req.marker:
-                dep.req.marker._markers.extend(['and',].extend(add_marker._markers))
+                dep.req.marker = packaging.markers.Marker(
+                    "({0}) and ({1})".format(dep.req.marker, add_marker)
+                )
             else:
                 dep.req.marker = add_marker
             reqset.add(dep)
@@ -512,7 +938,9 @@ def get_dependencies_from_index(dep, sources=None, pip_options=None, wheel_cache
         for r in results:
             if requires_python:
                 if r.req.marker:
-                    r.req.marker._markers.extend(['and',].extend(add_marker._markers))
+                    r.req.marker = packaging.markers.Marker(
+                        "({0}) and ({1})".format(r.req.marker, add_marker)
+                    )
                 else:
                     r.req.marker = add_marker
             requirements.add(format_requirement(r))
@@ -539,7 +967,10 @@ def get_dependencies_from_index(dep, sources=None, pip_options=None, wheel_cache
                     except Exception:
                         pass
 
-    if not dep.editable and is_pinned_requirement(dep) and requirements is not None:
+    if (
+        environment is None and not dep.editable and is_pinned_requirement(dep) and
+        requirements is not None
+    ):
         DEPENDENCY_CACHE[dep] = list(requirements)
     return requirements
 
@@ -559,9 +990,7 @@ def get_pip_options(args=[], sources=None, pip_command=None):
     if not pip_command:
         pip_command = get_pip_command()
     if not sources:
-        sources = [
-            {"url": "https://pypi.org/simple", "name": "pypi", "verify_ssl": True}
-        ]
+        sources = get_default_sources()
     _ensure_dir(CACHE_DIR)
     pip_args = args
     pip_args = prepare_pip_source_args(sources, pip_args)
@@ -570,32 +999,90 @@ def get_pip_options(args=[], sources=None, pip_command=None):
     return pip_options
 
 
-def get_finder(sources=None, pip_command=None, pip_options=None):
-    # type: (List[Dict[S, Union[S, bool]]], Optional[Command], Any) -> PackageFinder
-    """Get a package finder for looking up candidates to install
+class FinderPool(object):
+    """A registry of package finders, keyed by their sources and options.
 
-    :param sources: A list of pipfile-formatted sources, defaults to None
-    :param sources: list[dict], optional
-    :param pip_command: A pip command instance, defaults to None
-    :type pip_command: :class:`~pip._internal.cli.base_command.Command`
-    :param pip_options: A pip options, defaults to None
-    :type pip_options: :class:`~pip._internal.cli.cmdoptions`
-    :return: A package finder
-    :rtype: :class:`~pip._internal.index.PackageFinder`
+    Finders are built on first use and then shared, together with their HTTP
+    sessions, so connections and the index page cache are reused across a
+    whole resolution.  The sessions stay open until :meth:`close` is called,
+    the pool is used as a context manager and exits, or the interpreter exits.
+
+    Pooled finders may be used from several threads at once, their lookups are
+    serialized by :func:`~requirementslib.models.utils.find_all_candidates`.
     """
 
+    def __init__(self):
+        self._finders = {}
+        self._default_options_keys = {}
+        self._lock = threading.RLock()
+        atexit.register(self.close)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return len(self._finders)
+
+    @staticmethod
+    def _get_options_key(pip_options):
+        return (
+            bool(getattr(pip_options, "pre", False)),
+            getattr(pip_options, "index_url", None),
+            tuple(getattr(pip_options, "extra_index_urls", None) or ()),
+            tuple(getattr(pip_options, "trusted_hosts", None) or ()),
+            tuple(getattr(pip_options, "find_links", None) or ()),
+        )
+
+    def get_key(self, sources, pip_options=None):
+        """Build the pool key for a list of sources and a set of pip options.
+
+        Without *pip_options* the default options for the sources are used, so
+        the key is the same as when they are passed explicitly.
+        """
+        source_key = tuple(
+            (source.get("url", "").rstrip("/"), bool(source.get("verify_ssl", True)))
+            for source in sources
+        )
+        if pip_options is not None:
+            return source_key, self._get_options_key(pip_options)
+        with self._lock:
+            options_key = self._default_options_keys.get(source_key)
+            if options_key is None:
+                options_key = self._get_options_key(get_pip_options(sources=list(sources)))
+                self._default_options_keys[source_key] = options_key
+        return source_key, options_key
+
+    def get(self, key, factory):
+        """Return the finder for *key*, building it with *factory* if needed."""
+        with self._lock:
+            finder = self._finders.get(key)
+            if finder is None:
+                finder = self._finders[key] = factory()
+            return finder
+
+    def close(self):
+        """Close the sessions of all pooled finders and empty the pool."""
+        with self._lock:
+            finders, self._finders = list(self._finders.values()), {}
+        for finder in finders:
+            finder.session.close()
+
+
+#: The pool shared by :func:`get_finder`
+FINDER_POOL = FinderPool()
+
+
+def _build_finder(sources, pip_command=None, pip_options=None, find_links=None):
     if not pip_command:
         pip_command = get_pip_command()
-    if not sources:
-        sources = [
-            {"url": "https://pypi.org/simple", "name": "pypi", "verify_ssl": True}
-        ]
     if not pip_options:
         pip_options = get_pip_options(sources=sources, pip_command=pip_command)
     session = pip_command._build_session(pip_options)
-    atexit.register(session.close)
     finder = pip_shims.shims.PackageFinder(
-        find_links=[],
+        find_links=find_links or [],
         index_urls=[s.get("url") for s in sources],
         trusted_hosts=[],
         allow_all_prereleases=pip_options.pre,
@@ -604,63 +1091,226 @@ def get_finder(sources=None, pip_command=None, pip_options=None):
     return finder
 
 
+def get_finder(sources=None, pip_command=None, pip_options=None, pool=None):
+    # type: (List[Dict[S, Union[S, bool]]], Optional[Command], Any, Optional[FinderPool]) -> PackageFinder
+    """Get a package finder for looking up candidates to install
+
+    Finders are shared through a :class:`FinderPool` keyed by the sources and
+    pip options, so repeated calls reuse the same finder and HTTP session.
+    While a snapshot is active, see :func:`~requirementslib.models.snapshot.use_snapshot`,
+    the finder only searches the snapshot's files.
+
+    :param sources: A list of pipfile-formatted sources, defaults to None
+    :param sources: list[dict], optional
+    :param pip_command: A pip command instance, defaults to None
+    :type pip_command: :class:`~pip._internal.cli.base_command.Command`
+    :param pip_options: A pip options, defaults to None
+    :type pip_options: :class:`~pip._internal.cli.cmdoptions`
+    :param pool: The pool to get the finder from, defaults to :data:`FINDER_POOL`
+    :type pool: :class:`~requirementslib.models.dependencies.FinderPool`
+    :return: A package finder
+    :rtype: :class:`~pip._internal.index.PackageFinder`
+    """
+
+    if not sources:
+        sources = get_default_sources()
+    if pool is None:
+        pool = FINDER_POOL
+    snapshot = get_active_snapshot()
+    if snapshot is not None:
+        # Only search the snapshot's files when resolving offline
+        return pool.get(
+            ("snapshot", snapshot.path),
+            functools.partial(
+                _build_finder, [], pip_command=pip_command, pip_options=pip_options,
+                find_links=[snapshot.files_dir],
+            ),
+        )
+    key = pool.get_key(sources, pip_options)
+    return pool.get(
+        key,
+        functools.partial(
+            _build_finder, sources, pip_command=pip_command, pip_options=pip_options
+        ),
+    )
+
+
+class ResolverContext(object):
+    """A pip resolver setup which can be reused for many dependencies.
+
+    The pip options are parsed, the finder is built, the build and source
+    directories are created and pip's requirement tracker is started once, the
+    first time a resolver is needed; :meth:`get_resolver` then only has to create
+    a cheap resolver object for each dependency.  Everything is torn down when
+    the context is closed.  While it is entered,
+    :func:`get_dependencies_from_index` uses it for any dependency searched for
+    with the same finder::
+
+        with ResolverContext() as context:
+            for ireq in ireqs:
+                get_dependencies_from_index(ireq, resolver_context=context)
+
+    :param finder: A package finder to use for searching the index, defaults to
+        a finder for the default sources
+    :type finder: :class:`~pip._internal.index.PackageFinder`
+    :param wheel_cache: The wheel cache to use, defaults to :data:`WHEEL_CACHE`
+    :type wheel_cache: :class:`~pip._internal.cache.WheelCache`
+
+    Contexts are only visible to the thread which entered them, since pip's
+    preparer and requirement tracker aren't thread safe.  A context may be
+    entered more than once, it is closed when the outermost block exits.
+    """
+
+    _local = threading.local()
+
+    def __init__(self, finder=None, wheel_cache=None):
+        self.finder = finder
+        self.wheel_cache = wheel_cache
+        self.preparer = None
+        self._tracker = None
+        self._tempdirs = []
+        self._depth = 0
+        self._depth_lock = threading.Lock()
+
+    @classmethod
+    def _active(cls):
+        active = getattr(cls._local, "active", None)
+        if active is None:
+            active = cls._local.active = []
+        return active
+
+    @classmethod
+    def current(cls):
+        """The innermost context which is currently entered in this thread, or None."""
+        active = cls._active()
+        return active[-1] if active else None
+
+    @property
+    def is_open(self):
+        return self.preparer is not None
+
+    def _ensure_finder(self):
+        if not self.finder:
+            self.finder = get_finder()
+        if not self.wheel_cache:
+            self.wheel_cache = WHEEL_CACHE
+
+    def matches(self, finder, wheel_cache=None):
+        """Whether this context can resolve dependencies found with *finder*."""
+        self._ensure_finder()
+        return self.finder is finder and (
+            not wheel_cache or wheel_cache is self.wheel_cache
+        )
+
+    def open(self):
+        if self.is_open:
+            return self
+        self._ensure_finder()
+        _ensure_dir(fs_str(os.path.join(self.wheel_cache.cache_dir, "wheels")))
+
+        download_dir = PKGS_DOWNLOAD_DIR
+        _ensure_dir(download_dir)
+
+        build_dir = create_tracked_tempdir(fs_str("build"))
+        source_dir = create_tracked_tempdir(fs_str("source"))
+        self._tempdirs = [build_dir, source_dir]
+        preparer = partialclass(
+            pip_shims.shims.RequirementPreparer,
+            build_dir=build_dir,
+            src_dir=source_dir,
+            download_dir=download_dir,
+            wheel_download_dir=WHEEL_DOWNLOAD_DIR,
+            progress_bar="off",
+            build_isolation=False,
+        )
+        if packaging.version.parse(pip_shims.shims.pip_version) >= packaging.version.parse('18'):
+            self._tracker = pip_shims.shims.RequirementTracker()
+            req_tracker = self._tracker.__enter__()
+            self.preparer = preparer(req_tracker=req_tracker)
+        else:
+            self.preparer = preparer()
+        return self
+
+    def get_resolver(self):
+        """Create a pip resolver sharing this context's finder and preparer.
+
+        :rtype: :class:`~pip._internal.resolve.Resolver`
+        """
+        if not self.is_open:
+            self.open()
+        # The finder's session belongs to the finder pool, which closes it.
+        return pip_shims.shims.Resolver(
+            preparer=self.preparer,
+            finder=self.finder,
+            session=self.finder.session,
+            upgrade_strategy="to-satisfy-only",
+            force_reinstall=True,
+            ignore_dependencies=False,
+            ignore_requires_python=True,
+            ignore_installed=True,
+            isolated=False,
+            wheel_cache=self.wheel_cache,
+            use_user_site=False,
+        )
+
+    def close(self):
+        tracker, self._tracker = self._tracker, None
+        tempdirs, self._tempdirs = self._tempdirs, []
+        self.preparer = None
+        try:
+            if tracker is not None:
+                tracker.__exit__(None, None, None)
+        finally:
+            for tempdir in tempdirs:
+                rmtree(tempdir, ignore_errors=True)
+
+    def __enter__(self):
+        self._ensure_finder()
+        with self._depth_lock:
+            self._depth += 1
+        self._active().append(self)
+        return self
+
+    def __exit__(self, *args):
+        active = self._active()
+        del active[len(active) - 1 - active[::-1].index(self)]
+        with self._depth_lock:
+            self._depth -= 1
+            outermost = not self._depth
+        if outermost:
+            self.close()
+
+
 @contextlib.contextmanager
 def start_resolver(finder=None, wheel_cache=None):
     """Context manager to produce a resolver.
 
+    Use a :class:`ResolverContext` to share one setup between many resolvers.
+
     :param finder: A package finder to use for searching the index
     :type finder: :class:`~pip._internal.index.PackageFinder`
     :return: A 3-tuple of finder, preparer, resolver
     :rtype: (:class:`~pip._internal.operations.prepare.RequirementPreparer`, :class:`~pip._internal.resolve.Resolver`)
     """
 
-    pip_command = get_pip_command()
-    pip_options = get_pip_options(pip_command=pip_command)
-
-    if not finder:
-        finder = get_finder(pip_command=pip_command, pip_options=pip_options)
-
-    if not wheel_cache:
-        wheel_cache = WHEEL_CACHE
-    _ensure_dir(fs_str(os.path.join(wheel_cache.cache_dir, "wheels")))
-
-    download_dir = PKGS_DOWNLOAD_DIR
-    _ensure_dir(download_dir)
-
-    _build_dir = create_tracked_tempdir(fs_str("build"))
-    _source_dir = create_tracked_tempdir(fs_str("source"))
-    preparer = partialclass(
-        pip_shims.shims.RequirementPreparer,
-        build_dir=_build_dir,
-        src_dir=_source_dir,
-        download_dir=download_dir,
-        wheel_download_dir=WHEEL_DOWNLOAD_DIR,
-        progress_bar="off",
-        build_isolation=False,
-    )
-    resolver = partialclass(
-        pip_shims.shims.Resolver,
-        finder=finder,
-        session=finder.session,
-        upgrade_strategy="to-satisfy-only",
-        force_reinstall=True,
-        ignore_dependencies=False,
-        ignore_requires_python=True,
-        ignore_installed=True,
-        isolated=False,
-        wheel_cache=wheel_cache,
-        use_user_site=False,
-    )
+    context = ResolverContext(finder=finder, wheel_cache=wheel_cache)
     try:
-        if packaging.version.parse(pip_shims.shims.pip_version) >= packaging.version.parse('18'):
-            with pip_shims.shims.RequirementTracker() as req_tracker:
-                preparer = preparer(req_tracker=req_tracker)
-                yield resolver(preparer=preparer)
-        else:
-            preparer = preparer()
-            yield resolver(preparer=preparer)
+        yield context.open().get_resolver()
     finally:
-        finder.session.close()
+        context.close()
+
+
+@contextlib.contextmanager
+def _use_resolver_context(resolver_context, finder, wheel_cache):
+    if resolver_context is None:
+        current = ResolverContext.current()
+        if current is not None and current.matches(finder, wheel_cache):
+            resolver_context = current
+    if resolver_context is not None:
+        yield resolver_context
+        return
+    with ResolverContext(finder=finder, wheel_cache=wheel_cache) as context:
+        yield context
 
 
 def get_grouped_dependencies(constraints):
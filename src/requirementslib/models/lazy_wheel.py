@@ -0,0 +1,200 @@
+# -*- coding=utf-8 -*-
+"""Read the metadata of remote wheels without downloading them.
+
+A wheel is a zip file, so its ``*.dist-info/METADATA`` can be found from the
+central directory at the end of the archive.  :class:`HTTPRangeFile` exposes a
+remote file as a seekable file object which only fetches the byte ranges that
+are actually read, so :mod:`zipfile` ends up transferring a few kilobytes
+instead of the whole wheel.
+"""
+from __future__ import absolute_import, print_function
+
+import email.parser
+import io
+import os
+import zipfile
+
+import six
+
+from .tracing import trace_count
+
+#: The number of bytes fetched by each range request
+CHUNK_SIZE = 10 * 1024
+
+
+class HTTPRangeRequestUnsupported(Exception):
+    """Raised when a server can't serve byte ranges of a file."""
+
+
+class HTTPRangeFile(io.RawIOBase):
+    """A read-only, seekable file over HTTP which fetches byte ranges on demand.
+
+    Fetched ranges are kept in memory in blocks of *chunk_size* bytes, and
+    adjacent missing blocks are fetched in a single request.
+
+    :param str url: The URL of the file
+    :param session: The session to make requests with
+    :type session: :class:`requests.Session`
+    :param int chunk_size: The size of the blocks to fetch, defaults to :data:`CHUNK_SIZE`
+    :raises HTTPRangeRequestUnsupported: If the server doesn't support range requests
+    """
+
+    def __init__(self, url, session, chunk_size=CHUNK_SIZE):
+        super(HTTPRangeFile, self).__init__()
+        self.url = url
+        self.session = session
+        self.chunk_size = chunk_size
+        response = session.head(url, allow_redirects=True)
+        response.raise_for_status()
+        if response.headers.get("Accept-Ranges", "none").lower() != "bytes":
+            raise HTTPRangeRequestUnsupported(url)
+        self.url = response.url
+        if "Content-Length" not in response.headers:
+            raise HTTPRangeRequestUnsupported(url)
+        self.length = int(response.headers["Content-Length"])
+        self.bytes_fetched = 0
+        self._chunks = {}
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            offset += self._position
+        elif whence == os.SEEK_END:
+            offset += self.length
+        if offset < 0:
+            raise ValueError("negative seek position {0}".format(offset))
+        self._position = offset
+        return self._position
+
+    def _fetch(self, first_chunk, last_chunk):
+        start = first_chunk * self.chunk_size
+        end = min((last_chunk + 1) * self.chunk_size, self.length) - 1
+        response = self.session.get(
+            self.url, headers={"Range": "bytes={0}-{1}".format(start, end)}, stream=True
+        )
+        # A server which ignores the range answers with the whole wheel, check
+        # before reading the body.
+        if response.status_code != 206:
+            response.close()
+            response.raise_for_status()
+            raise HTTPRangeRequestUnsupported(self.url)
+        content = response.content
+        self.bytes_fetched += len(content)
+        trace_count("bytes_downloaded", len(content))
+        for index in range(first_chunk, last_chunk + 1):
+            offset = (index - first_chunk) * self.chunk_size
+            self._chunks[index] = content[offset:offset + self.chunk_size]
+
+    def _ensure_chunks(self, first_chunk, last_chunk):
+        missing = None
+        for index in range(first_chunk, last_chunk + 1):
+            if index in self._chunks:
+                if missing is not None:
+                    self._fetch(missing, index - 1)
+                    missing = None
+            elif missing is None:
+                missing = index
+        if missing is not None:
+            self._fetch(missing, last_chunk)
+
+    def read(self, size=-1):
+        end = self.length if size is None or size < 0 else min(
+            self.length, self._position + size
+        )
+        if self._position >= end:
+            return b""
+        first_chunk = self._position // self.chunk_size
+        last_chunk = (end - 1) // self.chunk_size
+        self._ensure_chunks(first_chunk, last_chunk)
+        data = b"".join(self._chunks[i] for i in range(first_chunk, last_chunk + 1))
+        offset = first_chunk * self.chunk_size
+        result = data[self._position - offset:end - offset]
+        self._position = end
+        return result
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def read_wheel_metadata(fileobj):
+    """Read the ``METADATA`` file of the wheel in the given file object.
+
+    :param fileobj: A seekable file object containing a wheel
+    :return: The text of the metadata file
+    :rtype: str
+    :raises KeyError: If the wheel has no metadata file
+    """
+    with zipfile.ZipFile(fileobj) as wheel:
+        for name in wheel.namelist():
+            directory, _, filename = name.partition("/")
+            if directory.endswith(".dist-info") and filename == "METADATA":
+                return wheel.read(name).decode("utf-8")
+    raise KeyError("no .dist-info/METADATA found in wheel")
+
+
+def get_metadata_url(link):
+    """Returns the URL of the standalone metadata file an index provides for a link.
+
+    Indexes which implement :pep:`658` serve the metadata of a distribution at
+    ``<url>.metadata``.  Only links which advertise one are considered.
+
+    :param link: A link to a distribution
+    :type link: :class:`~pip._internal.models.link.Link`
+    :return: The URL of the metadata file, or None
+    :rtype: str or None
+    """
+    metadata_link = getattr(link, "metadata_link", None)
+    if callable(metadata_link):
+        metadata_link = metadata_link()
+        if metadata_link is not None:
+            return metadata_link.url_without_fragment
+    if getattr(link, "dist_info_metadata", None):
+        return "{0}.metadata".format(link.url_without_fragment)
+    return None
+
+
+def get_remote_wheel_metadata(link, session, chunk_size=CHUNK_SIZE):
+    """Fetch the metadata of a remote wheel.
+
+    The index's standalone metadata file is used when the link advertises one,
+    otherwise the metadata is read out of the wheel with range requests.
+
+    :param link: A link to a wheel
+    :type link: :class:`~pip._internal.models.link.Link`
+    :param session: The session to make requests with
+    :type session: :class:`requests.Session`
+    :param int chunk_size: The size of the blocks to fetch, defaults to :data:`CHUNK_SIZE`
+    :return: The text of the metadata file
+    :rtype: str
+    :raises HTTPRangeRequestUnsupported: If the server doesn't support range requests
+    """
+    metadata_url = get_metadata_url(link)
+    if metadata_url is not None:
+        response = session.get(metadata_url)
+        if response.ok:
+            return response.content.decode("utf-8")
+    fileobj = HTTPRangeFile(link.url_without_fragment, session, chunk_size=chunk_size)
+    return read_wheel_metadata(fileobj)
+
+
+def get_requires_dist(metadata):
+    """Returns the ``Requires-Dist`` entries of a metadata file.
+
+    :param str metadata: The text of a ``METADATA`` or ``PKG-INFO`` file
+    :rtype: list[str]
+    """
+    if six.PY2 and isinstance(metadata, six.text_type):
+        metadata = metadata.encode("utf-8")
+    message = email.parser.Parser().parsestr(metadata)
+    return message.get_all("Requires-Dist") or []
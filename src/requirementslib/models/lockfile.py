@@ -9,6 +9,7 @@ import itertools
 import plette.lockfiles
 import six
 
+from packaging.utils import canonicalize_name
 from vistir.compat import Path, FileNotFoundError, JSONDecodeError
 
 from .project import ProjectFile
@@ -118,6 +119,25 @@ class Lockfile(object):
         deps = merge_items([deps, self.default._data])
         return deps
 
+    def get_pinned_versions(self, dev=True, only=False):
+        """Returns the version each named requirement in the lockfile is pinned to.
+
+        Editable and VCS entries aren't pinned to a version and are skipped.
+
+        :param bool dev: Indicates whether to use dev requirements, defaults to True
+        :param bool only: Indicates whether to use only dev requirements, defaults to False
+        :return: A mapping of canonical names to versions
+        :rtype: dict[str, str]
+        """
+        pins = {}
+        for name, entry in self.get_deps(dev=dev, only=only).items():
+            if not isinstance(entry, dict) or entry.get("editable") or is_vcs(entry):
+                continue
+            version = entry.get("version", "")
+            if version.startswith("=="):
+                pins[canonicalize_name(name)] = version.lstrip("=")
+        return pins
+
     @classmethod
     def read_projectfile(cls, path):
         """Read the specified project file and provide an interface for writing/updating.
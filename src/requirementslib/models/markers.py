@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
+import copy
 import itertools
 import operator
 
@@ -6,12 +7,13 @@ import attr
 import distlib.markers
 import packaging.version
 import six
-from packaging.markers import InvalidMarker, Marker
+from packaging.markers import InvalidMarker, Marker, default_environment
 from packaging.specifiers import Specifier, SpecifierSet
 from vistir.compat import Mapping, Set, lru_cache
 from vistir.misc import dedup
 
-from .utils import filter_none, validate_markers
+from .metrics import METRICS
+from .utils import filter_none, supports_python, validate_markers
 from ..environment import MYPY_RUNNING
 from ..exceptions import RequirementError
 
@@ -117,6 +119,155 @@ class PipenvMarkers(object):
             return combined_marker
 
 
+#: ``platform_system`` and ``os_name`` for each ``sys_platform``
+PLATFORMS = {
+    "linux": ("Linux", "posix"),
+    "darwin": ("Darwin", "posix"),
+    "win32": ("Windows", "nt"),
+    "cygwin": ("CYGWIN_NT", "posix"),
+}
+#: ``platform_python_implementation`` for each ``implementation_name``
+IMPLEMENTATIONS = {"cpython": "CPython", "pypy": "PyPy", "ironpython": "IronPython"}
+#: The wheel python tag prefix of each ``implementation_name``
+IMPLEMENTATION_TAGS = {"cpython": "cp", "pypy": "pp", "ironpython": "ip", "jython": "jy"}
+#: The prefixes of the wheel platform tags of each ``sys_platform``
+PLATFORM_TAGS = {
+    "linux": ("linux", "manylinux"),
+    "darwin": ("macosx",),
+    "win32": ("win",),
+    "cygwin": ("cygwin",),
+}
+
+
+@attr.s(frozen=True)
+class TargetEnvironment(object):
+    """An environment to resolve dependencies for, other than the running one.
+
+    Markers are evaluated with the given values, anything not given is taken from
+    the running interpreter.
+
+    :param str python_version: The Python version, e.g. ``3.6`` or ``3.6.8``
+    :param str sys_platform: The platform, e.g. ``linux``, ``darwin`` or ``win32``
+    :param str platform_machine: The machine type, e.g. ``x86_64``
+    :param str implementation_name: The Python implementation, e.g. ``cpython``
+    """
+
+    python_version = attr.ib(converter=str)
+    sys_platform = attr.ib(default=None)
+    platform_machine = attr.ib(default=None)
+    implementation_name = attr.ib(default=None)
+    _marker_environment = attr.ib(init=False, cmp=False, repr=False)
+
+    def __attrs_post_init__(self):
+        # Computed once, markers are evaluated against it for every candidate
+        object.__setattr__(self, "_marker_environment", self._get_marker_environment())
+
+    @property
+    def name(self):
+        parts = ["py{0}".format(self.python_version)]
+        parts.extend(
+            part for part in (
+                self.implementation_name, self.sys_platform, self.platform_machine
+            ) if part
+        )
+        return "-".join(parts)
+
+    @property
+    def python_full_version(self):
+        parts = self.python_version.split(".")
+        return ".".join(parts + ["0"] * (3 - len(parts)))
+
+    @property
+    def marker_environment(self):
+        """The values of the :pep:`508` environment markers in this environment.
+
+        :rtype: dict[str, str]
+        """
+        return dict(self._marker_environment)
+
+    def _get_marker_environment(self):
+        environment = default_environment()
+        environment["python_version"] = ".".join(self.python_full_version.split(".")[:2])
+        environment["python_full_version"] = self.python_full_version
+        if self.sys_platform:
+            environment["sys_platform"] = self.sys_platform
+            if self.sys_platform in PLATFORMS:
+                system, os_name = PLATFORMS[self.sys_platform]
+                environment["platform_system"] = system
+                environment["os_name"] = os_name
+        if self.platform_machine:
+            environment["platform_machine"] = self.platform_machine
+        if self.implementation_name:
+            environment["implementation_name"] = self.implementation_name
+            environment["platform_python_implementation"] = IMPLEMENTATIONS.get(
+                self.implementation_name, self.implementation_name
+            )
+        environment.setdefault("extra", "")
+        return environment
+
+    def evaluate(self, marker):
+        """Whether a marker holds in this environment, no marker always does.
+
+        :param marker: The marker to evaluate
+        :type marker: :class:`~packaging.markers.Marker` or str or None
+        :rtype: bool
+        """
+        if not marker:
+            return True
+        if not isinstance(marker, Marker):
+            marker = Marker(str(marker))
+        return marker.evaluate(self._marker_environment)
+
+    def supports_python(self, requires_python):
+        """Whether a ``Requires-Python`` specifier allows this environment's Python."""
+        return supports_python(requires_python, self.python_full_version)
+
+    def supports_wheel(self, wheel):
+        """Whether a wheel installs in this environment, judging by its filename tags.
+
+        :param wheel: The wheel to check
+        :type wheel: :class:`~pip._internal.wheel.Wheel`
+        :rtype: bool
+        """
+        environment = self._marker_environment
+        major, minor = environment["python_version"].split(".")[:2]
+        implementation = IMPLEMENTATION_TAGS.get(environment["implementation_name"], "py")
+        pythons = {"py{0}".format(major), "{0}{1}".format(implementation, major)}
+        pythons.update(
+            "{0}{1}{2}".format(prefix, major, older)
+            for prefix in ("py", implementation) for older in range(int(minor) + 1)
+        )
+        abi = "{0}{1}{2}".format(implementation, major, minor)
+        platforms = PLATFORM_TAGS.get(environment["sys_platform"], ())
+        machine = (self.platform_machine or "").lower()
+
+        def _supports_platform(platform):
+            if platform == "any":
+                return True
+            return platform.startswith(platforms) and machine in platform.lower()
+
+        return (
+            any(python in pythons for python in wheel.pyversions) and
+            any(a in ("none", "abi3") or a.startswith(abi) for a in wheel.abis) and
+            any(_supports_platform(platform) for platform in wheel.plats)
+        )
+
+    def as_marker(self):
+        """A marker which selects this environment.
+
+        :rtype: :class:`~packaging.markers.Marker`
+        """
+        if self.python_version.count(".") > 1:
+            parts = ['python_full_version == "{0}"'.format(self.python_version)]
+        else:
+            parts = ['python_version == "{0}"'.format(self.python_version)]
+        for key in ("implementation_name", "sys_platform", "platform_machine"):
+            value = getattr(self, key)
+            if value:
+                parts.append('{0} == "{1}"'.format(key, value))
+        return Marker(" and ".join(parts))
+
+
 @lru_cache(maxsize=128)
 def _tuplize_version(version):
     return tuple(int(x) for x in filter(lambda i: i != "*", version.split(".")))
@@ -290,6 +441,29 @@ def _ensure_marker(marker):
     return marker
 
 
+@lru_cache(maxsize=1024)
+def _parse_marker(marker_str):
+    return Marker(marker_str)
+
+
+def _copy_marker_list(markers):
+    return [_copy_marker_list(m) if isinstance(m, list) else m for m in markers]
+
+
+def parse_marker(marker_str):
+    """Parse a marker string, parsing repeated markers only once.
+
+    Each call returns a new :class:`~packaging.markers.Marker`, since markers
+    are changed in place elsewhere.
+
+    :param str marker_str: The marker to parse
+    :rtype: :class:`~packaging.markers.Marker`
+    """
+    marker = copy.copy(_parse_marker(marker_str))
+    marker._markers = _copy_marker_list(marker._markers)
+    return marker
+
+
 def gen_marker(mkr):
     m = Marker("python_version == '1'")
     m._markers.pop()
@@ -605,3 +779,6 @@ def normalize_marker_str(marker):
         else:
             marker_str = "{0!s}".format(marker)
     return marker_str.replace('"', "'")
+
+
+METRICS.register_function_caches("markers", globals())
@@ -0,0 +1,247 @@
+# -*- coding=utf-8 -*-
+"""Hit, miss and latency metrics of the caches used by requirementslib.
+
+Every cache records into a :class:`CacheMetrics` of the central :data:`METRICS`
+registry under its own name, e.g. ``dependencies``, ``hashes`` or
+``wheel_cache``.  Functions memoized with ``lru_cache`` are registered with
+:meth:`MetricsRegistry.register_function_cache` and read from their
+``cache_info()`` whenever the metrics are exported::
+
+    from requirementslib.models.metrics import METRICS
+
+    METRICS.as_dict()["dependencies"]["hits"]
+    print(METRICS.to_prometheus())
+"""
+from __future__ import absolute_import, print_function
+
+import contextlib
+import json
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+_clock = getattr(time, "perf_counter", time.time)
+
+
+class CacheMetrics(object):
+    """The metrics of one cache.
+
+    :param str name: The name of the cache
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self._size_source = None
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+            #: The number and total duration in seconds of each kind of operation
+            self.timings = {}
+
+    def hit(self, count=1):
+        with self._lock:
+            self.hits += count
+
+    def miss(self, count=1):
+        with self._lock:
+            self.misses += count
+
+    def evict(self, count=1):
+        with self._lock:
+            self.evictions += count
+
+    def record_time(self, operation, seconds):
+        with self._lock:
+            count, total = self.timings.get(operation, (0, 0.0))
+            self.timings[operation] = (count + 1, total + seconds)
+
+    @contextlib.contextmanager
+    def timed(self, operation):
+        """Record the duration of the block as an *operation*, e.g. ``load`` or ``write``."""
+        start = _clock()
+        try:
+            yield
+        finally:
+            self.record_time(operation, _clock() - start)
+
+    def track_size(self, cache):
+        """Report the size of *cache*, which must have an ``entry_count``.
+
+        The metrics are shared by every cache of the same name, so this is
+        only done for the module-level default cache.  Only a weak reference is
+        kept, the size is None once it is gone.
+        """
+        self._size_source = weakref.ref(cache)
+
+    @property
+    def size(self):
+        """The number of entries in the tracked cache, or None if it isn't known
+        without loading the whole cache."""
+        cache = self._size_source() if self._size_source is not None else None
+        return cache.entry_count if cache is not None else None
+
+    @property
+    def hit_ratio(self):
+        lookups = self.hits + self.misses
+        return float(self.hits) / lookups if lookups else None
+
+    def as_dict(self):
+        with self._lock:
+            result = {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "timings": dict(
+                    (operation, {"count": count, "seconds": total})
+                    for operation, (count, total) in self.timings.items()
+                ),
+            }
+        result["size"] = self.size
+        result["hit_ratio"] = self.hit_ratio
+        return result
+
+
+class FunctionCacheMetrics(object):
+    """The metrics of a function memoized with ``lru_cache``.
+
+    Evictions are estimated from the misses which are no longer in the cache.
+
+    :param str name: The name of the cache
+    :param func: The memoized function
+    """
+
+    def __init__(self, name, func):
+        self.name = name
+        self.func = func
+        self._baseline = (0, 0, 0)
+
+    @staticmethod
+    def _evictions(info):
+        return max(info.misses - info.currsize, 0)
+
+    def reset(self):
+        info = self.func.cache_info()
+        self._baseline = (info.hits, info.misses, self._evictions(info))
+
+    def as_dict(self):
+        info = self.func.cache_info()
+        hits = info.hits - self._baseline[0]
+        misses = info.misses - self._baseline[1]
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "evictions": max(self._evictions(info) - self._baseline[2], 0),
+            "timings": {},
+            "size": info.currsize,
+            "max_size": info.maxsize,
+            "hit_ratio": float(hits) / lookups if lookups else None,
+        }
+
+
+#: The Prometheus metrics exported for each cache
+PROMETHEUS_METRICS = (
+    ("hits_total", "counter", "Lookups answered from the cache.", "hits"),
+    ("misses_total", "counter", "Lookups the cache couldn't answer.", "misses"),
+    ("evictions_total", "counter", "Entries evicted from the cache.", "evictions"),
+    ("size", "gauge", "Entries currently in the cache.", "size"),
+)
+
+
+class MetricsRegistry(object):
+    """A registry of the metrics of every cache."""
+
+    def __init__(self):
+        self._caches = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        """Returns the metrics of the cache called *name*, creating them if needed.
+
+        :rtype: :class:`CacheMetrics`
+        """
+        with self._lock:
+            if name not in self._caches:
+                self._caches[name] = CacheMetrics(name)
+            return self._caches[name]
+
+    def register_function_cache(self, name, func):
+        """Report the ``cache_info()`` of a function memoized with ``lru_cache``."""
+        with self._lock:
+            self._caches[name] = FunctionCacheMetrics(name, func)
+
+    def register_function_caches(self, prefix, namespace):
+        """Register every memoized function defined in *namespace*, e.g. ``globals()``."""
+        module = namespace.get("__name__")
+        for name, value in sorted(namespace.items()):
+            if getattr(value, "__module__", module) != module:
+                continue
+            if callable(getattr(value, "cache_info", None)):
+                self.register_function_cache("{0}.{1}".format(prefix, name), value)
+
+    def reset(self):
+        """Start counting from zero for every cache."""
+        with self._lock:
+            caches = list(self._caches.values())
+        for cache in caches:
+            cache.reset()
+
+    def as_dict(self):
+        """Returns the metrics of every cache by name.
+
+        :rtype: dict[str, dict]
+        """
+        with self._lock:
+            caches = list(self._caches.values())
+        return OrderedDict((cache.name, cache.as_dict()) for cache in caches)
+
+    def to_json(self, **kwargs):
+        return json.dumps(self.as_dict(), **kwargs)
+
+    def to_prometheus(self, prefix="requirementslib_cache"):
+        """Returns the metrics of every cache in the Prometheus text format.
+
+        :param str prefix: The prefix of the metric names
+        :rtype: str
+        """
+        caches = self.as_dict()
+        lines = []
+        for suffix, kind, help_text, key in PROMETHEUS_METRICS:
+            metric = "{0}_{1}".format(prefix, suffix)
+            lines.append("# HELP {0} {1}".format(metric, help_text))
+            lines.append("# TYPE {0} {1}".format(metric, kind))
+            for name, values in caches.items():
+                if values[key] is not None:
+                    lines.append('{0}{{cache="{1}"}} {2}'.format(metric, name, values[key]))
+        for suffix, kind, help_text, key in (
+            ("operations_total", "counter", "Cache operations.", "count"),
+            ("operation_seconds_total", "counter", "Time spent in cache operations.",
+             "seconds"),
+        ):
+            metric = "{0}_{1}".format(prefix, suffix)
+            lines.append("# HELP {0} {1}".format(metric, help_text))
+            lines.append("# TYPE {0} {1}".format(metric, kind))
+            for name, values in caches.items():
+                for operation, timing in sorted(values["timings"].items()):
+                    lines.append('{0}{{cache="{1}",operation="{2}"}} {3}'.format(
+                        metric, name, operation, timing[key]
+                    ))
+        return "\n".join(lines) + "\n"
+
+
+#: The metrics of all of the caches
+METRICS = MetricsRegistry()
+
+
+def get_cache_metrics(name):
+    """Returns the metrics of the cache called *name* from :data:`METRICS`.
+
+    :rtype: :class:`CacheMetrics`
+    """
+    return METRICS.get(name)
@@ -4,6 +4,7 @@ from __future__ import absolute_import, print_function
 
 import collections
 import copy
+import io
 import os
 import sys
 from contextlib import contextmanager
@@ -45,7 +46,9 @@ from .markers import (
     format_pyversion,
     get_contained_pyversions,
     normalize_marker_str,
+    parse_marker,
 )
+from .metrics import METRICS
 from .setup_info import (
     SetupInfo,
     _prepare_wheel_building_kwargs,
@@ -56,7 +59,11 @@ from .setup_info import (
 from .url import URI
 from .utils import (
     DIRECT_URL_RE,
+    EDITABLE_RE,
     HASH_STRING,
+    IGNORED_OPTION_RE,
+    INCLUDE_RE,
+    NAMED_REQUIREMENT_RE,
     URL_RE,
     build_vcs_uri,
     convert_direct_url_to_url,
@@ -69,6 +76,7 @@ from .utils import (
     get_version,
     init_requirement,
     is_pinned_requirement,
+    iter_logical_lines,
     make_install_requirement,
     normalize_name,
     parse_extras,
@@ -107,6 +115,8 @@ if MYPY_RUNNING:
         Text,
         Generator,
         FrozenSet,
+        Iterable,
+        Iterator,
     )
     from pip_shims.shims import (
         Link,
@@ -2453,6 +2463,8 @@ class Requirement(object):
     _ireq = attr.ib(
         default=None, cmp=False
     )  # type: Optional[pip_shims.InstallRequirement]
+    #: Whether this only constrains the version, e.g. it came from a ``-c`` file
+    constraint = attr.ib(default=False, cmp=True)  # type: bool
 
     def __hash__(self):
         return hash(self.as_line())
@@ -2761,6 +2773,115 @@ class Requirement(object):
         cls_inst = cls(**args)  # type: ignore
         return cls_inst
 
+    @classmethod
+    def from_lines(cls, lines, base_dir=None):
+        # type: (Iterable[AnyStr], Optional[AnyStr]) -> Iterator[Requirement]
+        """Lazily parse the lines of a requirements file, one requirement at a time.
+
+        Lines ending in a backslash are continued on the next line, comments and
+        global options such as ``--index-url`` are skipped and the files included
+        with ``-r`` or ``-c`` are parsed in place.  The requirements of ``-c`` files
+        have :attr:`constraint` set.  Requirements which are only a name, extras,
+        specifiers and markers skip the :class:`Line` machinery.
+
+        :param lines: The lines of a requirements file
+        :type lines: Iterable[str]
+        :param str base_dir: The directory or URL included files are relative to,
+            defaults to the current directory
+        :return: A generator of the requirements
+        :rtype: Iterator[:class:`Requirement`]
+        :raises RequirementError: If a line can't be parsed
+        """
+        return cls._from_lines(lines, base_dir, "<lines>", set())
+
+    @classmethod
+    def iter_from_file(cls, path):
+        # type: (AnyStr) -> Iterator[Requirement]
+        """Lazily parse a requirements file, see :meth:`from_lines`.
+
+        :param str path: The path or URL of the requirements file
+        :return: A generator of the requirements
+        :rtype: Iterator[:class:`Requirement`]
+        """
+        return cls._from_file(_get_include_location(path, None), set())
+
+    @classmethod
+    def _from_file(cls, location, seen, constraint=False):
+        seen.add(location)
+        base_dir = os.path.dirname(location)
+        if is_valid_url(location):
+            base_dir = location.rsplit("/", 1)[0]
+        with _open_requirements_file(location) as lines:
+            for requirement in cls._from_lines(
+                lines, base_dir, location, seen, constraint=constraint
+            ):
+                yield requirement
+
+    @classmethod
+    def _from_lines(cls, lines, base_dir, location, seen, constraint=False):
+        for number, line in iter_logical_lines(lines):
+            include = INCLUDE_RE.match(line)
+            if include is not None:
+                included = _get_include_location(include.group("location"), base_dir)
+                # pip would recurse forever, parse each file only once instead
+                if included not in seen:
+                    is_constraint = constraint or include.group("option") in (
+                        "-c", "--constraint"
+                    )
+                    for requirement in cls._from_file(
+                        included, seen, constraint=is_constraint
+                    ):
+                        yield requirement
+                continue
+            editable = EDITABLE_RE.match(line)
+            if editable is not None:
+                line = "-e {0}".format(editable.group("line"))
+            elif line.startswith("-"):
+                continue
+            line = IGNORED_OPTION_RE.sub("", line)
+            try:
+                requirement = cls._from_named_line(line) if editable is None else None
+                if requirement is None:
+                    requirement = cls.from_line(line)
+            except RequirementError as e:
+                raise RequirementError("{0}:{1}: {2}".format(location, number, e))
+            if constraint:
+                # from_line is memoized, flag a copy rather than the shared instance
+                requirement = attr.evolve(requirement, constraint=True)
+            yield requirement
+
+    @classmethod
+    def _from_named_line(cls, line):
+        # type: (AnyStr) -> Optional[Requirement]
+        """Build a requirement which is only a name, extras, specifiers and markers
+        without creating a :class:`Line`, or return None for anything else."""
+        line, hashes = Line.split_hashes(line)
+        line, markers = split_markers_from_line(line)
+        line = line.strip()
+        if not NAMED_REQUIREMENT_RE.match(line):
+            return None
+        try:
+            req = init_requirement(line)
+        except Exception:
+            return None
+        if markers:
+            req.marker = parse_marker(markers)
+        extras = tuple(sorted(dedup([extra.lower() for extra in req.extras])))
+        named_req = NamedRequirement(
+            name=req.name,
+            version=specs_to_string(req.specifier) if req.specifier else None,
+            req=req,
+            extras=extras,
+        )
+        return cls(
+            name=req.name,
+            req=named_req,
+            markers=markers,
+            editable=False,
+            extras=extras,
+            hashes=tuple(hashes),
+        )
+
     @classmethod
     def from_ireq(cls, ireq):
         return cls.from_line(format_requirement(ireq))
@@ -2969,6 +3090,14 @@ class Requirement(object):
         return {name: base_dict}
 
     def as_ireq(self):
+        ireq = self._build_ireq()
+        if self.constraint:
+            # The ireq may be cached by the parsed line, so flag a copy of it
+            ireq = copy.copy(ireq)
+            ireq.constraint = True
+        return ireq
+
+    def _build_ireq(self):
         if self.line_instance and self.line_instance.ireq:
             return self.line_instance.ireq
         elif getattr(self.req, "_parsed_line", None) and self.req._parsed_line.ireq:
@@ -2997,7 +3126,7 @@ class Requirement(object):
     def ireq(self):
         return self.as_ireq()
 
-    def get_dependencies(self, sources=None):
+    def get_dependencies(self, sources=None, environment=None):
         """Retrieve the dependencies of the current requirement.
 
         Retrieves dependencies of the current requirement.  This only works on pinned
@@ -3005,25 +3134,29 @@ class Requirement(object):
 
         :param sources: Pipfile-formatted sources, defaults to None
         :param sources: list[dict], optional
+        :param environment: The environment to look the dependencies up for,
+            defaults to the running interpreter
+        :type environment: :class:`~requirementslib.models.markers.TargetEnvironment`
         :return: A set of requirement strings of the dependencies of this requirement.
         :rtype: set(str)
         """
 
-        from .dependencies import get_dependencies
+        from .dependencies import get_default_sources, get_dependencies
 
         if not sources:
-            sources = [
-                {"name": "pypi", "url": "https://pypi.org/simple", "verify_ssl": True}
-            ]
-        return get_dependencies(self.as_ireq(), sources=sources)
+            sources = get_default_sources()
+        return get_dependencies(self.as_ireq(), sources=sources, environment=environment)
 
-    def get_abstract_dependencies(self, sources=None):
+    def get_abstract_dependencies(self, sources=None, environment=None):
         """Retrieve the abstract dependencies of this requirement.
 
         Returns the abstract dependencies of the current requirement in order to resolve.
 
         :param sources: A list of sources (pipfile format), defaults to None
         :param sources: list, optional
+        :param environment: The environment to look the dependencies up for,
+            defaults to the running interpreter
+        :type environment: :class:`~requirementslib.models.markers.TargetEnvironment`
         :return: A list of abstract (unpinned) dependencies
         :rtype: list[ :class:`~requirementslib.models.dependency.AbstractDependency` ]
         """
@@ -3032,20 +3165,19 @@ class Requirement(object):
             AbstractDependency,
             get_dependencies,
             get_abstract_dependencies,
+            get_default_sources,
         )
 
         if not self.abstract_dep:
             parent = getattr(self, "parent", None)
             self.abstract_dep = AbstractDependency.from_requirement(self, parent=parent)
         if not sources:
-            sources = [
-                {"url": "https://pypi.org/simple", "name": "pypi", "verify_ssl": True}
-            ]
+            sources = get_default_sources()
         if is_pinned_requirement(self.ireq):
-            deps = self.get_dependencies()
+            deps = self.get_dependencies(environment=environment)
         else:
             ireq = sorted(self.find_all_matches(), key=lambda k: k.version)
-            deps = get_dependencies(ireq.pop(), sources=sources)
+            deps = get_dependencies(ireq.pop(), sources=sources, environment=environment)
         return get_abstract_dependencies(deps, sources=sources, parent=self.abstract_dep)
 
     def find_all_matches(self, sources=None, finder=None):
@@ -3196,6 +3328,30 @@ def vcs_req_from_parsed_line(parsed_line):
     return VCSRequirement(**vcs_dict)  # type: ignore
 
 
+def _get_include_location(location, base_dir):
+    # type: (AnyStr, Optional[AnyStr]) -> AnyStr
+    if is_valid_url(location):
+        return location
+    if base_dir is not None and is_valid_url(base_dir):
+        return urllib_parse.urljoin("{0}/".format(base_dir), location)
+    location = os.path.expanduser(location)
+    if base_dir is not None:
+        location = os.path.join(base_dir, location)
+    return os.path.abspath(location)
+
+
+@contextmanager
+def _open_requirements_file(location):
+    # type: (AnyStr) -> Iterator[Iterable[STRING_TYPE]]
+    """Open a local or remote requirements file as an iterable of text lines."""
+    if not is_valid_url(location):
+        with io.open(location, "r", encoding="utf-8") as fh:
+            yield fh
+        return
+    with vistir.contextmanagers.open_file(location) as fh:
+        yield (line.decode("utf-8") for line in fh)
+
+
 def named_req_from_parsed_line(parsed_line):
     # type: (Line) -> NamedRequirement
     if parsed_line.name is not None:
@@ -3208,3 +3364,6 @@ def named_req_from_parsed_line(parsed_line):
             parsed_line=parsed_line,
         )
     return NamedRequirement.from_line(parsed_line.line)
+
+
+METRICS.register_function_cache("Requirement.from_line", Requirement.from_line)
@@ -1,19 +1,381 @@
 # -*- coding=utf-8 -*-
+import copy
+import threading
+from collections import OrderedDict
 from contextlib import contextmanager
 
 import attr
+import packaging.markers
+import packaging.version
 import six
 
 from pip_shims.shims import Wheel
 
-from .cache import HashCache
+from .cache import HASH_WORKERS, CandidateIndex, HashCache
+from .tracing import trace_count, trace_span, use_tracer
 from .utils import format_requirement, is_pinned_requirement, version_from_ireq
 
 
+#: The number of conflicts the backtracking strategy gives up after
+MAX_BACKTRACKS = 1000
+
+_MISSING = object()
+
+
 class ResolutionError(Exception):
     pass
 
 
+class _AllWheelsPatch(object):
+    """Reference counted patch of pip's ``Wheel`` class allowing all wheels.
+
+    The patch is applied when the first user enters it and removed when the
+    last one leaves, so threads working inside of it don't pull it out from
+    under each other.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.depth = 0
+        self.originals = None
+
+    def acquire(self):
+        def _wheel_supported(self, tags=None):
+            # Ignore current platform. Support everything.
+            return True
+
+        def _wheel_support_index_min(self, tags=None):
+            # All wheels are equal priority for sorting.
+            return 0
+
+        with self.lock:
+            if not self.depth:
+                self.originals = (Wheel.supported, Wheel.support_index_min)
+                Wheel.supported = _wheel_supported
+                Wheel.support_index_min = _wheel_support_index_min
+            self.depth += 1
+
+    def release(self):
+        with self.lock:
+            self.depth -= 1
+            if not self.depth:
+                Wheel.supported, Wheel.support_index_min = self.originals
+                self.originals = None
+
+
+_ALL_WHEELS_PATCH = _AllWheelsPatch()
+
+
+def all_wheels_allowed():
+    """Whether wheels for all platforms are currently allowed, see
+    :meth:`DependencyResolver.allow_all_wheels`."""
+    return _ALL_WHEELS_PATCH.depth > 0
+
+
+def _is_editable(dep):
+    return len(dep.candidates) == 1 and dep.candidates[0].editable
+
+
+def _get_version(candidate):
+    return packaging.version.parse(version_from_ireq(candidate))
+
+
+def _get_requires_python(candidate):
+    link = getattr(getattr(candidate, "req", None), "link", None) or candidate.link
+    return getattr(link, "requires_python", None)
+
+
+class BacktrackingEngine(object):
+    """Pins abstract dependencies one at a time, learning from conflicts.
+
+    The most constrained project is pinned first, trying its candidates newest
+    first, and each candidate is checked against the constraints already in
+    place before it is pinned.  When no candidate of a project fits, the pins
+    which caused the conflict are recorded as an incompatibility so that the
+    combination is never tried again, and the engine jumps straight back to the
+    most recent of those pins instead of undoing one pin at a time.
+
+    :param int max_backtracks: The number of conflicts to give up after,
+        defaults to :data:`MAX_BACKTRACKS`
+    :param preferred: Versions to try before any other candidate, by name
+    :type preferred: dict[str, str]
+    :param environment: The environment to resolve for, dependencies whose markers
+        don't hold and candidates which don't support its Python are skipped
+    :type environment: :class:`~requirementslib.models.markers.TargetEnvironment`
+    :param dict subdeps: A cache of the dependencies of each candidate in each
+        environment, share it between engines to look them up only once
+    """
+
+    def __init__(
+        self, max_backtracks=MAX_BACKTRACKS, preferred=None, environment=None,
+        subdeps=None
+    ):
+        self.max_backtracks = max_backtracks
+        self.environment = environment
+        #: Versions to try first, by name
+        self.preferred = dict(
+            (name, packaging.version.parse(version))
+            for name, version in (preferred or {}).items()
+        )
+        #: Constraints on each project as a list of (parent name, abstract dependency)
+        #: pairs, the parent is None for root dependencies
+        self.constraints = OrderedDict()
+        #: Pinned candidates by name, in the order they were pinned
+        self.pins = OrderedDict()
+        #: Learned sets of (name, pin) pairs which can't all be pinned together
+        self.incompatibilities = set()
+        self.backtracks = 0
+        self._subdeps = subdeps if subdeps is not None else {}
+
+    def allowed_versions(self, name, extra_deps=()):
+        """Returns the versions of *name* allowed by all of its constraints.
+
+        :return: A set of versions, or None if an editable dependency is pinned
+        :rtype: set[:class:`~packaging.version.Version`] or None
+        """
+        deps = [dep for _, dep in self.constraints.get(name, [])] + list(extra_deps)
+        if any(_is_editable(dep) for dep in deps):
+            return None
+        versions = None
+        for dep in deps:
+            dep_versions = set(dep.versions)
+            versions = dep_versions if versions is None else versions & dep_versions
+        return versions
+
+    def resolve(self, root_deps):
+        """Pin the given root dependencies and all of their dependencies.
+
+        :param root_deps: The abstract dependencies to resolve
+        :type root_deps: list[:class:`~requirementslib.models.dependencies.AbstractDependency`]
+        :return: The pinned candidates by name
+        :rtype: :class:`~collections.OrderedDict`
+        :raises ResolutionError: If the dependencies can't be satisfied
+        :raises RuntimeError: If the resolution runs out of backtracks
+        """
+        for dep in root_deps:
+            if self._applies(dep):
+                self._add_constraint(None, dep)
+        name = self._get_next_name()
+        while name is not None:
+            culprits = self._pin_next(name)
+            if culprits is not None:
+                self._backjump(name, culprits)
+            name = self._get_next_name()
+        return self.pins
+
+    def _applies(self, dep):
+        return self.environment is None or self.environment.evaluate(dep.markers)
+
+    def _add_constraint(self, parent, dep):
+        self.constraints.setdefault(dep.name, []).append((parent, dep))
+
+    def _get_next_name(self):
+        best, best_count = None, None
+        for name in self.constraints:
+            if name in self.pins:
+                continue
+            versions = self.allowed_versions(name)
+            count = 0 if versions is None else len(versions)
+            if best is None or count < best_count:
+                best, best_count = name, count
+        return best
+
+    def _iter_candidates(self, name):
+        """Yields (abstract dependency, candidate) pairs for *name*, newest first."""
+        deps = [dep for _, dep in self.constraints[name]]
+        for dep in deps:
+            if _is_editable(dep):
+                yield dep, dep.candidates[0]
+                return
+        allowed = self.allowed_versions(name)
+        seen = set()
+        candidates = []
+        for dep in deps:
+            for candidate, version in zip(dep.candidates, dep.versions):
+                if self.environment is not None and not self.environment.supports_python(
+                    _get_requires_python(candidate)
+                ):
+                    continue
+                if version in allowed and version not in seen:
+                    seen.add(version)
+                    candidates.append((version, dep, candidate))
+        candidates.sort(key=lambda c: c[0], reverse=True)
+        preferred = self.preferred.get(name)
+        if preferred is not None:
+            candidates.sort(key=lambda c: c[0] != preferred)
+        for _, dep, candidate in candidates:
+            yield dep, candidate
+
+    def _get_incompatibility(self, name, candidate):
+        """Returns a learned incompatibility which rules out *candidate*, if any."""
+        key = (name, format_requirement(candidate))
+        for incompatibility in self.incompatibilities:
+            if key in incompatibility and all(
+                other == key or (
+                    other[0] in self.pins and
+                    format_requirement(self.pins[other[0]]) == other[1]
+                )
+                for other in incompatibility
+            ):
+                return incompatibility
+        return None
+
+    def _get_subdeps(self, dep, candidate):
+        key = format_requirement(candidate)
+        if self.environment is not None:
+            key = (self.environment.name, key)
+        if key not in self._subdeps:
+            self._subdeps[key] = list(
+                dep.get_deps(candidate, environment=self.environment)
+            )
+        return [subdep for subdep in self._subdeps[key] if self._applies(subdep)]
+
+    def _find_conflict(self, subdeps):
+        """Check new dependencies against the pins and constraints in place.
+
+        :return: None if they fit, otherwise the names of the pins they conflict with
+        :rtype: set[str] or None
+        """
+        culprits = None
+        for subdep in subdeps:
+            if _is_editable(subdep):
+                continue
+            pin = self.pins.get(subdep.name)
+            if pin is not None:
+                if pin.editable or _get_version(pin) in subdep.versions:
+                    continue
+                culprits = (culprits or set()) | {subdep.name}
+                continue
+            allowed = self.allowed_versions(subdep.name, [subdep])
+            if allowed is None or allowed:
+                continue
+            culprits = (culprits or set()) | set(
+                parent for parent, _ in self.constraints[subdep.name] if parent
+            )
+        return culprits
+
+    def _pin_next(self, name):
+        """Pin the newest fitting candidate of *name*.
+
+        :return: None when a candidate was pinned, otherwise the names of the pins
+            which rule out every candidate
+        :rtype: set[str] or None
+        """
+        culprits = set(parent for parent, _ in self.constraints[name] if parent)
+        for dep, candidate in self._iter_candidates(name):
+            trace_count("candidates_tried", package=name)
+            incompatibility = self._get_incompatibility(name, candidate)
+            if incompatibility is not None:
+                culprits.update(other for other, _ in incompatibility if other != name)
+                continue
+            subdeps = self._get_subdeps(dep, candidate)
+            conflict = self._find_conflict(subdeps)
+            if conflict is not None:
+                culprits.update(conflict)
+                continue
+            candidate.parent = dep.parent
+            self.pins[name] = candidate
+            for subdep in subdeps:
+                self._add_constraint(name, subdep)
+            return None
+        return culprits
+
+    def _backjump(self, name, culprits):
+        from ..utils import log
+
+        self.backtracks += 1
+        trace_count("backtracks", package=name)
+        if self.backtracks > self.max_backtracks:
+            raise RuntimeError(
+                "cannot resolve after {0} backtracks".format(self.max_backtracks)
+            )
+        culprits = [pinned for pinned in self.pins if pinned in culprits]
+        if not culprits:
+            raise ResolutionError(
+                "Could not find a version of {0} that satisfies {1}".format(
+                    name, ", ".join(
+                        str(dep.specifiers) or "any version"
+                        for _, dep in self.constraints[name]
+                    )
+                )
+            )
+        incompatibility = frozenset(
+            (pinned, format_requirement(self.pins[pinned])) for pinned in culprits
+        )
+        self.incompatibilities.add(incompatibility)
+        log.debug("Conflict on {0}, incompatible: {1}".format(
+            name, ", ".join(sorted(pin for _, pin in incompatibility))
+        ))
+        self._unpin_from(culprits[-1])
+
+    def _unpin_from(self, name):
+        """Undo the pin of *name* and every pin made after it."""
+        names = list(self.pins)
+        undone = set(names[names.index(name):])
+        for pinned in undone:
+            del self.pins[pinned]
+        for constrained in list(self.constraints):
+            constraints = [c for c in self.constraints[constrained] if c[0] not in undone]
+            if constraints:
+                self.constraints[constrained] = constraints
+            else:
+                del self.constraints[constrained]
+
+
+def _with_marker(ireq, marker):
+    ireq = copy.copy(ireq)
+    if ireq.req is not None:
+        ireq.req = copy.copy(ireq.req)
+        ireq.req.marker = marker
+    ireq.markers = marker
+    return ireq
+
+
+def _merge_constraints(deps):
+    """Merge the abstract dependencies constraining one project into one."""
+    merged = deps[0]
+    for dep in deps[1:]:
+        merged = merged.compatible_abstract_dep(dep)
+    return merged
+
+
+def merge_environment_pins(environments, environment_pins):
+    """Merge the pins of several environments into one set of pins.
+
+    A pin shared by every environment is kept as is.  Otherwise, each pinned
+    version gets a marker which selects the environments it was pinned in.
+
+    :param environments: The environments which were resolved
+    :type environments: list[:class:`~requirementslib.models.markers.TargetEnvironment`]
+    :param environment_pins: The pins of each environment by environment name
+    :type environment_pins: dict[str, dict[str, InstallRequirement]]
+    :return: The merged pins by name, one for each version the project is pinned to
+    :rtype: :class:`~collections.OrderedDict` of str to list[InstallRequirement]
+    """
+    pins = OrderedDict()
+    for environment in environments:
+        for name, ireq in environment_pins[environment.name].items():
+            by_version = pins.setdefault(name, OrderedDict())
+            key = format_requirement(ireq)
+            if key not in by_version:
+                by_version[key] = (ireq, [])
+            by_version[key][1].append(environment)
+    merged = OrderedDict()
+    for name, by_version in pins.items():
+        merged[name] = []
+        for ireq, pinned_in in by_version.values():
+            if len(pinned_in) < len(environments):
+                markers = [str(environment.as_marker()) for environment in pinned_in]
+                marker = " or ".join(
+                    "({0})".format(m) if len(markers) > 1 else m for m in markers
+                )
+                if ireq.markers:
+                    marker = "({0}) and ({1})".format(ireq.markers, marker)
+                ireq = _with_marker(ireq, packaging.markers.Marker(marker))
+            merged[name].append(ireq)
+    return merged
+
+
 @attr.s
 class DependencyResolver(object):
     pinned_deps = attr.ib(default=attr.Factory(dict))
@@ -35,6 +397,34 @@ class DependencyResolver(object):
     include_incompatible_hashes = attr.ib(default=True)
     #: A cache for storing available canddiates when using all wheels
     _available_candidates_cache = attr.ib(default=attr.Factory(dict))
+    #: The number of threads used to collect hashes, defaults to ``HASH_WORKERS``
+    max_workers = attr.ib(default=None)
+    #: The candidates found on the index for each project during this resolution
+    candidate_index = attr.ib(default=attr.Factory(CandidateIndex))
+    #: How to resolve, either ``"backtracking"`` with a :class:`BacktrackingEngine`,
+    #: or ``"rounds"`` of :meth:`pin_deps`
+    strategy = attr.ib(default="backtracking")
+    #: The number of conflicts the backtracking strategy gives up after
+    max_backtracks = attr.ib(default=MAX_BACKTRACKS)
+    #: Versions to keep wherever they are still compatible, by canonical name
+    preferred_pins = attr.ib(default=attr.Factory(dict))
+    #: The :class:`~requirementslib.models.markers.TargetEnvironment` instances to
+    #: resolve for, defaults to the running interpreter
+    environments = attr.ib(default=attr.Factory(list))
+    #: The pins of each target environment by environment name
+    environment_pins = attr.ib(default=attr.Factory(dict))
+    #: The merged abstract dependencies of each target environment by environment
+    #: name, ``dep_dict`` merges them across environments wherever they overlap
+    environment_deps = attr.ib(default=attr.Factory(dict))
+    #: The pins of all :attr:`environments` merged by name, each a list of one
+    #: pin per version, see :func:`merge_environment_pins`
+    merged_pins = attr.ib(default=attr.Factory(dict))
+    #: A :class:`~requirementslib.models.tracing.Tracer` to record the resolution
+    #: and hashing with
+    tracer = attr.ib(default=None)
+    #: Previous entries of ``dep_dict`` and ``candidate_dict`` for rolling back a
+    #: failed pin, see :meth:`_rollback`
+    _journal = attr.ib(default=attr.Factory(list))
 
     @classmethod
     def create(cls, finder=None, allow_prereleases=False, get_all_hashes=True):
@@ -61,6 +451,13 @@ class DependencyResolver(object):
     def resolution(self):
         return list(self.pinned_deps.values())
 
+    def iter_pins(self):
+        """Yields every pin, including each version of the projects which are
+        pinned to different versions in different :attr:`environments`."""
+        for name, ireq in self.pinned_deps.items():
+            for pin in self.merged_pins.get(name, [ireq]):
+                yield pin
+
     def add_abstract_dep(self, dep):
         """Add an abstract dependency by either creating a new entry or
         merging with an old one.
@@ -74,26 +471,61 @@ class DependencyResolver(object):
         if dep.name in self.dep_dict:
             compatible_versions = self.dep_dict[dep.name].compatible_versions(dep)
             if compatible_versions:
-                self.candidate_dict[dep.name] = compatible_versions
-                self.dep_dict[dep.name] = self.dep_dict[
-                    dep.name
-                ].compatible_abstract_dep(dep)
+                self._set_dep(
+                    dep.name,
+                    self.dep_dict[dep.name].compatible_abstract_dep(dep),
+                    compatible_versions,
+                )
             else:
                 raise ResolutionError
         else:
-            self.candidate_dict[dep.name] = dep.version_set
-            self.dep_dict[dep.name] = dep
+            self._set_dep(dep.name, dep, dep.version_set)
+
+    def _set_dep(self, name, dep, versions):
+        """Set the abstract dependency and candidate versions of *name*, recording
+        the previous ones in the journal."""
+        self._journal.append((
+            name,
+            self.dep_dict.get(name, _MISSING),
+            self.candidate_dict.get(name, _MISSING),
+        ))
+        self.dep_dict[name] = dep
+        self.candidate_dict[name] = versions
+
+    def _rollback(self, checkpoint):
+        """Undo the changes recorded in the journal since *checkpoint*.
+
+        :param int checkpoint: The length of the journal to roll back to
+        """
+        while len(self._journal) > checkpoint:
+            name, dep, versions = self._journal.pop()
+            for state, value in ((self.dep_dict, dep), (self.candidate_dict, versions)):
+                if value is _MISSING:
+                    state.pop(name, None)
+                else:
+                    state[name] = value
 
     def pin_deps(self):
         """Pins the current abstract dependencies and adds them to the history dict.
 
         Adds any new dependencies to the abstract dependencies already present by
         merging them together to form new, compatible abstract dependencies.
+        A candidate whose dependencies don't fit is rolled back through the journal,
+        undoing only the entries it changed.
         """
 
+        # Nothing from before this round needs to be rolled back.
+        del self._journal[:]
         for name in list(self.dep_dict.keys()):
             candidates = self.dep_dict[name].candidates[:]
             abs_dep = self.dep_dict[name]
+            preferred = self.preferred_pins.get(name)
+            if preferred is not None:
+                # Candidates are popped from the end, so the preferred one goes last.
+                preferred = packaging.version.parse(preferred)
+                candidates.sort(key=lambda c: not c.editable and (
+                    packaging.version.parse(version_from_ireq(c)) == preferred
+                ))
             while candidates:
                 pin = candidates.pop()
                 # Move on from existing pins if the new pin isn't compatible
@@ -108,14 +540,15 @@ class DependencyResolver(object):
                             continue
                 pin.parent = abs_dep.parent
                 pin_subdeps = self.dep_dict[name].get_deps(pin)
-                backup = self.dep_dict.copy(), self.candidate_dict.copy()
+                checkpoint = len(self._journal)
                 try:
                     for pin_dep in pin_subdeps:
                         self.add_abstract_dep(pin_dep)
                 except ResolutionError:
-                    self.dep_dict, self.candidate_dict = backup
+                    self._rollback(checkpoint)
                     continue
                 else:
+                    del self._journal[checkpoint:]
                     self.pinned_deps[name] = pin
                     break
 
@@ -123,13 +556,21 @@ class DependencyResolver(object):
         """Resolves dependencies using a backtracking resolver and multiple endpoints.
 
         Note: this resolver caches aggressively.
-        Runs for *max_rounds* or until any two pinning rounds yield the same outcome.
+        With the ``"backtracking"`` :attr:`strategy` the dependencies are pinned in a
+        single pass by a :class:`BacktrackingEngine`.  With the ``"rounds"`` strategy
+        it runs for *max_rounds* or until any two pinning rounds yield the same outcome.
+
+        When :attr:`environments` are given each of them is resolved, sharing the
+        candidate and dependency lookups.  :attr:`merged_pins` then holds the pins
+        of every environment, see :func:`merge_environment_pins`, and
+        :attr:`pinned_deps` the first of them for each project.
 
         :param root_nodes: A list of the root requirements.
         :type root_nodes: list[:class:`~requirementslib.models.requirements.Requirement`]
         :param max_rounds: The max number of resolution rounds, defaults to 20
         :param max_rounds: int, optional
         :raises RuntimeError: Raised when max rounds is exceeded without a resolution.
+        :raises ResolutionError: Raised when the backtracking strategy finds no resolution.
         """
         if self.dep_dict:
             raise RuntimeError("Do not use the same resolver more than once")
@@ -137,19 +578,117 @@ class DependencyResolver(object):
         if not self.hash_cache:
             self.hash_cache = HashCache()
 
-        # Coerce input into AbstractDependency instances.
-        # We accept str, Requirement, and AbstractDependency as input.
-        from .dependencies import AbstractDependency
+        if self.environments and self.strategy == "rounds":
+            raise ValueError("Resolving for environments needs the backtracking strategy")
+
+        with use_tracer(self.tracer), trace_span("resolve", strategy=self.strategy):
+            self._resolve(root_nodes, max_rounds)
+
+    def _resolve(self, root_nodes, max_rounds):
+        from .dependencies import (
+            AbstractDependency, DEPENDENCY_CACHE, ResolverContext, candidate_index
+        )
+        # Share one pip resolver setup between all of the index lookups.
+        with candidate_index(self.candidate_index), ResolverContext(self.finder), \
+                self._use_environments():
+            # Coerce input into AbstractDependency instances.
+            # We accept str, Requirement, and AbstractDependency as input.
+            root_deps = []
+            for dep in root_nodes:
+                if isinstance(dep, six.string_types):
+                    dep = AbstractDependency.from_string(dep)
+                elif not isinstance(dep, AbstractDependency):
+                    dep = AbstractDependency.from_requirement(dep)
+                root_deps.append(dep)
+
+            # Buffer dependency cache writes for the whole resolution and write
+            # them out once at the end rather than once per dependency.
+            with DEPENDENCY_CACHE.transaction():
+                if self.strategy == "rounds":
+                    for dep in root_deps:
+                        self.add_abstract_dep(dep)
+                    self._resolve_rounds(max_rounds)
+                elif self.environments:
+                    self._resolve_environments(root_deps)
+                else:
+                    self._resolve_backtracking(root_deps)
+
+    @contextmanager
+    def _use_environments(self):
+        """Find the candidates of all target environments inside of the block."""
+        if not self.environments:
+            yield
+            return
+        from .dependencies import target_environments
+
+        with self.allow_all_wheels(), target_environments(self.environments):
+            yield
+
+    def resolve_from_lockfile(self, root_nodes, lockfile, dev=True, max_rounds=20):
+        """Re-resolve *root_nodes*, keeping the pins of an existing lockfile.
+
+        Every pin of the lockfile is tried before any other candidate, so pins which
+        are still compatible are kept and only the dependencies affected by added,
+        removed or changed requirements are resolved again.  Pins which are no
+        longer needed are dropped.
+
+        :param root_nodes: A list of the root requirements.
+        :type root_nodes: list[:class:`~requirementslib.models.requirements.Requirement`]
+        :param lockfile: The lockfile holding the previous resolution
+        :type lockfile: :class:`~requirementslib.models.lockfile.Lockfile`
+        :param bool dev: Whether to keep the pins of dev requirements, defaults to True
+        :param int max_rounds: The max number of resolution rounds, defaults to 20
+        """
+        preferred_pins = lockfile.get_pinned_versions(dev=dev)
+        preferred_pins.update(self.preferred_pins)
+        self.preferred_pins = preferred_pins
+        return self.resolve(root_nodes, max_rounds=max_rounds)
+
+    def _resolve_backtracking(self, root_deps):
+        engine = BacktrackingEngine(
+            max_backtracks=self.max_backtracks, preferred=self.preferred_pins
+        )
+        self.pinned_deps.update(engine.resolve(root_deps))
+        for name, constraints in engine.constraints.items():
+            self.dep_dict[name] = _merge_constraints([c for _, c in constraints])
+            self.candidate_dict[name] = engine.allowed_versions(name) or set()
+        self.pin_history[0] = self.pinned_deps.copy()
+
+    def _resolve_environments(self, root_deps):
+        subdeps = {}
+        for environment in self.environments:
+            engine = BacktrackingEngine(
+                max_backtracks=self.max_backtracks, preferred=self.preferred_pins,
+                environment=environment, subdeps=subdeps,
+            )
+            try:
+                pins = engine.resolve(root_deps)
+            except ResolutionError as e:
+                raise ResolutionError("{0}: {1}".format(environment.name, e))
+            self.environment_pins[environment.name] = pins.copy()
+            deps = self.environment_deps[environment.name] = {}
+            for name, constraints in engine.constraints.items():
+                dep = deps[name] = _merge_constraints([c for _, c in constraints])
+                merged = self.dep_dict.get(name)
+                if merged is None:
+                    self.dep_dict[name] = dep
+                elif merged is not dep and merged.compatible_versions(dep):
+                    self.dep_dict[name] = merged.compatible_abstract_dep(dep)
+                versions = engine.allowed_versions(name) or set()
+                self.candidate_dict[name] = self.candidate_dict.get(name, set()) | versions
+        self.merged_pins = merge_environment_pins(
+            self.environments, self.environment_pins
+        )
+        for name, pins in self.merged_pins.items():
+            self.pinned_deps[name] = pins[0]
+        self.pin_history[0] = self.pinned_deps.copy()
+
+    def _resolve_rounds(self, max_rounds):
         from ..utils import log
-        for dep in root_nodes:
-            if isinstance(dep, six.string_types):
-                dep = AbstractDependency.from_string(dep)
-            elif not isinstance(dep, AbstractDependency):
-                dep = AbstractDependency.from_requirement(dep)
-            self.add_abstract_dep(dep)
 
         for round_ in range(max_rounds):
-            self.pin_deps()
+            with trace_span("pin_deps", round=round_):
+                self.pin_deps()
             self.pin_history[round_] = self.pinned_deps.copy()
 
             if round_ > 0:
@@ -176,19 +715,53 @@ class DependencyResolver(object):
         # TODO: Raise a better error.
         raise RuntimeError("cannot resolve after {} rounds".format(max_rounds))
 
-    def get_hashes(self):
-        for dep in self.pinned_deps.values():
-            if dep.name not in self.hashes:
-                self.hashes[dep.name] = self.get_hashes_for_one(dep)
+    def get_hashes(self, max_workers=None):
+        """Get the hashes of all of the candidates for every pinned dependency.
+
+        The candidates of every dependency are looked up first, one at a time as
+        lookups on the shared finder are serialized anyway, then all of their
+        artifacts are hashed concurrently through the resolver's hash cache.
+        Pass ``max_workers=1`` to hash them one at a time.
+
+        :param int max_workers: The number of threads to use, defaults to
+            :attr:`max_workers`
+        :return: A mapping of dependency names to sets of hashes
+        :rtype: dict[str, set[str]]
+        """
+        with use_tracer(self.tracer), trace_span("get_hashes", category="hashes"):
+            return self._get_hashes(max_workers)
+
+    def _get_hashes(self, max_workers):
+        if max_workers is None:
+            max_workers = self.max_workers or HASH_WORKERS
+        deps = [dep for dep in self.iter_pins() if dep.name not in self.hashes]
+        with self.allow_all_wheels():
+            candidates = [self._get_hashable_candidates(dep) for dep in deps]
+        locations = set(
+            candidate.location for matches in candidates for candidate in matches
+        )
+        hashes = self.hash_cache.get_hashes(locations, max_workers=max_workers)
+        for dep, matches in zip(deps, candidates):
+            self.hashes.setdefault(dep.name, set()).update(
+                hashes[candidate.location] for candidate in matches
+            )
         return self.hashes.copy()
 
-    def get_hashes_for_one(self, ireq):
+    def _ensure_finder(self):
         if not self.finder:
             from .dependencies import get_finder
             finder_args = []
             if self.allow_prereleases:
                 finder_args.append('--pre')
             self.finder = get_finder(*finder_args)
+        return self.finder
+
+    def _get_hashable_candidates(self, ireq):
+        """Find the candidates whose hashes should be collected for *ireq*.
+
+        Must be called inside of :meth:`allow_all_wheels`.
+        """
+        self._ensure_finder()
 
         if ireq.editable:
             return set()
@@ -202,12 +775,14 @@ class DependencyResolver(object):
             raise TypeError(
                 "Expected pinned requirement, got {}".format(ireq))
 
-        matching_candidates = set()
+        from .dependencies import find_all_matches
+        return find_all_matches(
+            self.finder, ireq, pre=self.allow_prereleases, index=self.candidate_index
+        )
+
+    def get_hashes_for_one(self, ireq):
         with self.allow_all_wheels():
-            from .dependencies import find_all_matches
-            matching_candidates = (
-                find_all_matches(self.finder, ireq, pre=self.allow_prereleases)
-            )
+            matching_candidates = self._get_hashable_candidates(ireq)
 
         return {
             self.hash_cache.get_hash(candidate.location)
@@ -221,23 +796,12 @@ class DependencyResolver(object):
 
         This also saves the candidate cache and set a new one, or else the results from the
         previous non-patched calls will interfere.
-        """
-        def _wheel_supported(self, tags=None):
-            # Ignore current platform. Support everything.
-            return True
-
-        def _wheel_support_index_min(self, tags=None):
-            # All wheels are equal priority for sorting.
-            return 0
-
-        original_wheel_supported = Wheel.supported
-        original_support_index_min = Wheel.support_index_min
-
-        Wheel.supported = _wheel_supported
-        Wheel.support_index_min = _wheel_support_index_min
 
+        The patch is shared and reference counted, so it is safe to enter from
+        several threads at once; it stays in place until the last one exits.
+        """
+        _ALL_WHEELS_PATCH.acquire()
         try:
             yield
         finally:
-            Wheel.supported = original_wheel_supported
-            Wheel.support_index_min = original_support_index_min
+            _ALL_WHEELS_PATCH.release()
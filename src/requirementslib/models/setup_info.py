@@ -28,6 +28,7 @@ from vistir.contextmanagers import cd, temp_path
 from vistir.misc import run
 from vistir.path import create_tracked_tempdir, ensure_mkdir_p, mkdir_p, rmtree
 
+from .metrics import METRICS
 from .utils import (
     get_default_pyproject_backend,
     get_name_variants,
@@ -1392,3 +1393,9 @@ build-backend = "{1}"
         created = cls(**creation_kwargs)
         created.get_initial_info()
         return created
+
+
+METRICS.register_function_caches("setup_info", globals())
+METRICS.register_function_cache("SetupInfo.from_ireq", SetupInfo.from_ireq)
+METRICS.register_function_cache("BaseRequirement.from_string", BaseRequirement.from_string)
+METRICS.register_function_cache("BaseRequirement.from_req", BaseRequirement.from_req)
@@ -0,0 +1,271 @@
+# -*- coding=utf-8 -*-
+"""Resolve offline from a local snapshot of an index.
+
+A snapshot is a directory holding the artifacts of the pinned versions in
+``files/`` and a ``snapshot.json`` file listing the candidates of each project
+along with their dependencies and hashes.  While a snapshot is active, see
+:func:`use_snapshot`, finders only search its ``files/`` directory and
+:func:`~requirementslib.models.dependencies.find_all_matches`,
+:func:`~requirementslib.models.dependencies.get_dependencies` and
+:class:`~requirementslib.models.cache.HashCache` are answered from it without
+touching the network.  Snapshots are created from a finished resolution with
+:func:`export_snapshot`.
+"""
+from __future__ import absolute_import, print_function
+
+import contextlib
+import hashlib
+import json
+import os
+import threading
+
+import vistir
+from packaging.utils import canonicalize_name
+from pip_shims.shims import FAVORITE_HASH
+
+from .cache import make_installation_candidate, write_cache_file
+from .tracing import trace_count
+from .utils import (
+    as_tuple, get_candidate_link, get_candidate_name, is_pinned_requirement,
+    version_from_ireq
+)
+
+#: The snapshot directory to resolve from instead of the network, if any
+SNAPSHOT_DIR = os.environ.get("REQUIREMENTSLIB_SNAPSHOT_DIR")
+#: The snapshot file format version
+SNAPSHOT_FORMAT = 1
+SNAPSHOT_FILENAME = "snapshot.json"
+
+_ACTIVE_SNAPSHOTS = []
+_LOADED_SNAPSHOTS = {}
+_LOADED_SNAPSHOTS_LOCK = threading.Lock()
+
+
+def _get_dependency_key(ireq):
+    name, version, extras = as_tuple(ireq)
+    if extras:
+        version = "{0}[{1}]".format(version, ",".join(extras))
+    return canonicalize_name(name), version
+
+
+class Snapshot(object):
+    """A local snapshot of the parts of an index a resolution used.
+
+    :param str path: The snapshot directory
+    """
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        self.files_dir = os.path.join(self.path, "files")
+        #: Candidate records for each canonical project name
+        self.projects = {}
+        #: Dependency lines by canonical project name and then version and extras
+        self.dependencies = {}
+        self._hashes = {}
+
+    @property
+    def snapshot_file(self):
+        return os.path.join(self.path, SNAPSHOT_FILENAME)
+
+    @classmethod
+    def load(cls, path):
+        """Read the snapshot in the directory at *path*.
+
+        :raises ValueError: If the snapshot has an unknown format
+        """
+        snapshot = cls(path)
+        with open(snapshot.snapshot_file, "r") as fh:
+            doc = json.load(fh)
+        if doc.get("__format__") != SNAPSHOT_FORMAT:
+            raise ValueError(
+                "Unknown snapshot format: {0!r}".format(doc.get("__format__"))
+            )
+        snapshot.projects = doc["projects"]
+        snapshot.dependencies = doc["dependencies"]
+        for records in snapshot.projects.values():
+            for record in records:
+                if record.get("filename") and record.get("hash"):
+                    snapshot._hashes[record["filename"]] = record["hash"]
+        return snapshot
+
+    def save(self):
+        vistir.path.mkdir_p(self.files_dir)
+        write_cache_file(self.snapshot_file, {
+            "__format__": SNAPSHOT_FORMAT,
+            "projects": self.projects,
+            "dependencies": self.dependencies,
+        })
+
+    def add_candidate(self, candidate, session=None, download=False):
+        """Record a candidate, copying its artifact into the snapshot if *download*.
+
+        :param candidate: The candidate to record
+        :type candidate: :class:`~pip._internal.index.InstallationCandidate`
+        :param session: The session to download artifacts with
+        :type session: :class:`requests.Session`
+        :param bool download: Whether to store the candidate's artifact
+        """
+        link = get_candidate_link(candidate)
+        record = {
+            "version": str(candidate.version),
+            "url": link.url_without_fragment,
+            "requires_python": getattr(link, "requires_python", None),
+            "filename": None,
+            "hash": None,
+        }
+        if download:
+            record["filename"] = link.filename
+            record["hash"] = self._download(link, session)
+            self._hashes[link.filename] = record["hash"]
+        name = canonicalize_name(get_candidate_name(candidate))
+        records = self.projects.setdefault(name, [])
+        records[:] = [r for r in records if r["url"] != record["url"]]
+        records.append(record)
+
+    def _download(self, link, session):
+        vistir.path.mkdir_p(self.files_dir)
+        target = os.path.join(self.files_dir, link.filename)
+        h = hashlib.new(FAVORITE_HASH)
+        with vistir.contextmanagers.open_file(link, session) as fp:
+            with vistir.contextmanagers.atomic_open_for_write(target, binary=True) as out:
+                for chunk in iter(lambda: fp.read(1024 * 1024), b""):
+                    h.update(chunk)
+                    out.write(chunk)
+                    if link.scheme != "file":
+                        trace_count("bytes_downloaded", len(chunk))
+        return ":".join([FAVORITE_HASH, h.hexdigest()])
+
+    def add_dependencies(self, ireq, lines):
+        """Record the dependency lines of a pinned requirement."""
+        name, version_and_extras = _get_dependency_key(ireq)
+        self.dependencies.setdefault(name, {})[version_and_extras] = sorted(lines)
+
+    def get_candidates(self, name):
+        """Returns the candidates of a project.
+
+        Candidates whose artifacts are in the snapshot point at the local file.
+
+        :rtype: list[:class:`~pip._internal.index.InstallationCandidate`]
+        """
+        candidates = []
+        for record in self.projects.get(canonicalize_name(name), []):
+            url = record["url"]
+            if record["filename"]:
+                url = vistir.path.path_to_url(
+                    os.path.join(self.files_dir, record["filename"])
+                )
+                if record["hash"]:
+                    url = "{0}#{1}".format(url, record["hash"].replace(":", "=", 1))
+            candidates.append(make_installation_candidate(
+                name, record["version"], url, record["requires_python"]
+            ))
+        return candidates
+
+    def get_dependencies(self, ireq):
+        """Returns the recorded dependency lines of a pinned requirement, or None."""
+        if ireq.editable or not is_pinned_requirement(ireq):
+            return None
+        name, version_and_extras = _get_dependency_key(ireq)
+        return self.dependencies.get(name, {}).get(version_and_extras)
+
+    def get_hash(self, location):
+        """Returns the recorded hash of an artifact in the snapshot, or None."""
+        if location.scheme != "file":
+            return None
+        path = vistir.path.url_to_path(location.url_without_fragment)
+        if os.path.dirname(os.path.abspath(path)) != self.files_dir:
+            return None
+        return self._hashes.get(os.path.basename(path))
+
+
+def load_snapshot(path):
+    """Load the snapshot at *path*, reusing it if it was loaded before."""
+    path = os.path.abspath(path)
+    with _LOADED_SNAPSHOTS_LOCK:
+        if path not in _LOADED_SNAPSHOTS:
+            _LOADED_SNAPSHOTS[path] = Snapshot.load(path)
+        return _LOADED_SNAPSHOTS[path]
+
+
+def get_active_snapshot():
+    """Returns the snapshot to resolve from, or None to use the network.
+
+    This is the innermost snapshot passed to :func:`use_snapshot`, or the one in
+    :data:`SNAPSHOT_DIR` (``REQUIREMENTSLIB_SNAPSHOT_DIR``).
+
+    :rtype: :class:`Snapshot` or None
+    """
+    if _ACTIVE_SNAPSHOTS:
+        return _ACTIVE_SNAPSHOTS[-1]
+    if SNAPSHOT_DIR:
+        return load_snapshot(SNAPSHOT_DIR)
+    return None
+
+
+@contextlib.contextmanager
+def use_snapshot(snapshot):
+    """Resolve from a snapshot instead of the network inside of the block.
+
+    :param snapshot: A snapshot or the path to one
+    :type snapshot: :class:`Snapshot` or str
+    """
+    if not isinstance(snapshot, Snapshot):
+        snapshot = load_snapshot(snapshot)
+    _ACTIVE_SNAPSHOTS.append(snapshot)
+    try:
+        yield snapshot
+    finally:
+        _ACTIVE_SNAPSHOTS.remove(snapshot)
+
+
+def export_snapshot(resolver, path, dependency_cache=None, session=None):
+    """Capture everything a resolution used into a snapshot.
+
+    Every candidate the resolver looked up is recorded along with its cached
+    dependencies, and the artifacts of the pinned versions are copied into the
+    snapshot so they can be installed and hashed offline.  Candidates of other
+    versions are only recorded if their dependencies are known.
+
+    :param resolver: A resolver which has finished resolving
+    :type resolver: :class:`~requirementslib.models.resolvers.DependencyResolver`
+    :param str path: The directory to write the snapshot to
+    :param dependency_cache: The dependency cache to read from, defaults to
+        :data:`~requirementslib.models.dependencies.DEPENDENCY_CACHE`
+    :type dependency_cache: :class:`~requirementslib.models.cache.DependencyCache`
+    :param session: The session to download artifacts with, defaults to the
+        resolver's hash cache session
+    :type session: :class:`requests.Session`
+    :return: The new snapshot
+    :rtype: :class:`Snapshot`
+    """
+    from pip_shims.shims import InstallRequirement
+
+    if dependency_cache is None:
+        from .dependencies import DEPENDENCY_CACHE as dependency_cache
+    if session is None and resolver.hash_cache is not None:
+        session = resolver.hash_cache.session
+    snapshot = Snapshot(path)
+    pinned = {}
+    for ireq in resolver.iter_pins():
+        if ireq.editable or not is_pinned_requirement(ireq):
+            continue
+        versions = pinned.setdefault(canonicalize_name(ireq.name), set())
+        versions.add(version_from_ireq(ireq))
+        lines = dependency_cache.get(ireq)
+        if lines is not None:
+            snapshot.add_dependencies(ireq, lines)
+    for name, candidates in resolver.candidate_index.items():
+        for candidate in candidates:
+            version = str(candidate.version)
+            is_pinned = version in pinned.get(name, ())
+            ireq = InstallRequirement.from_line("{0}=={1}".format(name, version))
+            lines = dependency_cache.get(ireq)
+            if lines is None and not is_pinned:
+                continue
+            if lines is not None:
+                snapshot.add_dependencies(ireq, lines)
+            snapshot.add_candidate(candidate, session=session, download=is_pinned)
+    snapshot.save()
+    with _LOADED_SNAPSHOTS_LOCK:
+        _LOADED_SNAPSHOTS[snapshot.path] = snapshot
+    return snapshot
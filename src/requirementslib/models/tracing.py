@@ -0,0 +1,207 @@
+# -*- coding=utf-8 -*-
+"""Structured tracing of resolutions.
+
+A :class:`Tracer` records timed spans of the phases of a resolution, e.g.
+``pin_deps``, ``get_deps``, ``find_all_matches``, each dependency getter and
+hashing, along with counters such as cache hits and misses, backtracks, the
+number of candidates of each package and the bytes downloaded.  Activate one
+with :func:`use_tracer` or pass it to
+:class:`~requirementslib.models.resolvers.DependencyResolver`, then export what
+it collected with :meth:`Tracer.as_dict` or :meth:`Tracer.write_chrome_trace`::
+
+    tracer = Tracer()
+    resolver = DependencyResolver.create()
+    resolver.tracer = tracer
+    resolver.resolve(["requests"])
+    tracer.write_chrome_trace("resolve.json")  # open in chrome://tracing
+"""
+from __future__ import absolute_import, print_function
+
+import contextlib
+import json
+import os
+import threading
+import time
+
+_ACTIVE_TRACERS = []
+_clock = getattr(time, "perf_counter", time.time)
+
+
+class Tracer(object):
+    """Collects spans and counters while it is active.
+
+    :param callback: Called with every event as it is recorded, a dict whose
+        ``type`` is ``"span"`` or ``"count"``
+    :type callback: callable
+    """
+
+    def __init__(self, callback=None):
+        self.callback = callback
+        #: Finished spans as dicts of ``name``, ``category``, ``start`` and
+        #: ``duration`` in seconds, ``thread`` and ``args``
+        self.spans = []
+        #: Counter totals by name
+        self.counters = {}
+        #: Counter totals by package name and then counter name
+        self.packages = {}
+        self._start = _clock()
+        self._lock = threading.Lock()
+
+    def _emit(self, event):
+        if self.callback is not None:
+            self.callback(event)
+
+    @contextlib.contextmanager
+    def span(self, name, category="resolver", **args):
+        """Time the block as a span called *name*.
+
+        :param str name: The name of the span
+        :param str category: The category of the span
+        :param args: Details to record with the span, e.g. the package
+        """
+        start = _clock()
+        try:
+            yield
+        finally:
+            event = {
+                "type": "span",
+                "name": name,
+                "category": category,
+                "start": start - self._start,
+                "duration": _clock() - start,
+                "thread": threading.current_thread().ident,
+                "args": args,
+            }
+            with self._lock:
+                self.spans.append(event)
+            self._emit(event)
+
+    def count(self, name, value=1, package=None):
+        """Add *value* to the counter called *name*.
+
+        :param str name: The name of the counter
+        :param int value: The amount to add, defaults to 1
+        :param str package: The package to also count it for, if any
+        """
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+            if package is not None:
+                counters = self.packages.setdefault(package, {})
+                counters[name] = counters.get(name, 0) + value
+        self._emit({"type": "count", "name": name, "value": value, "package": package})
+
+    def get_timings(self):
+        """Returns the number of spans and their total duration by span name.
+
+        :rtype: dict[str, dict]
+        """
+        timings = {}
+        with self._lock:
+            for span in self.spans:
+                timing = timings.setdefault(span["name"], {"count": 0, "total": 0.0})
+                timing["count"] += 1
+                timing["total"] += span["duration"]
+        return timings
+
+    def as_dict(self):
+        """Returns everything collected as a JSON serializable dict."""
+        with self._lock:
+            spans = list(self.spans)
+            counters = dict(self.counters)
+            packages = dict((k, dict(v)) for k, v in self.packages.items())
+        return {
+            "timings": self.get_timings(),
+            "counters": counters,
+            "packages": packages,
+            "spans": spans,
+        }
+
+    def to_json(self, **kwargs):
+        return json.dumps(self.as_dict(), sort_keys=True, **kwargs)
+
+    def as_chrome_trace(self):
+        """Returns the spans and counters in the Chrome trace event format.
+
+        The result can be loaded into ``chrome://tracing`` or Perfetto.
+
+        :rtype: dict
+        """
+        pid = os.getpid()
+        events = []
+        end = 0.0
+        with self._lock:
+            for span in self.spans:
+                events.append({
+                    "name": span["name"],
+                    "cat": span["category"],
+                    "ph": "X",
+                    "ts": span["start"] * 1e6,
+                    "dur": span["duration"] * 1e6,
+                    "pid": pid,
+                    "tid": span["thread"],
+                    "args": span["args"],
+                })
+                end = max(end, span["start"] + span["duration"])
+            counters = dict(self.counters)
+        if counters:
+            events.append({
+                "name": "counters", "ph": "C", "ts": end * 1e6, "pid": pid, "tid": 0,
+                "args": counters,
+            })
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write_chrome_trace(self, path):
+        """Write the Chrome trace of everything collected to *path*."""
+        with open(path, "w") as fh:
+            json.dump(self.as_chrome_trace(), fh)
+
+
+class _NullSpan(object):
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def get_active_tracer():
+    """Returns the innermost tracer passed to :func:`use_tracer`, or None.
+
+    :rtype: :class:`Tracer` or None
+    """
+    return _ACTIVE_TRACERS[-1] if _ACTIVE_TRACERS else None
+
+
+@contextlib.contextmanager
+def use_tracer(tracer):
+    """Record spans and counters with *tracer* inside of the block.
+
+    :param tracer: The tracer to activate, None leaves the active tracer as is
+    :type tracer: :class:`Tracer` or None
+    """
+    if tracer is None:
+        yield None
+        return
+    _ACTIVE_TRACERS.append(tracer)
+    try:
+        yield tracer
+    finally:
+        _ACTIVE_TRACERS.remove(tracer)
+
+
+def trace_span(name, category="resolver", **args):
+    """Time the block with the active tracer, does nothing without one."""
+    tracer = get_active_tracer()
+    if tracer is None:
+        return _NULL_SPAN
+    return tracer.span(name, category=category, **args)
+
+
+def trace_count(name, value=1, package=None):
+    """Count with the active tracer, does nothing without one."""
+    tracer = get_active_tracer()
+    if tracer is not None:
+        tracer.count(name, value=value, package=package)
@@ -6,9 +6,10 @@ import os
 import re
 import string
 import sys
+import threading
+import weakref
 from collections import defaultdict
 from itertools import chain, groupby
-from operator import attrgetter
 
 import six
 import tomlkit
@@ -26,6 +27,7 @@ from vistir.compat import lru_cache
 from vistir.misc import dedup
 from vistir.path import is_valid_url
 
+from .metrics import METRICS
 from ..environment import MYPY_RUNNING
 from ..utils import SCHEME_LIST, VCS_LIST, is_star
 
@@ -44,6 +46,7 @@ if MYPY_RUNNING:
         AnyStr,
         Match,
         Iterable,  # noqa
+        Iterator,
     )
     from attr import _ValidatorType  # noqa
     from packaging.requirements import Requirement as PackagingRequirement
@@ -94,6 +97,24 @@ HOST_RE = r"(?:{0}?(?P<host>[^ ]+?\.?{1}+(?P<port>:\d+)?))?".format(
 URL = r"(?P<scheme>[^ ]+://){0}{1}".format(HOST_RE, PATH_RE)
 URL_RE = re.compile(r"{0}(?:{1}?{2}?)?".format(URL, URL_NAME, SUBDIR_RE))
 DIRECT_URL_RE = re.compile(r"{0}\s?@\s?{1}".format(NAME_WITH_EXTRAS, URL))
+SPECIFIER = r"(?:===|~=|==|!=|<=|>=|<|>)\s*[\w.*+!-]+"
+#: Matches requirements which are only a name, extras and version specifiers
+NAMED_REQUIREMENT_RE = re.compile(
+    r"^{0}\s*(?P<specifiers>{1}(?:\s*,\s*{1})*)?\s*$".format(NAME_WITH_EXTRAS, SPECIFIER)
+)
+#: Matches comments in requirements files
+COMMENT_RE = re.compile(r"(^|\s+)#.*$")
+#: Matches ``-r``/``-c`` lines including other requirements files
+INCLUDE_RE = re.compile(
+    r"^(?P<option>-r|--requirement|-c|--constraint)(?:\s*=\s*|\s+|(?<=-r)|(?<=-c))"
+    r"(?P<location>\S.*)$"
+)
+#: Matches ``-e``/``--editable`` lines
+EDITABLE_RE = re.compile(r"^(?:-e|--editable)(?:\s*=\s*|\s+|(?<=-e))(?P<line>\S.*)$")
+#: Matches the per-requirement pip options requirementslib has no use for
+IGNORED_OPTION_RE = re.compile(
+    r"\s+--(?:install|global)-option(?:\s*=\s*|\s+)(?:\"[^\"]*\"|'[^']*'|\S+)"
+)
 
 
 def filter_none(k, v):
@@ -501,6 +522,38 @@ def get_pyproject(path):
     return requires, backend
 
 
+def iter_logical_lines(lines):
+    # type: (Iterable[AnyStr]) -> Iterator[Tuple[int, AnyStr]]
+    """Yields the logical lines of a requirements file along with their line numbers.
+
+    Lines ending in a backslash are joined with the next one, comments and blank
+    lines are skipped.
+
+    :param lines: The lines of a requirements file
+    :type lines: Iterable[str]
+    :return: Tuples of the number of the first physical line and the logical line
+    :rtype: Iterator[Tuple[int, str]]
+    """
+    parts = []  # type: List[AnyStr]
+    start = None  # type: Optional[int]
+    for number, line in enumerate(lines, 1):
+        line = line.rstrip("\r\n")
+        if not parts:
+            start = number
+        if line.endswith("\\") and not COMMENT_RE.match(line):
+            parts.append(line[:-1])
+            continue
+        parts.append(line)
+        line = COMMENT_RE.sub("", "".join(parts)).strip()
+        parts = []
+        if line:
+            yield start, line
+    if parts:
+        line = COMMENT_RE.sub("", "".join(parts)).strip()
+        if line:
+            yield start, line
+
+
 def split_markers_from_line(line):
     # type: (AnyStr) -> Tuple[AnyStr, Optional[AnyStr]]
     """Split markers from a dependency"""
@@ -880,31 +933,92 @@ def version_from_ireq(ireq):
     return first(ireq.specifier._specs).version
 
 
-def clean_requires_python(candidates):
-    """Get a cleaned list of all the candidates with valid specifiers in the `requires_python` attributes."""
-    all_candidates = []
-    sys_version = ".".join(map(str, sys.version_info[:3]))
-    from packaging.version import parse as parse_version
+def get_candidate_link(candidate):
+    """Get the link of an installation candidate.
+
+    Newer versions of pip renamed ``InstallationCandidate.location`` to ``link``.
+    """
+    link = getattr(candidate, "link", None)
+    return link if link is not None else candidate.location
+
+
+def get_candidate_name(candidate):
+    """Get the project name of an installation candidate.
+
+    Depending on the version of pip it is ``project_name``, ``project`` or ``name``.
+    """
+    for attribute in ("project_name", "project"):
+        name = getattr(candidate, attribute, None)
+        if name is not None:
+            return name
+    return candidate.name
+
+
+_FINDER_LOCKS = weakref.WeakKeyDictionary()
+_FINDER_LOCKS_LOCK = threading.Lock()
+
+
+def find_all_candidates(finder, name):
+    """Call ``finder.find_all_candidates(name)``, one lookup at a time per finder.
 
-    py_version = parse_version(os.environ.get("PIP_PYTHON_VERSION", sys_version))
+    Finders are shared between threads, e.g. by the
+    :class:`~requirementslib.models.dependencies.FinderPool` and the concurrent
+    hash collection, but pip's ``PackageFinder`` isn't documented as thread safe.
+
+    :rtype: list[:class:`~pip._internal.index.InstallationCandidate`]
+    """
+    with _FINDER_LOCKS_LOCK:
+        lock = _FINDER_LOCKS.get(finder)
+        if lock is None:
+            lock = _FINDER_LOCKS[finder] = threading.Lock()
+    with lock:
+        return list(finder.find_all_candidates(name))
+
+
+def supports_python(requires_python, python_version):
+    """Whether a ``Requires-Python`` specifier allows the given Python version.
+
+    Invalid specifiers allow nothing, a missing one allows every version.
+
+    :param str requires_python: The specifier, e.g. ``>=2.7,!=3.0.*``
+    :param python_version: The Python version to check
+    :type python_version: str or :class:`~packaging.version.Version`
+    :rtype: bool
+    """
+    if not requires_python:
+        return True
+    # Old specifications had people setting this to single digits
+    # which is effectively the same as '>=digit,<digit+1'
+    if requires_python.isdigit():
+        requires_python = ">={0},<{1}".format(requires_python, int(requires_python) + 1)
+    try:
+        specifierset = SpecifierSet(requires_python)
+    except InvalidSpecifier:
+        return False
+    if isinstance(python_version, six.string_types):
+        python_version = parse_version(python_version)
+    return specifierset.contains(python_version)
+
+
+def clean_requires_python(candidates, python_versions=None):
+    """Get a cleaned list of all the candidates with valid specifiers in the `requires_python` attributes.
+
+    :param candidates: The candidates to filter
+    :param python_versions: Keep candidates supporting any of these Python versions,
+        defaults to the running one or ``PIP_PYTHON_VERSION``
+    :type python_versions: list[str]
+    """
+    all_candidates = []
+    if not python_versions:
+        sys_version = ".".join(map(str, sys.version_info[:3]))
+        python_versions = [os.environ.get("PIP_PYTHON_VERSION", sys_version)]
+    py_versions = [parse_version(version) for version in python_versions]
     for c in candidates:
-        from_location = attrgetter("location.requires_python")
-        requires_python = getattr(c, "requires_python", from_location(c))
-        if requires_python:
-            # Old specifications had people setting this to single digits
-            # which is effectively the same as '>=digit,<digit+1'
-            if requires_python.isdigit():
-                requires_python = ">={0},<{1}".format(
-                    requires_python, int(requires_python) + 1
-                )
-            try:
-                specifierset = SpecifierSet(requires_python)
-            except InvalidSpecifier:
-                continue
-            else:
-                if not specifierset.contains(py_version):
-                    continue
-        all_candidates.append(c)
+        requires_python = getattr(
+            c, "requires_python", getattr(get_candidate_link(c), "requires_python", None)
+        )
+        if any(supports_python(requires_python, version) for version in py_versions):
+            all_candidates.append(c)
     return all_candidates
 
 
@@ -975,3 +1089,6 @@ SETUPTOOLS_SHIM = (
     "f.close();"
     "exec(compile(code, __file__, 'exec'))"
 )
+
+
+METRICS.register_function_caches("utils", globals())
@@ -196,13 +196,37 @@ def tag_release(ctx, version=None, type_="patch", yes=False, dry_run=False):
         ctx.run(git_tag_cmd)
 
 
+@invoke.task()
+def benchmark(ctx, compare=True, fail="median:25%", packages=None):
+    """Run the benchmarks and compare them with the previous run.
+
+    Every run is saved under ``.benchmarks/`` along with the commit it ran on,
+    use ``pytest-benchmark compare`` to look at the history.
+
+    :param bool compare: Whether to compare against the previous run
+    :param str fail: Fail if any benchmark got slower than this, e.g. ``median:25%``
+    :param int packages: The number of packages in the generated index
+    """
+    args = ["--benchmark-autosave", "--benchmark-sort=name"]
+    if compare:
+        args.extend(["--benchmark-compare", f"--benchmark-compare-fail={fail}"])
+    if packages:
+        args.append(f"--index-packages={packages}")
+    ctx.run(f"python -m pytest tests/benchmarks --no-cov {' '.join(args)}")
+
+
 @invoke.task(pre=[clean])
-def release(ctx, type_, repo, prebump=PREBUMP, yes=False):
+def release(ctx, type_, repo, prebump=PREBUMP, yes=False, benchmarks=False):
     """Make a new release.
+
+    With ``--benchmarks`` the benchmarks run first and the release is aborted if
+    anything got slower than the previous run on this machine.
     """
     if prebump not in REL_TYPES:
         raise ValueError(f"{type_} not in {REL_TYPES}")
     prebump = REL_TYPES.index(prebump)
+    if benchmarks:
+        benchmark(ctx)
 
     version = bump_version(ctx, type_, log=True)
     # Needs to happen before Towncrier deletes fragment files.
@@ -301,6 +325,7 @@ ns = invoke.Collection(
     release,
     clean_mdchangelog,
     profile,
+    benchmark,
     typecheck,
     build,
     get_next_version,
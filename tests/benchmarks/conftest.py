@@ -0,0 +1,68 @@
+# -*- coding=utf-8 -*-
+"""Fixtures of the benchmarks, which need ``pytest-benchmark``.
+
+The size of the generated index is set with ``--index-packages``,
+``--index-versions``, ``--index-dependencies`` and ``--index-roots``, or the matching
+``REQUIREMENTSLIB_BENCHMARK_*`` environment variables.
+"""
+from __future__ import absolute_import, print_function
+
+import os
+
+import pytest
+
+from .index import IndexServer, SyntheticIndex
+
+try:
+    import pytest_benchmark  # noqa
+except ImportError:
+    collect_ignore_glob = ["test_*.py"]
+
+INDEX_OPTIONS = (
+    ("packages", 50, "The number of packages in the generated index"),
+    ("versions", 3, "The number of versions of each generated package"),
+    ("dependencies", 3, "The most dependencies of each generated version"),
+    ("seed", 0, "The seed of the generated dependency graph"),
+    ("roots", 10, "The number of generated packages to resolve"),
+)
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("requirementslib benchmarks")
+    for name, default, help_text in INDEX_OPTIONS:
+        env_var = "REQUIREMENTSLIB_BENCHMARK_{0}".format(name.upper())
+        group.addoption(
+            "--index-{0}".format(name), type=int,
+            default=int(os.environ.get(env_var, default)),
+            help="{0} (${1}, default {2})".format(help_text, env_var, default),
+        )
+
+
+@pytest.fixture(scope="session")
+def synthetic_index(request, tmpdir_factory):
+    options = dict(
+        (name, request.config.getoption("index_{0}".format(name)))
+        for name, _, _ in INDEX_OPTIONS
+    )
+    directory = tmpdir_factory.mktemp("index").strpath
+    return SyntheticIndex(directory, **options).generate()
+
+
+@pytest.fixture(scope="session")
+def index_server(synthetic_index):
+    with IndexServer(synthetic_index) as server:
+        yield server
+
+
+@pytest.fixture
+def use_index(index_server, tmpdir, monkeypatch):
+    """Point requirementslib at the local index with fresh, empty caches."""
+    from requirementslib.models import dependencies
+    from requirementslib.models.cache import DependencyCache
+
+    monkeypatch.setattr(dependencies, "INDEX_URL", index_server.index_url)
+    monkeypatch.setattr(dependencies, "JSON_API_URL", index_server.json_api_url)
+    monkeypatch.setattr(
+        dependencies, "DEPENDENCY_CACHE", DependencyCache(cache_dir=tmpdir.strpath)
+    )
+    return index_server
@@ -0,0 +1,290 @@
+# -*- coding=utf-8 -*-
+"""A generated package index served over HTTP for the benchmarks.
+
+:class:`SyntheticIndex` writes wheels for a random but reproducible dependency
+graph to a directory, and :class:`IndexServer` serves it the way PyPI does:
+
+* ``/simple/<name>/`` pages (:pep:`503`) with hashes, ``data-requires-python``
+  and ``data-dist-info-metadata`` (:pep:`658`)
+* ``/packages/<filename>``, with range requests, and ``<filename>.metadata``
+* ``/pypi/<name>/<version>/json``
+"""
+from __future__ import absolute_import, print_function
+
+import hashlib
+import io
+import json
+import os
+import random
+import re
+import threading
+import zipfile
+
+from six.moves import BaseHTTPServer, socketserver
+from six.moves.urllib import parse as urllib_parse
+
+METADATA_TEMPLATE = """Metadata-Version: 2.1
+Name: {name}
+Version: {version}
+Summary: A synthetic package
+"""
+
+WHEEL_TEMPLATE = """Wheel-Version: 1.0
+Generator: requirementslib-benchmarks
+Root-Is-Purelib: true
+Tag: py2-none-any
+Tag: py3-none-any
+"""
+
+
+def _sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+class SyntheticIndex(object):
+    """A reproducible dependency graph of synthetic packages.
+
+    Packages are called ``pkg-0000``, ``pkg-0001`` and so on and only depend
+    on packages with higher numbers, so the graph has no cycles.  Every
+    version depends on up to *dependencies* of the next packages with a lower
+    bound, newer versions raising the bound, and one in every seven versions
+    requires Python 3.
+
+    :param str directory: The directory to write the packages to
+    :param int packages: The number of packages
+    :param int versions: The number of versions of each package
+    :param int dependencies: The most dependencies of each version
+    :param int seed: The seed of the graph
+    :param int roots: The number of packages to resolve
+    """
+
+    def __init__(
+        self, directory, packages=50, versions=3, dependencies=3, seed=0, roots=10
+    ):
+        self.directory = directory
+        self.packages = packages
+        self.root_count = min(roots, packages)
+        self.versions = versions
+        self.dependencies = dependencies
+        self.seed = seed
+        #: The release records of each package by name
+        self.releases = {}
+
+    @property
+    def names(self):
+        return ["pkg-{0:04d}".format(number) for number in range(self.packages)]
+
+    @property
+    def roots(self):
+        """The packages to resolve, the first ones have the deepest dependency trees."""
+        return self.names[:self.root_count]
+
+    def generate(self):
+        """Write the wheels of every package and return the index."""
+        rng = random.Random(self.seed)
+        names = self.names
+        packages_dir = os.path.join(self.directory, "packages")
+        if not os.path.isdir(packages_dir):
+            os.makedirs(packages_dir)
+        for number, name in enumerate(names):
+            releases = []
+            following = names[number + 1:number + 1 + self.dependencies * 3]
+            for minor in range(self.versions):
+                version = "1.{0}".format(minor)
+                count = min(len(following), rng.randint(0, self.dependencies))
+                requires_dist = [
+                    "{0}>=1.{1}".format(dependency, rng.randint(0, minor))
+                    for dependency in sorted(rng.sample(following, count))
+                ]
+                requires_python = ">=3" if rng.randint(0, 6) == 0 else None
+                releases.append(self._write_wheel(
+                    packages_dir, name, version, requires_dist, requires_python
+                ))
+            self.releases[name] = releases
+        return self
+
+    def _write_wheel(self, packages_dir, name, version, requires_dist, requires_python):
+        module = name.replace("-", "_")
+        filename = "{0}-{1}-py2.py3-none-any.whl".format(module, version)
+        dist_info = "{0}-{1}.dist-info".format(module, version)
+        metadata = METADATA_TEMPLATE.format(name=name, version=version)
+        if requires_python:
+            metadata += "Requires-Python: {0}\n".format(requires_python)
+        metadata += "".join("Requires-Dist: {0}\n".format(r) for r in requires_dist)
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as wheel:
+            wheel.writestr("{0}.py".format(module), "VERSION = {0!r}\n".format(version))
+            wheel.writestr("{0}/METADATA".format(dist_info), metadata)
+            wheel.writestr("{0}/WHEEL".format(dist_info), WHEEL_TEMPLATE)
+            wheel.writestr("{0}/RECORD".format(dist_info), "")
+        data = buffer.getvalue()
+        with open(os.path.join(packages_dir, filename), "wb") as fh:
+            fh.write(data)
+        metadata = metadata.encode("utf-8")
+        with open(os.path.join(packages_dir, filename + ".metadata"), "wb") as fh:
+            fh.write(metadata)
+        return {
+            "version": version,
+            "filename": filename,
+            "sha256": _sha256(data),
+            "metadata_sha256": _sha256(metadata),
+            "requires_dist": requires_dist,
+            "requires_python": requires_python,
+        }
+
+    def project_page(self, name):
+        links = []
+        for release in self.releases[name]:
+            attributes = [
+                'href="../../packages/{0}#sha256={1}"'.format(
+                    release["filename"], release["sha256"]
+                ),
+                'data-dist-info-metadata="sha256={0}"'.format(release["metadata_sha256"]),
+            ]
+            if release["requires_python"]:
+                attributes.append('data-requires-python="{0}"'.format(
+                    release["requires_python"].replace(">", "&gt;")
+                ))
+            links.append("<a {0}>{1}</a><br/>".format(
+                " ".join(attributes), release["filename"]
+            ))
+        return "<!DOCTYPE html>\n<html><body>\n{0}\n</body></html>\n".format(
+            "\n".join(links)
+        )
+
+    def root_page(self):
+        return "<!DOCTYPE html>\n<html><body>\n{0}\n</body></html>\n".format("\n".join(
+            '<a href="{0}/">{0}</a><br/>'.format(name) for name in sorted(self.releases)
+        ))
+
+    def json_release(self, name, version):
+        for release in self.releases.get(name, []):
+            if release["version"] == version:
+                return {"info": {
+                    "name": name,
+                    "version": version,
+                    "requires_dist": release["requires_dist"] or None,
+                    "requires_python": release["requires_python"],
+                }}
+        return None
+
+
+class _IndexRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_HEAD(self):
+        self._respond(head=True)
+
+    def do_GET(self):
+        self._respond()
+
+    def _respond(self, head=False):
+        index = self.server.index
+        self.server.count(self.command)
+        path = urllib_parse.unquote(urllib_parse.urlsplit(self.path).path)
+        parts = [part for part in path.split("/") if part]
+        if parts == ["simple"]:
+            return self._send(index.root_page().encode("utf-8"), "text/html", head)
+        if len(parts) == 2 and parts[0] == "simple" and parts[1] in index.releases:
+            page = index.project_page(parts[1]).encode("utf-8")
+            return self._send(page, "text/html", head)
+        if len(parts) == 4 and parts[0] == "pypi" and parts[3] == "json":
+            release = index.json_release(parts[1], parts[2])
+            if release is not None:
+                data = json.dumps(release).encode("utf-8")
+                return self._send(data, "application/json", head)
+        if len(parts) == 2 and parts[0] == "packages" and "/" not in parts[1]:
+            filename = os.path.join(index.directory, "packages", parts[1])
+            if os.path.isfile(filename):
+                with open(filename, "rb") as fh:
+                    data = fh.read()
+                return self._send(data, "application/octet-stream", head, ranges=True)
+        self._send(b"Not Found", "text/plain", head, status=404)
+
+    def _send(self, data, content_type, head, status=200, ranges=False):
+        match = None
+        if ranges:
+            match = re.match(r"bytes=(\d*)-(\d*)$", self.headers.get("Range") or "")
+        if match:
+            first, last = match.groups()
+            if not first:
+                first, last = max(len(data) - int(last), 0), len(data) - 1
+            else:
+                first = int(first)
+                last = min(int(last), len(data) - 1) if last else len(data) - 1
+            status = 206
+            content_range = "bytes {0}-{1}/{2}".format(first, last, len(data))
+            data = data[first:last + 1]
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        if ranges:
+            self.send_header("Accept-Ranges", "bytes")
+        if match:
+            self.send_header("Content-Range", content_range)
+        self.end_headers()
+        if not head:
+            self.server.count("bytes", len(data))
+            self.wfile.write(data)
+
+
+class _ThreadingHTTPServer(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+class IndexServer(object):
+    """Serves a :class:`SyntheticIndex` on localhost from a background thread.
+
+    Use it as a context manager, the server is stopped on exit.
+
+    :param index: The index to serve
+    :type index: :class:`SyntheticIndex`
+    """
+
+    def __init__(self, index):
+        self.index = index
+        self._server = None
+        self._thread = None
+        self._lock = threading.Lock()
+        #: The number of requests by method and the bytes sent
+        self.counters = {}
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return "http://{0}:{1}".format(host, port)
+
+    @property
+    def index_url(self):
+        return "{0}/simple".format(self.url)
+
+    @property
+    def json_api_url(self):
+        return "{0}/pypi".format(self.url)
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def start(self):
+        self._server = _ThreadingHTTPServer(("127.0.0.1", 0), _IndexRequestHandler)
+        self._server.index = self.index
+        self._server.count = self.count
+        self._thread = threading.Thread(target=self._server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
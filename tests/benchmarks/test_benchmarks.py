@@ -0,0 +1,202 @@
+# -*- coding=utf-8 -*-
+from __future__ import absolute_import, print_function
+
+import itertools
+import json
+import os
+import shutil
+
+import pytest
+from pip_shims import InstallRequirement
+from vistir.path import path_to_url
+
+from requirementslib.models import markers
+from requirementslib.models.cache import CandidateIndex, DependencyCache, HashCache
+from requirementslib.models.lockfile import Lockfile
+from requirementslib.models.requirements import Line, Requirement
+from requirementslib.models.resolvers import DependencyResolver
+from requirementslib.models.setup_info import SetupInfo, _prepare_wheel_building_kwargs
+
+ARTIFACTS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "artifacts")
+
+LINES = [
+    "six",
+    "requests[security,socks]>=2.19,<3",
+    "pytz==2018.5; python_version >= '2.7' and os_name != 'nt'",
+    "pkg-0001>=1.0,!=1.1; sys_platform == 'win32' or python_version >= '3.6'",
+]
+
+PIPFILE_ENTRIES = [
+    ("six", "*"),
+    ("requests", {"version": ">=2.19", "extras": ["security"], "markers": "os_name != 'nt'"}),
+    ("pytz", {"version": "==2018.5", "index": "pypi", "hashes": ["sha256:" + "0" * 64]}),
+    ("pkg-0001", {"version": ">=1.0", "markers": "sys_platform == 'win32'"}),
+]
+
+MARKERS = [
+    "python_version >= '2.7' and python_version != '3.0.*' and python_version != '3.1.*'",
+    "python_version == '2.7' or python_version == '3.5' or python_version == '3.6'",
+    "os_name == 'nt' and python_version < '3'",
+    "(python_version >= '3.4' and sys_platform == 'win32') or extra == 'socks'",
+    "python_version in '2.6, 2.7, 3.2, 3.3' and platform_machine == 'x86_64'",
+]
+
+
+def clear_function_caches():
+    """Clear the memoized functions so every round starts cold."""
+    Requirement.from_line.cache_clear()
+    SetupInfo.from_ireq.cache_clear()
+    for value in vars(markers).values():
+        if callable(getattr(value, "cache_clear", None)):
+            value.cache_clear()
+
+
+def run_cold(benchmark, func, *args):
+    return benchmark.pedantic(
+        func, args=args, setup=clear_function_caches, rounds=20, warmup_rounds=1
+    )
+
+
+def test_requirement_from_line(benchmark):
+    wheel = os.path.join(ARTIFACTS_DIR, "six", "six-1.11.0-py2.py3-none-any.whl")
+    lines = LINES + [path_to_url(wheel)]
+
+    def from_lines():
+        return [Requirement.from_line(line) for line in lines]
+
+    requirements = run_cold(benchmark, from_lines)
+    assert [r.name for r in requirements][:3] == ["six", "requests", "pytz"]
+
+
+def test_requirement_from_pipfile(benchmark):
+    def from_pipfile():
+        return [Requirement.from_pipfile(name, entry) for name, entry in PIPFILE_ENTRIES]
+
+    requirements = run_cold(benchmark, from_pipfile)
+    assert [r.name for r in requirements] == [name for name, _ in PIPFILE_ENTRIES]
+
+
+def test_line_parse(benchmark):
+    def parse():
+        return [Line(line) for line in LINES]
+
+    lines = run_cold(benchmark, parse)
+    assert lines[0].name == "six"
+
+
+def test_marker_normalization(benchmark):
+    def normalize():
+        return [markers.normalize_marker_str(marker) for marker in MARKERS]
+
+    normalized = run_cold(benchmark, normalize)
+    assert len(normalized) == len(MARKERS)
+
+
+def test_setup_info_create(benchmark, tmpdir):
+    base_dir = tmpdir.join("environ_config").strpath
+    shutil.copytree(
+        os.path.join(ARTIFACTS_DIR, "environ_config", "environ_config"), base_dir
+    )
+    ireq = InstallRequirement.from_line(base_dir)
+    kwargs = _prepare_wheel_building_kwargs(ireq, src_dir=base_dir)
+    setup_info = benchmark.pedantic(
+        SetupInfo.create, args=(base_dir,), kwargs={"ireq": ireq, "kwargs": kwargs},
+        setup=clear_function_caches, rounds=3,
+    )
+    assert setup_info.name == "environ_config"
+
+
+@pytest.fixture
+def lockfile_path(synthetic_index, tmpdir):
+    """A Pipfile.lock pinning the newest version of every generated package."""
+    default = {}
+    for name, releases in sorted(synthetic_index.releases.items()):
+        release = releases[-1]
+        entry = {
+            "version": "=={0}".format(release["version"]),
+            "hashes": ["sha256:{0}".format(release["sha256"])],
+        }
+        if release["requires_python"]:
+            entry["markers"] = "python_version >= '3'"
+        default[name] = entry
+    lockfile = {
+        "_meta": {
+            "hash": {"sha256": "0" * 64},
+            "pipfile-spec": 6,
+            "requires": {},
+            "sources": [{"name": "pypi", "url": "https://pypi.org/simple", "verify_ssl": True}],
+        },
+        "default": default,
+        "develop": {},
+    }
+    path = tmpdir.join("Pipfile.lock")
+    path.write(json.dumps(lockfile, indent=4, sort_keys=True))
+    return path.strpath
+
+
+def test_lockfile_load_and_as_requirements(benchmark, lockfile_path, synthetic_index):
+    def load():
+        return Lockfile.load(lockfile_path).as_requirements(include_hashes=True)
+
+    lines = run_cold(benchmark, load)
+    assert len(lines) == synthetic_index.packages
+
+
+def _make_resolver(use_index, cache_dir):
+    resolver = DependencyResolver.create()
+    resolver.candidate_index = CandidateIndex(ttl=0)
+    resolver.hash_cache = HashCache(cache_dir=cache_dir)
+    return (resolver,), {}
+
+
+def _use_empty_caches(monkeypatch, cache_dir):
+    """Point every cache used while resolving at the empty *cache_dir*."""
+    from pip_shims.shims import FormatControl, WheelCache
+    from requirementslib.models import dependencies
+
+    monkeypatch.setattr(dependencies, "CACHE_DIR", cache_dir)
+    monkeypatch.setattr(
+        dependencies, "PKGS_DOWNLOAD_DIR", os.path.join(cache_dir, "pkgs")
+    )
+    monkeypatch.setattr(
+        dependencies, "WHEEL_DOWNLOAD_DIR", os.path.join(cache_dir, "wheels")
+    )
+    monkeypatch.setattr(
+        dependencies, "WHEEL_CACHE", WheelCache(cache_dir, FormatControl(set(), set()))
+    )
+    monkeypatch.setattr(
+        dependencies, "DEPENDENCY_CACHE", DependencyCache(cache_dir=cache_dir)
+    )
+    # Pooled finders keep their HTTP sessions, which cache the index pages
+    dependencies.FINDER_POOL.close()
+
+
+def _resolve(resolver, roots):
+    resolver.resolve(roots)
+    return resolver
+
+
+def test_resolve_cold(benchmark, use_index, synthetic_index, tmpdir, monkeypatch):
+    rounds = itertools.count()
+
+    def setup():
+        # Every round gets its own empty caches, or only the first one would be cold
+        cache_dir = tmpdir.mkdir("round-{0}".format(next(rounds))).strpath
+        _use_empty_caches(monkeypatch, cache_dir)
+        clear_function_caches()
+        return _make_resolver(use_index, cache_dir)
+
+    resolver = benchmark.pedantic(
+        lambda resolver: _resolve(resolver, synthetic_index.roots), setup=setup, rounds=5
+    )
+    assert set(synthetic_index.roots) <= set(resolver.pinned_deps)
+
+
+def test_resolve_warm(benchmark, use_index, synthetic_index, tmpdir):
+    # The first round fills the dependency cache, which the others are answered from
+    resolver = benchmark.pedantic(
+        lambda resolver: _resolve(resolver, synthetic_index.roots),
+        setup=lambda: _make_resolver(use_index, tmpdir.strpath),
+        rounds=5, warmup_rounds=1,
+    )
+    assert set(synthetic_index.roots) <= set(resolver.pinned_deps)
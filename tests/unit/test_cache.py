@@ -0,0 +1,449 @@
+# -*- coding=utf-8 -*-
+from __future__ import absolute_import, print_function
+
+import gc
+import json
+import os
+import threading
+import time
+import weakref
+
+import pytest
+from pip_shims import InstallRequirement
+
+from requirementslib.models.cache import (
+    CandidateCache, CandidateIndex, DependencyCache, HashCache, make_dependency_record,
+    make_installation_candidate, make_unparsed_dependency_record
+)
+from requirementslib.models.utils import get_candidate_link
+
+
+@pytest.fixture
+def dependency_cache(tmpdir):
+    return DependencyCache(cache_dir=tmpdir.strpath)
+
+
+def as_lines(dependencies):
+    return {
+        name: {
+            key: [record["line"] for record in records]
+            for key, records in entries.items()
+        }
+        for name, entries in dependencies.items()
+    }
+
+
+def read_dependencies(cache):
+    with open(cache._cache_file, "r") as fh:
+        return as_lines(json.load(fh)["dependencies"])
+
+
+def test_dependency_cache_writes_through(dependency_cache):
+    ireq = InstallRequirement.from_line("requests==2.19.1")
+    dependency_cache[ireq] = ["idna<2.8,>=2.5"]
+    assert read_dependencies(dependency_cache) == {
+        "requests": {"2.19.1": ["idna<2.8,>=2.5"]}
+    }
+    del dependency_cache[ireq]
+    assert read_dependencies(dependency_cache) == {"requests": {}}
+
+
+def test_dependency_cache_transaction_writes_once(dependency_cache):
+    first = InstallRequirement.from_line("requests==2.19.1")
+    second = InstallRequirement.from_line("six==1.11.0")
+    with dependency_cache.transaction():
+        dependency_cache[first] = ["idna<2.8,>=2.5"]
+        with dependency_cache.transaction():
+            dependency_cache[second] = []
+        assert not os.path.exists(dependency_cache._cache_file)
+        assert first in dependency_cache
+    assert read_dependencies(dependency_cache) == {
+        "requests": {"2.19.1": ["idna<2.8,>=2.5"]},
+        "six": {"1.11.0": []},
+    }
+
+
+def test_dependency_cache_transactions_are_per_thread(dependency_cache):
+    first = InstallRequirement.from_line("requests==2.19.1")
+    second = InstallRequirement.from_line("six==1.11.0")
+
+    def write_second():
+        dependency_cache[second] = []
+
+    with dependency_cache.transaction():
+        dependency_cache[first] = ["idna<2.8,>=2.5"]
+        thread = threading.Thread(target=write_second)
+        thread.start()
+        thread.join()
+        # Writes from other threads aren't held back by this transaction
+        assert read_dependencies(dependency_cache)["six"] == {"1.11.0": []}
+
+
+def test_dependency_cache_flush(dependency_cache):
+    ireq = InstallRequirement.from_line("six==1.11.0")
+    with dependency_cache.transaction():
+        dependency_cache[ireq] = []
+        dependency_cache.flush()
+        assert read_dependencies(dependency_cache) == {"six": {"1.11.0": []}}
+
+
+def test_dependency_cache_is_not_kept_alive(tmpdir):
+    cache = DependencyCache(cache_dir=tmpdir.strpath)
+    ref = weakref.ref(cache)
+    del cache
+    gc.collect()
+    assert ref() is None
+
+
+def test_sqlite_backend_round_trip(tmpdir):
+    cache = DependencyCache(cache_dir=tmpdir.strpath, backend="sqlite")
+    ireq = InstallRequirement.from_line("requests[security]==2.19.1")
+    assert ireq not in cache
+    cache[ireq] = ["idna<2.8,>=2.5"]
+    assert ireq in cache
+    assert cache[ireq] == ["idna<2.8,>=2.5"]
+    assert as_lines(cache.cache) == {"requests": {"2.19.1[security]": ["idna<2.8,>=2.5"]}}
+    del cache[ireq]
+    assert cache.get(ireq) is None
+    with pytest.raises(KeyError):
+        cache[ireq]
+
+
+def test_sqlite_backend_migrates_json_cache(tmpdir):
+    json_cache = DependencyCache(cache_dir=tmpdir.strpath)
+    ireq = InstallRequirement.from_line("six==1.11.0")
+    json_cache[ireq] = []
+    sqlite_cache = DependencyCache(cache_dir=tmpdir.strpath, backend="sqlite")
+    assert sqlite_cache[ireq] == []
+    assert os.path.exists(sqlite_cache.backend.path)
+
+
+def test_dependency_cache_merges_concurrent_writers(tmpdir):
+    first_cache = DependencyCache(cache_dir=tmpdir.strpath)
+    second_cache = DependencyCache(cache_dir=tmpdir.strpath)
+    first = InstallRequirement.from_line("requests==2.19.1")
+    second = InstallRequirement.from_line("six==1.11.0")
+    # Load both caches before either one writes
+    assert first not in second_cache
+    assert second not in first_cache
+    first_cache[first] = ["idna<2.8,>=2.5"]
+    second_cache[second] = []
+    assert read_dependencies(second_cache) == {
+        "requests": {"2.19.1": ["idna<2.8,>=2.5"]},
+        "six": {"1.11.0": []},
+    }
+    assert first in second_cache
+    del second_cache[first]
+    first_cache.read_cache()
+    assert first not in first_cache
+    assert second in first_cache
+
+
+@pytest.mark.parametrize("backend", ["sharded", "sharded-hash"])
+def test_sharded_backend(tmpdir, backend):
+    json_cache = DependencyCache(cache_dir=tmpdir.strpath)
+    six_ireq = InstallRequirement.from_line("six==1.11.0")
+    json_cache[six_ireq] = []
+    cache = DependencyCache(cache_dir=tmpdir.strpath, backend=backend)
+    ireq = InstallRequirement.from_line("Requests==2.19.1")
+    cache[ireq] = ["idna<2.8,>=2.5"]
+    assert cache[six_ireq] == []
+    assert cache[ireq] == ["idna<2.8,>=2.5"]
+    shard = cache.backend.shard("requests")
+    assert os.path.exists(shard.path)
+    if backend == "sharded":
+        assert os.path.basename(shard.path) == "requests.json"
+    reloaded = DependencyCache(cache_dir=tmpdir.strpath, backend=backend)
+    assert as_lines(reloaded.cache) == {
+        "requests": {"2.19.1": ["idna<2.8,>=2.5"]},
+        "six": {"1.11.0": []},
+    }
+
+
+def test_dependency_cache_prune_lru(tmpdir):
+    cache = DependencyCache(cache_dir=tmpdir.strpath, max_entries=2)
+    ireqs = [
+        InstallRequirement.from_line(line)
+        for line in ("six==1.11.0", "idna==2.7", "chardet==3.0.4")
+    ]
+    for ireq in ireqs:
+        cache[ireq] = []
+    # The first entry was used again most recently, the second one least recently
+    cache.access_log.set("six", "1.11.0", 3)
+    cache.access_log.set("idna", "2.7", 1)
+    cache.access_log.set("chardet", "3.0.4", 2)
+    assert cache.prune() == 1
+    assert ireqs[0] in cache
+    assert ireqs[1] not in cache
+    assert ireqs[2] in cache
+    cache.compact()
+    assert read_dependencies(cache) == {"chardet": {"3.0.4": []}, "six": {"1.11.0": []}}
+
+
+def test_dependency_cache_prune_max_age(tmpdir):
+    cache = DependencyCache(cache_dir=tmpdir.strpath)
+    ireq = InstallRequirement.from_line("six==1.11.0")
+    cache[ireq] = []
+    assert cache.prune(max_age=3600) == 0
+    cache.access_log.set("six", "1.11.0", 0)
+    assert cache.prune(max_age=3600) == 1
+    assert ireq not in cache
+
+
+def test_prune_directories(tmpdir):
+    from requirementslib.models.cache import prune_directories
+
+    old_file = tmpdir.join("pkgs", "old.whl")
+    old_file.write("x" * 10, ensure=True)
+    old_file.setmtime(0)
+    new_file = tmpdir.join("wheels", "new.whl")
+    new_file.write("x" * 10, ensure=True)
+    assert prune_directories([tmpdir.join("pkgs").strpath, tmpdir.join("wheels").strpath], max_size=15) == 10
+    assert not old_file.exists()
+    assert new_file.exists()
+
+
+@pytest.mark.parametrize("backend", ["json", "sqlite", "sharded"])
+def test_dependency_cache_reverse_index(tmpdir, backend):
+    cache = DependencyCache(cache_dir=tmpdir.strpath, backend=backend)
+    flake8 = InstallRequirement.from_line("flake8==2.4.0")
+    pep8 = InstallRequirement.from_line("pep8==1.5.7")
+    cache[flake8] = ["pep8>=1.5.7", "mccabe<0.4,>=0.2.1", "pyflakes<0.9,>=0.8.1"]
+    cache[pep8] = []
+    assert cache.dependents("Pep8") == [("flake8", "2.4.0")]
+    assert cache.reverse_dependencies([flake8, pep8]) == {
+        "pep8": {"flake8"}, "mccabe": {"flake8"}, "pyflakes": {"flake8"}
+    }
+    del cache[flake8]
+    assert cache.dependents("pep8") == []
+    cache[flake8] = ["pep8>=1.5.7"]
+    reloaded = DependencyCache(cache_dir=tmpdir.strpath, backend=backend)
+    assert reloaded.dependents("pep8") == [("flake8", "2.4.0")]
+    assert reloaded.dependents("mccabe") == []
+
+
+def test_dependency_cache_reverse_index_is_built_from_cache(tmpdir):
+    cache = DependencyCache(cache_dir=tmpdir.strpath)
+    cache[InstallRequirement.from_line("flake8==2.4.0")] = ["pep8>=1.5.7"]
+    os.remove(cache.reverse_index.path)
+    reloaded = DependencyCache(cache_dir=tmpdir.strpath)
+    assert reloaded.dependents("pep8") == [("flake8", "2.4.0")]
+
+
+@pytest.mark.parametrize("backend", ["json", "sharded"])
+def test_dependency_cache_reverse_index_follows_other_writers(tmpdir, backend):
+    cache = DependencyCache(cache_dir=tmpdir.strpath, backend=backend)
+    cache[InstallRequirement.from_line("flake8==2.4.0")] = ["pep8>=1.5.7"]
+    assert cache.dependents("pep8") == [("flake8", "2.4.0")]
+    # Something which doesn't know about the index writes to the cache
+    other = DependencyCache(cache_dir=tmpdir.strpath, backend=backend)
+    other.backend.set("autopep8", "1.4", [make_dependency_record("pep8>=1.5")])
+    other.flush()
+    reloaded = DependencyCache(cache_dir=tmpdir.strpath, backend=backend)
+    assert sorted(reloaded.dependents("pep8")) == [("autopep8", "1.4"), ("flake8", "2.4.0")]
+    # Writes which merge in the other entries bring the open index up to date
+    cache[InstallRequirement.from_line("six==1.11.0")] = []
+    assert sorted(cache.dependents("pep8")) == [("autopep8", "1.4"), ("flake8", "2.4.0")]
+
+
+
+@pytest.mark.parametrize("backend", ["json", "sqlite", "sharded"])
+def test_dependency_cache_reverse_index_is_updated_without_rebuilding(
+    tmpdir, backend, monkeypatch
+):
+    cache = DependencyCache(cache_dir=tmpdir.strpath, backend=backend)
+    cache[InstallRequirement.from_line("flake8==2.4.0")] = ["pep8>=1.5.7"]
+    assert cache.dependents("pep8") == [("flake8", "2.4.0")]
+    rebuilds = []
+    monkeypatch.setattr(
+        DependencyCache, "rebuild_reverse_index",
+        lambda self, reverse_index=None: rebuilds.append(self),
+    )
+    other = DependencyCache(cache_dir=tmpdir.strpath, backend=backend)
+    other[InstallRequirement.from_line("autopep8==1.4")] = ["pep8>=1.5"]
+    cache[InstallRequirement.from_line("six==1.11.0")] = []
+    expected = [("autopep8", "1.4"), ("flake8", "2.4.0")]
+    assert sorted(cache.dependents("pep8")) == expected
+    assert sorted(other.dependents("pep8")) == expected
+    assert rebuilds == []
+
+
+def test_make_dependency_record():
+    record = make_dependency_record('PySocks!=1.5.7,>=1.5.6; extra == "socks"')
+    assert record == {
+        "line": 'PySocks!=1.5.7,>=1.5.6; extra == "socks"',
+        "name": "pysocks",
+        "specifier": "!=1.5.7,>=1.5.6",
+        "extras": [],
+        "marker": 'extra == "socks"',
+        "has_extra_marker": True,
+    }
+    record = make_dependency_record('urllib3[secure]<1.24; python_version < "3.8"')
+    assert record["extras"] == ["secure"]
+    assert not record["has_extra_marker"]
+    with pytest.raises(ValueError):
+        make_dependency_record("-e git+https://github.com/requests/requests.git")
+
+
+def test_dependency_cache_keeps_unparsed_lines(dependency_cache):
+    ireq = InstallRequirement.from_line("pipenv==2018.11.26")
+    url = "https://github.com/sarugaku/vistir/archive/master.zip#egg=vistir"
+    dependency_cache[ireq] = [url, "six"]
+    assert dependency_cache[ireq] == [url, "six"]
+    assert dependency_cache.get_records(ireq)[0] == make_unparsed_dependency_record(url)
+    assert dependency_cache.dependents("six") == [("pipenv", "2018.11.26")]
+
+
+def test_dependency_cache_reads_format_1(tmpdir):
+    cache = DependencyCache(cache_dir=tmpdir.strpath)
+    with open(cache.backend.migrate_from, "w") as fh:
+        json.dump(
+            {"__format__": 1, "dependencies": {"flake8": {"2.4.0": ["pep8>=1.5.7"]}}}, fh
+        )
+    flake8 = InstallRequirement.from_line("flake8==2.4.0")
+    assert cache[flake8] == ["pep8>=1.5.7"]
+    assert cache.get_records(flake8)[0]["name"] == "pep8"
+    # Reads don't write, the converted entry is written with the next flush.
+    assert not os.path.exists(cache._cache_file)
+    cache.flush()
+    with open(cache._cache_file, "r") as fh:
+        doc = json.load(fh)
+    assert doc["__format__"] == 2
+    assert doc["dependencies"]["flake8"]["2.4.0"][0]["specifier"] == ">=1.5.7"
+
+
+def test_hash_cache_local_artifacts(tmpdir):
+    from pip_shims.shims import Link
+    from vistir.path import path_to_url
+
+    artifacts = []
+    for i in range(3):
+        artifact = tmpdir.join("pkg-{0}.tar.gz".format(i))
+        artifact.write("contents {0}".format(i))
+        artifacts.append(Link(path_to_url(artifact.strpath)))
+    hash_cache = HashCache(cache_dir=tmpdir.join("cache").strpath)
+    hashes = hash_cache.get_hashes(artifacts, max_workers=2)
+    assert len(set(hashes.values())) == 3
+    assert all(h.startswith("sha256:") for h in hashes.values())
+    cache_key = hash_cache.get_cache_key(artifacts[0])
+    assert hash_cache.get(cache_key).decode("utf-8") == hashes[artifacts[0]]
+    # A changed artifact gets a new cache key
+    tmpdir.join("pkg-0.tar.gz").write("new contents")
+    tmpdir.join("pkg-0.tar.gz").setmtime(0)
+    assert hash_cache.get_cache_key(artifacts[0]) != cache_key
+    assert hash_cache.get_hash(artifacts[0]) != hashes[artifacts[0]]
+
+
+def test_hash_cache_keys_without_head_requests(tmpdir):
+    from pip_shims.shims import Link
+    from requirementslib.models.snapshot import Snapshot, use_snapshot
+
+    class Session(object):
+        def head(self, url, **kwargs):
+            raise AssertionError("unexpected HEAD {0}".format(url))
+
+    hash_cache = HashCache(cache_dir=tmpdir.strpath, session=Session())
+    url = "https://files.pythonhosted.org/packages/ab/cd/six-1.11.0.tar.gz"
+    assert hash_cache.get_cache_key(Link(url)) == url
+    assert hash_cache.get_cache_key(
+        Link("https://example.com/six-1.11.0.tar.gz#sha256=abc")
+    ) == "https://example.com/six-1.11.0.tar.gz#sha256=abc"
+    with use_snapshot(Snapshot(tmpdir.join("snapshot").strpath)):
+        assert hash_cache.get_cache_key(Link("https://example.com/six.tar.gz")) is None
+
+
+def test_hash_cache_reuses_validators_of_the_download(tmpdir, monkeypatch):
+    import io
+    from pip_shims.shims import Link
+
+    class Response(io.BytesIO):
+        raw = None
+
+        def __init__(self, content, headers):
+            super(Response, self).__init__(content)
+            self.headers = headers
+
+        def raise_for_status(self):
+            pass
+
+    class Session(object):
+        etag = '"1"'
+
+        def __init__(self):
+            self.requests = []
+
+        def get(self, url, **kwargs):
+            self.requests.append("GET")
+            return Response(b"contents " + self.etag.encode(), {"ETag": self.etag})
+
+        def head(self, url, **kwargs):
+            self.requests.append("HEAD")
+            return Response(b"", {"ETag": self.etag})
+
+    session = Session()
+    hash_cache = HashCache(cache_dir=tmpdir.strpath, session=session, validators_ttl=60)
+    link = Link("https://example.com/six-1.11.0.tar.gz")
+    first = hash_cache.get_hash(link)
+    assert session.requests == ["GET"]
+    # Warm lookups trust the validators of the download until they expire
+    assert hash_cache.get_hash(link) == first
+    assert session.requests == ["GET"]
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 120)
+    assert hash_cache.get_hash(link) == first
+    assert session.requests == ["GET", "HEAD"]
+    assert hash_cache.get_hash(link) == first
+    assert session.requests == ["GET", "HEAD"]
+    # Changed content is noticed once the validators expire again
+    session.etag = '"2"'
+    monkeypatch.setattr(time, "time", lambda: now + 240)
+    assert hash_cache.get_hash(link) != first
+    assert session.requests == ["GET", "HEAD", "HEAD", "GET"]
+
+
+class FakeFinder(object):
+    def __init__(self, index_url, versions):
+        self.index_urls = [index_url]
+        self.find_links = []
+        self.versions = versions
+        self.lookups = []
+
+    def find_all_candidates(self, name):
+        self.lookups.append(name)
+        return [
+            make_installation_candidate(
+                name, version,
+                "{0}/{1}-{2}.tar.gz".format(self.index_urls[0], name, version), ">=2.7",
+            )
+            for version in self.versions
+        ]
+
+
+def test_candidate_index(tmpdir):
+    finder = FakeFinder("https://pypi.org/simple", ["1.0", "1.1"])
+    other_finder = FakeFinder("https://example.com/simple", ["2.0"])
+    index = CandidateIndex(ttl=0)
+    assert [str(c.version) for c in index.get_candidates(finder, "Six")] == ["1.0", "1.1"]
+    index.get_candidates(finder, "six")
+    assert finder.lookups == ["Six"]
+    assert [str(c.version) for c in index.get_candidates(other_finder, "six")] == ["2.0"]
+    index.get_candidates(finder, "six", all_wheels=True)
+    assert finder.lookups == ["Six", "six"]
+    assert len(index) == 3
+
+
+def test_candidate_index_persists_with_ttl(tmpdir):
+    finder = FakeFinder("https://pypi.org/simple", ["1.0", "1.1"])
+    cache = CandidateCache(cache_dir=tmpdir.strpath)
+    CandidateIndex(ttl=3600, cache=cache).get_candidates(finder, "six")
+    index = CandidateIndex(ttl=3600, cache=CandidateCache(cache_dir=tmpdir.strpath))
+    candidates = index.get_candidates(finder, "six")
+    assert finder.lookups == ["six"]
+    assert [str(c.version) for c in candidates] == ["1.0", "1.1"]
+    link = get_candidate_link(candidates[0])
+    assert link.url == "https://pypi.org/simple/six-1.0.tar.gz"
+    assert link.requires_python == ">=2.7"
+    expired = CandidateIndex(ttl=3600, cache=CandidateCache(cache_dir=tmpdir.strpath))
+    expired.cache.backend.get("six", next(iter(cache.cache["six"])))["fetched"] = 0
+    expired.get_candidates(finder, "six")
+    assert finder.lookups == ["six", "six"]
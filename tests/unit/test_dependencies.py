@@ -1,16 +1,36 @@
 # -*- coding=utf-8 -*-
+import json
+import os
+import sys
+import threading
+import time
+from multiprocessing.pool import ThreadPool
+
 import pytest
 from pip_shims import InstallRequirement
+from six.moves import BaseHTTPServer, socketserver
 
 import requirementslib
+from requirementslib.models import dependencies
+from requirementslib.models.cache import (
+    CandidateIndex, DependencyCache, make_installation_candidate
+)
 from requirementslib.models.dependencies import (
     AbstractDependency,
+    FinderPool,
+    ResolverContext,
+    candidate_index,
+    find_all_matches,
     get_abstract_dependencies,
     get_dependencies,
+    get_dependencies_from_cache,
     get_dependencies_from_index,
     get_dependencies_from_json,
+    get_pip_options,
+    prefetch_dependencies,
 )
 from requirementslib.models.requirements import Requirement
+from requirementslib.models.utils import find_all_candidates
 
 
 @pytest.mark.needs_internet
@@ -63,3 +83,311 @@ def test_get_editable_from_index():
     )
     deps = get_dependencies_from_index(r)
     assert len(deps) > 0
+
+
+def test_finder_pool_reuses_finders():
+    class FakeSession(object):
+        closed = False
+
+        def close(self):
+            self.closed = True
+
+    class FakeFinder(object):
+        def __init__(self):
+            self.session = FakeSession()
+
+    sources = [{"url": "https://pypi.org/simple/", "verify_ssl": True, "name": "pypi"}]
+    with FinderPool() as pool:
+        key = pool.get_key(sources)
+        assert key == pool.get_key([{"url": "https://pypi.org/simple", "name": "other"}])
+        assert key == pool.get_key(sources, get_pip_options(sources=sources))
+        finder = pool.get(key, FakeFinder)
+        assert pool.get(key, FakeFinder) is finder
+        other = pool.get(pool.get_key([{"url": "https://test.pypi.org/simple"}]), FakeFinder)
+        assert other is not finder
+        assert len(pool) == 2
+    assert finder.session.closed and other.session.closed
+    assert len(pool) == 0
+
+
+def test_index_markers_are_evaluated_in_the_target_environment():
+    from requirementslib.models.markers import TargetEnvironment
+
+    class RequirementSet(object):
+        def __init__(self):
+            self.requirements = []
+
+        def add_requirement(self, install_req, parent=None, extras_requested=None):
+            if install_req.match_markers(extras_requested):
+                self.requirements.append(install_req.name)
+
+    reqset = RequirementSet()
+    dependencies._match_markers_in(reqset, TargetEnvironment("2.7", "win32"))
+    for line in [
+        'enum34; python_version < "3.4"',
+        'pyobjc; sys_platform == "darwin"',
+        'pywin32; sys_platform == "win32" and extra == "win"',
+        "six",
+    ]:
+        ireq = InstallRequirement.from_line(line)
+        reqset.add_requirement(ireq, extras_requested=["win"])
+    assert reqset.requirements == ["enum34", "pywin32", "six"]
+
+
+def test_pooled_finders_are_found_without_parsing_options(monkeypatch, tmpdir):
+    calls = []
+    get_pip_options = dependencies.get_pip_options
+
+    def _get_pip_options(*args, **kwargs):
+        calls.append(kwargs.get("sources"))
+        return get_pip_options(*args, **kwargs)
+
+    class FakeSession(object):
+        def close(self):
+            pass
+
+    class FakeFinder(object):
+        session = FakeSession()
+
+    monkeypatch.setattr(dependencies, "get_pip_options", _get_pip_options)
+    sources = [{"url": "https://pypi.org/simple", "verify_ssl": True, "name": "pypi"}]
+    with FinderPool() as pool:
+        finder = pool.get(pool.get_key(sources), FakeFinder)
+        assert len(calls) == 1
+        for _ in range(3):
+            assert dependencies.get_finder(sources=sources, pool=pool) is finder
+        assert len(calls) == 1
+
+    cache = DependencyCache(cache_dir=tmpdir.strpath)
+    monkeypatch.setattr(dependencies, "DEPENDENCY_CACHE", cache)
+    ireq = InstallRequirement.from_line("six==1.12.0")
+    cache[ireq] = []
+    assert get_dependencies(ireq, sources=sources) == set()
+    assert len(calls) == 1
+
+
+def test_pooled_finder_lookups_are_serialized():
+    class Finder(object):
+        running = 0
+        overlapped = False
+
+        def find_all_candidates(self, name):
+            self.running += 1
+            self.overlapped = self.overlapped or self.running > 1
+            time.sleep(0.01)
+            self.running -= 1
+            return []
+
+    finder = Finder()
+    pool = ThreadPool(4)
+    try:
+        pool.map(lambda name: find_all_candidates(finder, name), ["a", "b", "c", "d"])
+    finally:
+        pool.close()
+        pool.join()
+    assert not finder.overlapped
+
+
+JSON_API_RELEASES = {
+    "/pypi/requests/2.19.1/json": {
+        "info": {
+            "requires_dist": [
+                "chardet (<3.1.0,>=3.0.2)",
+                "idna (<2.8,>=2.5)",
+                'PySocks (!=1.5.7,>=1.5.6); extra == "socks"',
+            ]
+        }
+    },
+    "/pypi/six/1.11.0/json": {"info": {"requires_dist": None}},
+}
+
+
+@pytest.fixture
+def json_api(monkeypatch, tmpdir):
+    requests_made = []
+
+    class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            requests_made.append(self.path)
+            release = JSON_API_RELEASES.get(self.path)
+            body = json.dumps(release or {"message": "Not Found"}).encode("utf-8")
+            self.send_response(200 if release else 404)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    class Server(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+        daemon_threads = True
+
+    server = Server(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    monkeypatch.setattr(
+        dependencies, "DEPENDENCY_CACHE", DependencyCache(cache_dir=tmpdir.strpath)
+    )
+    monkeypatch.setattr(
+        dependencies, "JSON_API_URL", "http://127.0.0.1:{0}/pypi".format(server.server_port)
+    )
+    yield requests_made
+    server.shutdown()
+    server.server_close()
+
+
+def test_get_dependencies_from_json_local_server(json_api):
+    ireq = InstallRequirement.from_line("requests==2.19.1")
+    expected = {"chardet<3.1.0,>=3.0.2", "idna<2.8,>=2.5"}
+    assert get_dependencies_from_json(ireq) == expected
+    assert get_dependencies_from_cache(ireq) == expected
+    assert json_api == ["/pypi/requests/2.19.1/json"]
+    assert get_dependencies_from_json(InstallRequirement.from_line("six")) is None
+    assert get_dependencies_from_json(InstallRequirement.from_line("missing==1.0")) is None
+
+
+def test_prefetch_dependencies(json_api):
+    ireqs = [
+        InstallRequirement.from_line(line)
+        for line in ("requests==2.19.1", "six==1.11.0", "missing==1.0", "idna>=2.5")
+    ]
+    assert prefetch_dependencies(ireqs, max_workers=2) == 2
+    assert sorted(json_api) == [
+        "/pypi/missing/1.0/json",
+        "/pypi/requests/2.19.1/json",
+        "/pypi/six/1.11.0/json",
+    ]
+    cache = dependencies.DEPENDENCY_CACHE
+    assert cache[ireqs[0]] == ["chardet<3.1.0,>=3.0.2", "idna<2.8,>=2.5"]
+    assert cache[ireqs[1]] == []
+    assert ireqs[2] not in cache
+    # Cached requirements are not fetched again
+    assert prefetch_dependencies(ireqs[:2]) == 0
+    assert len(json_api) == 3
+
+
+@pytest.mark.skipif(sys.version_info < (3, 5), reason="requires asyncio")
+def test_aget_dependencies_many(json_api, monkeypatch):
+    import asyncio
+    from requirementslib.models.async_dependencies import (
+        aget_dependencies, aget_dependencies_many
+    )
+
+    # Keep the local wheel cache out of the way
+    monkeypatch.setattr(
+        dependencies, "get_dependencies_from_wheel_cache", lambda ireq: None
+    )
+    ireqs = [
+        InstallRequirement.from_line(line)
+        for line in ("requests==2.19.1", "six==1.11.0")
+    ]
+    loop = asyncio.new_event_loop()
+    try:
+        results = loop.run_until_complete(aget_dependencies_many(ireqs, max_concurrency=2))
+        assert results == [{"chardet<3.1.0,>=3.0.2", "idna<2.8,>=2.5"}, set()]
+        # The second lookup is answered from the cache
+        deps = loop.run_until_complete(aget_dependencies(ireqs[0]))
+    finally:
+        loop.close()
+    assert deps == {"chardet<3.1.0,>=3.0.2", "idna<2.8,>=2.5"}
+    assert sorted(json_api) == ["/pypi/requests/2.19.1/json", "/pypi/six/1.11.0/json"]
+
+
+def test_find_all_matches_with_candidate_index():
+    class Finder(object):
+        index_urls = ["https://pypi.org/simple"]
+        lookups = 0
+
+        def find_all_candidates(self, name):
+            self.lookups += 1
+            return [
+                make_installation_candidate(
+                    name, version, "https://pypi.org/packages/six-{0}.tar.gz".format(version),
+                    None,
+                )
+                for version in ("1.10.0", "1.11.0", "1.12.0b1")
+            ]
+
+    finder = Finder()
+    with candidate_index() as index:
+        matches = find_all_matches(finder, InstallRequirement.from_line("six>=1.11"))
+        assert [str(c.version) for c in matches] == ["1.11.0"]
+        with candidate_index() as inner:
+            assert inner is index
+            matches = find_all_matches(finder, InstallRequirement.from_line("six<1.11"))
+        assert [str(c.version) for c in matches] == ["1.10.0"]
+    assert finder.lookups == 1
+    matches = find_all_matches(
+        finder, InstallRequirement.from_line("six"), pre=True, index=CandidateIndex(ttl=0)
+    )
+    assert len(matches) == 3
+    assert finder.lookups == 2
+
+
+def test_resolver_context_lifecycle():
+    class Finder(object):
+        session = None
+
+    finder = Finder()
+    assert ResolverContext.current() is None
+    with ResolverContext(finder=finder) as context:
+        assert ResolverContext.current() is context
+        assert context.matches(finder)
+        assert not context.matches(Finder())
+        assert not context.is_open
+        context.open()
+        tempdirs = list(context._tempdirs)
+        assert tempdirs and all(os.path.isdir(d) for d in tempdirs)
+        with ResolverContext(finder=Finder()) as inner:
+            assert ResolverContext.current() is inner
+        assert ResolverContext.current() is context
+        with context:
+            assert ResolverContext.current() is context
+        # Only the outermost block closes the context
+        assert context.is_open
+        other_thread = []
+        thread = threading.Thread(
+            target=lambda: other_thread.append(ResolverContext.current())
+        )
+        thread.start()
+        thread.join()
+        assert other_thread == [None]
+    assert ResolverContext.current() is None
+    assert not context.is_open
+    assert not any(os.path.exists(d) for d in tempdirs)
+
+
+def test_abstract_dependency_versions(monkeypatch):
+    class Finder(object):
+        index_urls = ["https://pypi.org/simple"]
+
+        def find_all_candidates(self, name):
+            return [
+                make_installation_candidate(
+                    name, version, "https://pypi.org/packages/six-{0}{1}".format(
+                        version, ext
+                    ),
+                )
+                for version, ext in (
+                    ("1.11.0", ".tar.gz"), ("1.9.0", ".tar.gz"),
+                    ("1.11.0", "-py2.py3-none-any.whl"), ("1.10.0", ".tar.gz"),
+                )
+            ]
+
+    monkeypatch.setattr(dependencies, "get_finder", lambda sources=None: Finder())
+    with candidate_index():
+        dep = AbstractDependency.from_requirement(Requirement.from_line("six>=1.9"))
+        other = AbstractDependency.from_requirement(Requirement.from_line("six<1.11"))
+    assert [str(v) for v in dep.versions] == ["1.9.0", "1.10.0", "1.11.0"]
+    assert [c.specifier for c in dep.candidates] == [v.specifier for v in (
+        InstallRequirement.from_line("six=={0}".format(v))
+        for v in ("1.9.0", "1.10.0", "1.11.0")
+    )]
+    assert dep.get_candidates(other.version_set) == dep.candidates[:2]
+    merged = dep.compatible_abstract_dep(other)
+    assert merged.candidates == dep.candidates[:2]
+    assert merged.versions == dep.versions[:2]
@@ -0,0 +1,177 @@
+# -*- coding=utf-8 -*-
+from __future__ import absolute_import, print_function
+
+import os
+import re
+import threading
+import zipfile
+
+import pytest
+import requests
+from pip_shims.shims import Link
+from six.moves import BaseHTTPServer, socketserver
+
+from requirementslib.models.lazy_wheel import (
+    HTTPRangeFile, HTTPRangeRequestUnsupported, get_remote_wheel_metadata,
+    get_requires_dist, read_wheel_metadata
+)
+
+METADATA = """\
+Metadata-Version: 2.1
+Name: example
+Version: 1.0
+Requires-Dist: six (>=1.0)
+Requires-Dist: PySocks (!=1.5.7,>=1.5.6) ; extra == 'socks'
+
+An example package.
+"""
+
+
+@pytest.fixture
+def wheel_server(tmpdir):
+    wheel_path = tmpdir.join("example-1.0-py2.py3-none-any.whl").strpath
+    with zipfile.ZipFile(wheel_path, "w") as wheel:
+        # A large incompressible payload in front of the metadata
+        wheel.writestr("example/data.bin", os.urandom(1024 * 1024))
+        wheel.writestr("example-1.0.dist-info/METADATA", METADATA)
+    with open(wheel_path, "rb") as fh:
+        wheel_bytes = fh.read()
+    files = {
+        "/example-1.0-py2.py3-none-any.whl": wheel_bytes,
+        "/example-1.0-py2.py3-none-any.whl.metadata": METADATA.encode("utf-8"),
+        "/no-ranges.whl": wheel_bytes,
+        "/ignores-ranges.whl": wheel_bytes,
+        "/no-length.whl": wheel_bytes,
+    }
+    transferred = []
+
+    class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _send(self, body):
+            content = files.get(self.path)
+            if content is None:
+                self.send_response(404)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            status = 200
+            match = re.match(r"bytes=(\d+)-(\d+)", self.headers.get("Range") or "")
+            if match and self.path not in ("/no-ranges.whl", "/ignores-ranges.whl"):
+                start, end = int(match.group(1)), int(match.group(2))
+                content = content[start:end + 1]
+                status = 206
+            self.send_response(status)
+            if self.path != "/no-ranges.whl":
+                self.send_header("Accept-Ranges", "bytes")
+            if body or self.path != "/no-length.whl":
+                self.send_header("Content-Length", str(len(content)))
+            self.end_headers()
+            if body:
+                transferred.append(len(content))
+                self.wfile.write(content)
+
+        def do_HEAD(self):
+            self._send(body=False)
+
+        def do_GET(self):
+            self._send(body=True)
+
+        def log_message(self, *args):
+            pass
+
+    class Server(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+        daemon_threads = True
+
+    server = Server(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    session = requests.session()
+    url = "http://127.0.0.1:{0}".format(server.server_port)
+    yield url, session, transferred, wheel_path
+    session.close()
+    server.shutdown()
+    server.server_close()
+
+
+def test_read_remote_wheel_metadata(wheel_server):
+    url, session, transferred, _ = wheel_server
+    link = Link("{0}/example-1.0-py2.py3-none-any.whl#sha256=abc".format(url))
+    metadata = get_remote_wheel_metadata(link, session)
+    assert get_requires_dist(metadata) == [
+        "six (>=1.0)", "PySocks (!=1.5.7,>=1.5.6) ; extra == 'socks'"
+    ]
+    assert 0 < sum(transferred) < 64 * 1024
+
+
+def test_http_range_file_reads_like_a_file(wheel_server):
+    url, session, _, wheel_path = wheel_server
+    fileobj = HTTPRangeFile(
+        "{0}/example-1.0-py2.py3-none-any.whl".format(url), session, chunk_size=1000
+    )
+    with open(wheel_path, "rb") as fh:
+        expected = fh.read()
+    assert fileobj.length == len(expected)
+    fileobj.seek(-2500, os.SEEK_END)
+    assert fileobj.read(1200) == expected[-2500:-1300]
+    fileobj.seek(10)
+    assert fileobj.read(5) == expected[10:15]
+    fileobj.seek(len(expected) - 2000)
+    assert fileobj.read() == expected[-2000:]
+    assert fileobj.read() == b""
+    assert fileobj.bytes_fetched < 5000
+    with open(wheel_path, "rb") as fh:
+        assert read_wheel_metadata(fh) == METADATA
+
+
+def test_http_range_file_requires_range_support(wheel_server):
+    url, session, _, _ = wheel_server
+    with pytest.raises(HTTPRangeRequestUnsupported):
+        HTTPRangeFile("{0}/no-ranges.whl".format(url), session)
+
+
+def test_http_range_file_requires_a_length(wheel_server):
+    url, session, _, _ = wheel_server
+    with pytest.raises(HTTPRangeRequestUnsupported):
+        HTTPRangeFile("{0}/no-length.whl".format(url), session)
+
+
+def test_http_range_file_stops_when_ranges_are_ignored(wheel_server):
+    url, session, _, _ = wheel_server
+    responses = []
+    session.hooks["response"].append(lambda response, **kwargs: responses.append(response))
+    fileobj = HTTPRangeFile("{0}/ignores-ranges.whl".format(url), session)
+    with pytest.raises(HTTPRangeRequestUnsupported):
+        fileobj.read(10)
+    assert responses[-1].status_code == 200
+    assert not responses[-1]._content_consumed
+    assert fileobj.bytes_fetched == 0
+
+
+def make_metadata_link(url):
+    """A link which advertises a standalone metadata file, as an index would."""
+    try:
+        from pip._internal.models.link import MetadataFile
+    except ImportError:
+        pass
+    else:
+        return Link(url, metadata_file_data=MetadataFile(None))
+    try:
+        return Link(url, dist_info_metadata="true")
+    except TypeError:
+        # pip before 22.3 doesn't parse it from the index at all
+        link = Link(url)
+        link.dist_info_metadata = "true"
+        return link
+
+
+def test_standalone_metadata_file(wheel_server):
+    url, session, transferred, _ = wheel_server
+    link = make_metadata_link("{0}/example-1.0-py2.py3-none-any.whl".format(url))
+    assert get_remote_wheel_metadata(link, session) == METADATA
+    assert transferred == [len(METADATA)]
+    # Without a metadata file on the server the wheel itself is read
+    link = make_metadata_link("{0}/no-ranges.whl".format(url))
+    with pytest.raises(HTTPRangeRequestUnsupported):
+        get_remote_wheel_metadata(link, session)
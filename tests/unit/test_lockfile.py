@@ -88,3 +88,31 @@ def test_lockfile_requirements(tmpdir):
     loaded = Lockfile.load(lockfile.strpath)
     assert isinstance(loaded.dev_requirements[0], Requirement)
     assert isinstance(loaded.dev_requirements_list[0], dict)
+
+
+def test_lockfile_pinned_versions(tmpdir):
+    from requirementslib import Lockfile
+    lockfile = tmpdir.join("Pipfile.lock")
+    lockfile.write(textwrap.dedent("""
+    {
+        "_meta": {
+            "hash": {"sha256": "0"},
+            "pipfile-spec": 6,
+            "requires": {},
+            "sources": [
+                {"name": "pypi", "url": "https://pypi.org/simple", "verify_ssl": true}
+            ]
+        },
+        "default": {
+            "Requests": {"version": "==2.19.1"},
+            "requirementslib": {"editable": true, "path": "."},
+            "six": {"git": "https://github.com/benjaminp/six.git", "ref": "1.11.0"}
+        },
+        "develop": {
+            "pytest": {"version": "==3.8.0"}
+        }
+    }
+    """.strip()))
+    loaded = Lockfile.load(lockfile.strpath)
+    assert loaded.get_pinned_versions() == {"requests": "2.19.1", "pytest": "3.8.0"}
+    assert loaded.get_pinned_versions(dev=False) == {"requests": "2.19.1"}
@@ -169,3 +169,40 @@ def test_get_pyversions(marker, pyversions):
 )
 def test_normalize_marker_str(marker, expected):
     assert requirementslib.models.markers.normalize_marker_str(marker) == expected
+
+
+def test_target_environment():
+    environment = requirementslib.models.markers.TargetEnvironment("2.7", "win32")
+    assert environment.name == "py2.7-win32"
+    assert environment.python_full_version == "2.7.0"
+    assert environment.evaluate('python_version < "3" and os_name == "nt"')
+    assert not environment.evaluate(Marker('platform_system == "Linux"'))
+    assert environment.evaluate(None)
+    assert environment.supports_python(">=2.7,!=3.0.*")
+    assert not environment.supports_python(">=3.5")
+    assert str(environment.as_marker()) == (
+        'python_version == "2.7" and sys_platform == "win32"'
+    )
+    environment.marker_environment["os_name"] = "posix"
+    assert environment.evaluate('os_name == "nt"')
+    assert environment == requirementslib.models.markers.TargetEnvironment("2.7", "win32")
+
+
+@pytest.mark.parametrize(
+    "filename, supported",
+    [
+        ("six-1.12.0-py2.py3-none-any.whl", True),
+        ("enum34-1.1.6-py3-none-any.whl", False),
+        ("pywin32-224-cp27-cp27m-win_amd64.whl", True),
+        ("pywin32-224-cp27-cp27m-win32.whl", False),
+        ("pywin32-224-cp37-cp37m-win_amd64.whl", False),
+        ("psutil-5.6.2-cp27-cp27mu-manylinux1_x86_64.whl", False),
+    ],
+)
+def test_target_environment_supports_wheel(filename, supported):
+    from pip_shims.shims import Wheel
+
+    environment = requirementslib.models.markers.TargetEnvironment(
+        "2.7", "win32", "AMD64", "cpython"
+    )
+    assert environment.supports_wheel(Wheel(filename)) is supported
@@ -0,0 +1,74 @@
+# -*- coding=utf-8 -*-
+from __future__ import absolute_import, print_function
+
+import json
+
+from pip_shims import InstallRequirement
+from vistir.compat import lru_cache
+
+from requirementslib.models.cache import DependencyCache
+from requirementslib.models.metrics import METRICS, MetricsRegistry
+
+
+def test_dependency_cache_metrics(tmpdir, monkeypatch):
+    METRICS.reset()
+    cache = DependencyCache(cache_dir=tmpdir.strpath, max_entries=1)
+    # Only the default cache reports its size, stand in for it.
+    monkeypatch.setattr(cache.metrics, "_size_source", None)
+    cache.metrics.track_size(cache)
+    six, idna = (
+        InstallRequirement.from_line(line) for line in ("six==1.11.0", "idna==2.7")
+    )
+    assert cache.get(six) is None
+    cache[six] = []
+    cache[idna] = []
+    assert cache[six] == []
+    assert cache.metrics is METRICS.get("dependencies")
+    assert cache.metrics.size == len(cache) == 2
+    DependencyCache(cache_dir=tmpdir.join("other").strpath)
+    assert cache.metrics.size == 2
+    cache.access_log.set("six", "1.11.0", 1)
+    cache.access_log.set("idna", "2.7", 2)
+    assert cache.prune() == 1
+    metrics = METRICS.as_dict()["dependencies"]
+    assert (metrics["hits"], metrics["misses"], metrics["evictions"]) == (1, 1, 1)
+    assert metrics["size"] == 1
+    assert metrics["hit_ratio"] == 0.5
+    assert metrics["timings"]["load"]["count"] == 1
+    assert metrics["timings"]["write"]["count"] >= 1
+    METRICS.reset()
+    assert METRICS.as_dict()["dependencies"]["hits"] == 0
+
+
+def test_metrics_registry_exports():
+    @lru_cache(maxsize=1)
+    def square(value):
+        return value * value
+
+    registry = MetricsRegistry()
+    registry.register_function_caches("test", {"__name__": __name__, "square": square})
+    metrics = registry.get("hashes")
+    metrics.hit(3)
+    metrics.miss()
+    metrics.record_time("load", 0.5)
+    for value in (1, 1, 2):
+        square(value)
+    exported = json.loads(registry.to_json())
+    assert exported["test.square"] == {
+        "hits": 1, "misses": 2, "evictions": 1, "timings": {}, "size": 1,
+        "max_size": 1, "hit_ratio": 1.0 / 3,
+    }
+    assert exported["hashes"]["hit_ratio"] == 0.75
+    assert exported["hashes"]["size"] is None
+    text = registry.to_prometheus()
+    assert "# TYPE requirementslib_cache_hits_total counter" in text
+    assert 'requirementslib_cache_hits_total{cache="hashes"} 3' in text
+    assert 'requirementslib_cache_size{cache="test.square"} 1' in text
+    assert 'requirementslib_cache_size{cache="hashes"}' not in text
+    assert (
+        'requirementslib_cache_operation_seconds_total{cache="hashes",operation="load"} 0.5'
+        in text
+    )
+    registry.reset()
+    square(3)
+    assert registry.as_dict()["test.square"]["evictions"] == 1
@@ -4,6 +4,7 @@ import os
 import pip_shims.shims
 import pytest
 from first import first
+from packaging.markers import Marker
 from vistir.compat import Path
 
 from requirementslib.exceptions import RequirementError
@@ -398,3 +399,69 @@ def test_pep_508():
     assert r.as_pipfile() == {
         "tablib": {"file": "https://codeload.github.com/kennethreitz/tablib/zip/v0.12.1"}
     }
+
+
+@pytest.mark.parametrize(
+    "line",
+    [
+        "six",
+        "Django>=1.11,<2.0",
+        "requests[security,socks] >= 2.19 , <3",
+        "pytz==2018.5 ; python_version >= '2.7' and os_name != 'nt'",
+        "six==1.11.0 --hash=sha256:{0} --hash=sha256:{1}".format("a" * 64, "b" * 64),
+    ],
+)
+def test_from_lines_named_requirements_match_from_line(line):
+    requirement = next(Requirement.from_lines([line]))
+    expected = Requirement.from_line(line)
+    assert requirement.as_line() == expected.as_line()
+    assert requirement.as_pipfile() == expected.as_pipfile()
+    assert requirement.hashes == expected.hashes
+
+
+def test_iter_from_file(tmpdir):
+    tmpdir.join("requirements.txt").write(
+        "# comment\n"
+        "--index-url https://pypi.org/simple\n"
+        "-r base/base.txt\n"
+        "six==1.11.0 \\\n"
+        "    --hash=sha256:{0}  # pinned\n"
+        "requests[security]>=2.19 ; os_name != 'nt' --install-option='--prefix=/x'\n"
+        "\n"
+        "-c base/constraints.txt\n".format("a" * 64)
+    )
+    base = tmpdir.mkdir("base")
+    base.join("base.txt").write("attrs>=19\n-r ../requirements.txt\n")
+    base.join("constraints.txt").write("idna==2.8\n")
+    requirements = Requirement.iter_from_file(tmpdir.join("requirements.txt").strpath)
+    assert [(r.as_line(), r.constraint) for r in requirements] == [
+        ("attrs>=19", False),
+        ("six==1.11.0 --hash=sha256:{0}".format("a" * 64), False),
+        ("requests[security]>=2.19 ; os_name != 'nt'", False),
+        ("idna==2.8", True),
+    ]
+    with pytest.raises(RequirementError, match="<lines>:2:"):
+        list(Requirement.from_lines(["six", "./not/a/project"]))
+
+
+def test_from_lines_markers_are_not_shared():
+    six, attrs = Requirement.from_lines(
+        ["six ; os_name == 'nt'", "attrs ; os_name == 'nt'"]
+    )
+    assert six.req.req.marker is not attrs.req.req.marker
+    six.req.req.marker._markers.extend(["and"] + Marker("extra == 'x'")._markers)
+    assert str(attrs.req.req.marker) == 'os_name == "nt"'
+    assert str(next(Requirement.from_lines(["six ; os_name == 'nt'"])).req.req.marker) == (
+        'os_name == "nt"'
+    )
+
+
+def test_from_lines_constraints_leave_from_line_alone(tmpdir):
+    # Not a plain named requirement, so it is parsed by the memoized from_line
+    tmpdir.join("constraints.txt").write("six (>=1.11.0)\n")
+    constraint, = Requirement.from_lines(["-c constraints.txt"], base_dir=tmpdir.strpath)
+    assert constraint.constraint
+    assert constraint.as_ireq().constraint
+    requirement = Requirement.from_line("six (>=1.11.0)")
+    assert not requirement.constraint
+    assert not requirement.as_ireq().constraint
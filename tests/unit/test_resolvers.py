@@ -0,0 +1,317 @@
+# -*- coding=utf-8 -*-
+from __future__ import absolute_import, print_function
+
+import pytest
+from packaging.specifiers import SpecifierSet
+from pip_shims import InstallRequirement
+
+from pip_shims.shims import Link
+
+from requirementslib.models.dependencies import AbstractDependency
+from requirementslib.models.markers import TargetEnvironment
+from requirementslib.models.requirements import Requirement
+from requirementslib.models.resolvers import (
+    BacktrackingEngine, DependencyResolver, ResolutionError
+)
+from requirementslib.models.utils import format_requirement, version_from_ireq
+
+
+class Index(object):
+    """An in-memory index mapping (name, version) to dependencies as
+    (name, [versions]) or (name, [versions], marker) tuples.
+
+    Versions which require a Python version are given as (version, requires_python).
+    The dependencies of each candidate are looked up once in each of *environments*.
+    """
+
+    def __init__(self, versions, dependencies, requires_python=None, environments=()):
+        self.versions = versions
+        self.dependencies = dependencies
+        self.requires_python = requires_python or {}
+        self.environments = environments
+        self.lookups = []
+
+    def make_dep(self, name, versions=None, markers=None):
+        if versions is None:
+            versions = self.versions[name]
+        candidates = []
+        for version in versions:
+            candidate = InstallRequirement.from_line("{0}=={1}".format(name, version))
+            candidate.req.link = Link(
+                "https://example.com/{0}-{1}.tar.gz".format(name, version),
+                requires_python=self.requires_python.get((name, version)),
+            )
+            candidates.append(candidate)
+        dep = AbstractDependency(
+            name=name, specifiers=SpecifierSet(), markers=markers,
+            candidates=candidates, requirement=Requirement.from_line(name),
+            parent=None, finder=None,
+        )
+        for candidate in candidates:
+            key = (name, version_from_ireq(candidate))
+            line = format_requirement(candidate)
+            dep.dep_dict[line] = LazyDeps(self, key)
+            for environment in self.environments:
+                dep.dep_dict[(environment.name, line)] = LazyDeps(self, key)
+        return dep
+
+
+class LazyDeps(object):
+    """Builds the abstract dependencies of a candidate when they are iterated."""
+
+    def __init__(self, index, key):
+        self.index = index
+        self.key = key
+
+    def __iter__(self):
+        self.index.lookups.append(self.key)
+        for dependency in self.index.dependencies.get(self.key, []):
+            yield self.index.make_dep(*dependency)
+
+
+def pins(pinned):
+    return {name: version_from_ireq(ireq) for name, ireq in pinned.items()}
+
+
+def test_backtracking_engine_backjumps():
+    index = Index(
+        versions={"a": ["1", "2"], "b": ["1"]},
+        dependencies={
+            ("a", "2"): [("x", ["1"])],
+            ("b", "1"): [("c", ["2", "3"])],
+            ("x", "1"): [("c", ["1"])],
+        },
+    )
+    engine = BacktrackingEngine()
+    resolved = engine.resolve([index.make_dep("a"), index.make_dep("b")])
+    assert pins(resolved) == {"a": "1", "b": "1", "c": "3"}
+    # a==2 only conflicts through x, which is learned once and not retried
+    assert engine.backtracks == 1
+    assert engine.incompatibilities == {
+        frozenset([("b", "b==1"), ("a", "a==2")])
+    }
+    assert index.lookups.count(("a", "2")) == 1
+
+
+def test_backtracking_engine_reports_conflicts():
+    index = Index(versions={}, dependencies={})
+    engine = BacktrackingEngine()
+    with pytest.raises(ResolutionError):
+        engine.resolve([index.make_dep("a", ["1", "2"]), index.make_dep("a", ["3"])])
+
+    index = Index(
+        versions={"a": ["1", "2"], "b": ["1", "2"]},
+        dependencies={
+            ("a", "1"): [("c", ["1"])],
+            ("a", "2"): [("c", ["1"])],
+            ("b", "1"): [("c", ["2"])],
+            ("b", "2"): [("c", ["2"])],
+        },
+    )
+    with pytest.raises(ResolutionError):
+        BacktrackingEngine().resolve([index.make_dep("a"), index.make_dep("b")])
+    with pytest.raises(RuntimeError):
+        BacktrackingEngine(max_backtracks=1).resolve(
+            [index.make_dep("a"), index.make_dep("b")]
+        )
+
+
+def test_dependency_resolver_uses_backtracking_engine():
+    index = Index(
+        versions={"a": ["1", "2"], "b": ["1", "2"]},
+        dependencies={
+            ("a", "2"): [("c", ["1"])],
+            ("b", "2"): [("c", ["2"])],
+            ("b", "1"): [("c", ["1", "2"])],
+        },
+    )
+    resolver = DependencyResolver(finder=object())
+    resolver.resolve([index.make_dep("a"), index.make_dep("b")])
+    assert pins(resolver.pinned_deps) == {"a": "2", "b": "1", "c": "1"}
+    assert sorted(resolver.dep_dict) == ["a", "b", "c"]
+    assert sorted(str(v) for v in resolver.candidate_dict["c"]) == ["1"]
+    # Both constraints on c are merged, not just the first one
+    assert [str(v) for v in resolver.dep_dict["c"].versions] == ["1"]
+    assert pins(resolver.pin_history[0]) == pins(resolver.pinned_deps)
+
+
+def test_backtracking_dep_dict_merges_constraints():
+    index = Index(
+        versions={"a": ["1"], "b": ["1"], "c": ["1", "2", "3", "4"]},
+        dependencies={
+            ("a", "1"): [("c", ["1", "2", "3"])],
+            ("b", "1"): [("c", ["2", "3", "4"])],
+        },
+    )
+    resolver = DependencyResolver(finder=object())
+    resolver.resolve([index.make_dep("a"), index.make_dep("b")])
+    assert pins(resolver.pinned_deps) == {"a": "1", "b": "1", "c": "3"}
+    assert sorted(str(v) for v in resolver.dep_dict["c"].versions) == ["2", "3"]
+
+
+def test_pin_deps_rolls_back_failed_pins():
+    index = Index(
+        versions={"a": ["1", "2"], "c": ["1", "2"]},
+        dependencies={("a", "2"): [("d", ["1", "2"]), ("c", ["3", "4"])]},
+    )
+    resolver = DependencyResolver(finder=object(), strategy="rounds")
+    a, c = index.make_dep("a"), index.make_dep("c")
+    resolver.add_abstract_dep(a)
+    resolver.add_abstract_dep(c)
+    resolver.pin_deps()
+    assert pins(resolver.pinned_deps) == {"a": "1", "c": "2"}
+    # d was added while trying a==2 and removed again when c conflicted
+    assert resolver.dep_dict == {"a": a, "c": c}
+    assert sorted(resolver.candidate_dict) == ["a", "c"]
+    assert resolver._journal == []
+
+
+@pytest.mark.parametrize("strategy", ["backtracking", "rounds"])
+def test_resolve_keeps_preferred_pins(strategy):
+    index = Index(versions={"a": ["1", "2", "3"], "b": ["1", "2"]}, dependencies={})
+    resolver = DependencyResolver(
+        finder=object(), strategy=strategy, preferred_pins={"a": "2", "b": "3"}
+    )
+    resolver.resolve([index.make_dep("a"), index.make_dep("b")])
+    # b==3 doesn't exist, so the newest version is used instead
+    assert pins(resolver.pinned_deps) == {"a": "2", "b": "2"}
+    assert ("a", "3") not in index.lookups
+
+
+def test_resolve_from_lockfile():
+    class Lockfile(object):
+        def get_pinned_versions(self, dev=True):
+            return {"a": "1", "b": "1", "old": "1"}
+
+    index = Index(
+        versions={"a": ["1", "2"], "b": ["1", "2"], "c": ["1", "2"]},
+        dependencies={("a", "1"): [("b", ["1", "2"])], ("c", "2"): [("b", ["2"])]},
+    )
+    engine = BacktrackingEngine(preferred={"a": "1", "b": "1"})
+    assert pins(engine.resolve([index.make_dep("a")])) == {"a": "1", "b": "1"}
+    resolver = DependencyResolver(finder=object())
+    resolver.resolve_from_lockfile([index.make_dep("a"), index.make_dep("c")], Lockfile())
+    assert pins(resolver.pinned_deps) == {"a": "1", "b": "2", "c": "2"}
+
+
+def test_resolve_for_environments():
+    environments = [
+        TargetEnvironment("2.7", "linux"),
+        TargetEnvironment("3.6", "linux"),
+        TargetEnvironment("3.6", "win32"),
+    ]
+    index = Index(
+        versions={"a": ["1", "2"], "b": ["1", "2"], "pywin": ["1"]},
+        dependencies={
+            ("a", "1"): [("b", ["1", "2"])],
+            ("a", "2"): [
+                ("b", ["1", "2"]), ("pywin", ["1"], 'sys_platform == "win32"')
+            ],
+        },
+        requires_python={("b", "2"): ">=3.5"},
+        environments=environments,
+    )
+    resolver = DependencyResolver(finder=object(), environments=environments)
+    resolver.resolve([index.make_dep("a")])
+    assert {
+        name: pins(pinned) for name, pinned in resolver.environment_pins.items()
+    } == {
+        "py2.7-linux": {"a": "2", "b": "1"},
+        "py3.6-linux": {"a": "2", "b": "2"},
+        "py3.6-win32": {"a": "2", "b": "2", "pywin": "1"},
+    }
+    # The dependencies of each candidate are looked up once in each environment
+    assert sorted(index.lookups) == [
+        ("a", "2"), ("a", "2"), ("a", "2"), ("b", "1"), ("b", "2"), ("b", "2"),
+        ("pywin", "1"),
+    ]
+    assert sorted(resolver.dep_dict) == ["a", "b", "pywin"]
+    assert sorted(resolver.environment_deps) == sorted(e.name for e in environments)
+    merged = resolver.merged_pins
+    assert sorted(merged) == ["a", "b", "pywin"]
+    assert [pin.markers for pin in merged["a"]] == [None]
+    assert [str(pin.markers) for pin in merged["b"]] == [
+        'python_version == "2.7" and sys_platform == "linux"',
+        '(python_version == "3.6" and sys_platform == "linux") or '
+        '(python_version == "3.6" and sys_platform == "win32")',
+    ]
+    assert [str(pin.markers) for pin in merged["pywin"]] == [
+        'python_version == "3.6" and sys_platform == "win32"'
+    ]
+    assert sorted(resolver.pinned_deps) == ["a", "b", "pywin"]
+    assert resolver.pinned_deps["b"] is merged["b"][0]
+    assert sorted((pin.name, version_from_ireq(pin)) for pin in resolver.iter_pins()) == [
+        ("a", "2"), ("b", "1"), ("b", "2"), ("pywin", "1")
+    ]
+    assert resolver.environment_pins["py2.7-linux"]["b"].markers is None
+
+
+def test_resolve_for_environments_merges_constraints():
+    environments = [TargetEnvironment("2.7", "linux"), TargetEnvironment("3.6", "linux")]
+    index = Index(
+        versions={"a": ["1"], "b": ["1"], "c": ["1", "2", "3", "4"]},
+        dependencies={
+            ("a", "1"): [("c", ["1", "2", "3"])],
+            ("b", "1"): [
+                ("c", ["2", "3", "4"]), ("c", ["1", "2", "3"], 'python_version < "3"')
+            ],
+        },
+        environments=environments,
+    )
+    resolver = DependencyResolver(finder=object(), environments=environments)
+    resolver.resolve([index.make_dep("a"), index.make_dep("b")])
+    assert [version_from_ireq(pin) for pin in resolver.merged_pins["c"]] == ["3"]
+    # Every constraint of every environment is part of the merged dependency
+    assert sorted(str(v) for v in resolver.dep_dict["c"].versions) == ["2", "3"]
+    for environment in environments:
+        deps = resolver.environment_deps[environment.name]
+        assert sorted(str(v) for v in deps["c"].versions) == ["2", "3"]
+
+
+def test_resolve_with_tracer():
+    from requirementslib.models.tracing import Tracer
+
+    index = Index(
+        versions={"a": ["1", "2"], "b": ["1"]},
+        dependencies={
+            ("a", "2"): [("x", ["1"])],
+            ("b", "1"): [("c", ["2", "3"])],
+            ("x", "1"): [("c", ["1"])],
+        },
+    )
+    tracer = Tracer()
+    resolver = DependencyResolver(finder=object(), tracer=tracer)
+    resolver.resolve([index.make_dep("a"), index.make_dep("b")])
+    assert tracer.counters["backtracks"] == 1
+    assert tracer.packages["x"] == {"candidates_tried": 1, "backtracks": 1}
+    assert tracer.packages["a"] == {"candidates_tried": 3}
+    assert [span["name"] for span in tracer.spans] == ["resolve"]
+
+
+def test_get_hashes_looks_candidates_up_before_hashing(monkeypatch):
+    import threading
+
+    class Candidate(object):
+        def __init__(self, location):
+            self.location = location
+
+    class HashCache(object):
+        def get_hashes(self, locations, max_workers=None):
+            self.max_workers = max_workers
+            return {location: "sha256:" + location for location in locations}
+
+    threads = []
+
+    def _get_hashable_candidates(ireq):
+        threads.append(threading.current_thread())
+        return [Candidate(ireq.name + ".whl"), Candidate(ireq.name + ".zip")]
+
+    resolver = DependencyResolver(finder=object(), hash_cache=HashCache())
+    monkeypatch.setattr(resolver, "_get_hashable_candidates", _get_hashable_candidates)
+    for name in ("a", "b"):
+        resolver.pinned_deps[name] = InstallRequirement.from_line("{0}==1".format(name))
+    assert resolver.get_hashes(max_workers=4) == {
+        "a": {"sha256:a.whl", "sha256:a.zip"}, "b": {"sha256:b.whl", "sha256:b.zip"}
+    }
+    assert threads == [threading.current_thread()] * 2
+    assert resolver.hash_cache.max_workers == 4
@@ -0,0 +1,103 @@
+# -*- coding=utf-8 -*-
+from __future__ import absolute_import, print_function
+
+import hashlib
+import os
+
+from pip_shims import InstallRequirement
+from vistir.path import path_to_url
+
+from requirementslib.models.cache import (
+    CandidateIndex, DependencyCache, HashCache, make_installation_candidate
+)
+from requirementslib.models import dependencies
+from requirementslib.models.dependencies import (
+    find_all_matches, get_dependencies_from_json, get_dependencies_from_snapshot
+)
+from requirementslib.models.resolvers import DependencyResolver
+from requirementslib.models.snapshot import (
+    Snapshot, export_snapshot, get_active_snapshot, use_snapshot
+)
+from requirementslib.models.utils import get_candidate_link
+
+
+class LocalFinder(object):
+    def __init__(self, directory):
+        self.find_links = [directory]
+        self.directory = directory
+
+    def find_all_candidates(self, name):
+        candidates = []
+        for filename in sorted(os.listdir(self.directory)):
+            version = filename.split("-")[1].replace(".tar.gz", "")
+            url = path_to_url(os.path.join(self.directory, filename))
+            candidates.append(make_installation_candidate(name, version, url))
+        return candidates
+
+
+def test_export_and_resolve_from_snapshot(tmpdir, monkeypatch):
+    remote = tmpdir.mkdir("remote")
+    remote.join("six-1.10.0.tar.gz").write_binary(b"old six")
+    remote.join("six-1.11.0-py2.py3-none-any.whl").write_binary(b"new six")
+    remote.join("six-1.11.0.tar.gz").write_binary(b"new six sdist")
+    remote.join("six-1.9.0.tar.gz").write_binary(b"older six")
+
+    dependency_cache = DependencyCache(cache_dir=tmpdir.join("cache").strpath)
+    monkeypatch.setattr(dependencies, "DEPENDENCY_CACHE", dependency_cache)
+    dependency_cache[InstallRequirement.from_line("six==1.11.0")] = []
+    dependency_cache[InstallRequirement.from_line("six==1.10.0")] = ["setuptools"]
+    resolver = DependencyResolver(
+        candidate_index=CandidateIndex(ttl=0),
+        hash_cache=HashCache(cache_dir=tmpdir.join("cache").strpath),
+    )
+    resolver.candidate_index.get_candidates(LocalFinder(remote.strpath), "six")
+    resolver.pinned_deps["six"] = InstallRequirement.from_line("six==1.11.0")
+
+    snapshot_dir = tmpdir.join("snapshot").strpath
+    export_snapshot(resolver, snapshot_dir, dependency_cache=dependency_cache)
+    assert sorted(os.listdir(os.path.join(snapshot_dir, "files"))) == [
+        "six-1.11.0-py2.py3-none-any.whl", "six-1.11.0.tar.gz"
+    ]
+
+    snapshot = Snapshot.load(snapshot_dir)
+    assert get_active_snapshot() is None
+    with use_snapshot(snapshot):
+        assert get_active_snapshot() is snapshot
+        matches = find_all_matches(None, InstallRequirement.from_line("six>=1.10"))
+        # 1.9.0 was never looked at, so it isn't part of the snapshot
+        assert sorted(str(c.version) for c in matches) == ["1.10.0", "1.11.0", "1.11.0"]
+        new_six = InstallRequirement.from_line("six==1.11.0")
+        assert get_dependencies_from_snapshot(new_six) == set()
+        assert get_dependencies_from_snapshot(
+            InstallRequirement.from_line("six==1.10.0")
+        ) == {"setuptools"}
+        assert get_dependencies_from_json(new_six) is None
+        wheel = [
+            get_candidate_link(c) for c in matches if get_candidate_link(c).is_wheel
+        ][0]
+        assert wheel.url.startswith(path_to_url(snapshot.files_dir))
+        expected = "sha256:{0}".format(hashlib.sha256(b"new six").hexdigest())
+        assert HashCache(cache_dir=tmpdir.join("cache").strpath).get_hash(wheel) == expected
+    assert get_active_snapshot() is None
+
+
+def test_snapshot_records_candidates_named_by_any_pip(tmpdir):
+    from pip_shims.shims import Link
+
+    class Candidate(object):
+        # Newer versions of pip name the project ``name``, not ``project``
+        def __init__(self, name, version, link):
+            self.name = name
+            self.version = version
+            self.link = link
+
+    snapshot = Snapshot(tmpdir.strpath)
+    snapshot.add_candidate(
+        Candidate("Six", "1.11.0", Link("https://example.com/six-1.11.0.tar.gz")),
+        download=False,
+    )
+    url = "https://example.com/six-1.10.0.tar.gz"
+    snapshot.add_candidate(
+        make_installation_candidate("six", "1.10.0", url), download=False
+    )
+    assert sorted(r["version"] for r in snapshot.projects["six"]) == ["1.10.0", "1.11.0"]
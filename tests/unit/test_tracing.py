@@ -0,0 +1,56 @@
+# -*- coding=utf-8 -*-
+from __future__ import absolute_import, print_function
+
+import json
+
+from pip_shims import InstallRequirement
+
+from requirementslib.models import dependencies
+from requirementslib.models.cache import DependencyCache
+from requirementslib.models.tracing import (
+    Tracer, get_active_tracer, trace_count, trace_span, use_tracer
+)
+
+
+def test_tracer_collects_spans_and_counters(tmpdir):
+    events = []
+    tracer = Tracer(callback=events.append)
+    with trace_span("ignored"):
+        trace_count("ignored")
+    with use_tracer(tracer):
+        assert get_active_tracer() is tracer
+        with trace_span("pin_deps", round=0):
+            with trace_span("get_deps", package="six"):
+                trace_count("candidates", 3, package="six")
+        trace_count("backtracks")
+    assert get_active_tracer() is None
+    assert [event["name"] for event in events] == [
+        "candidates", "get_deps", "pin_deps", "backtracks"
+    ]
+    assert tracer.counters == {"candidates": 3, "backtracks": 1}
+    assert tracer.packages == {"six": {"candidates": 3}}
+    assert sorted(tracer.get_timings()) == ["get_deps", "pin_deps"]
+    assert json.loads(tracer.to_json())["counters"] == tracer.counters
+
+    path = tmpdir.join("trace.json").strpath
+    tracer.write_chrome_trace(path)
+    with open(path) as fh:
+        trace = json.load(fh)
+    phases = [(event["name"], event["ph"]) for event in trace["traceEvents"]]
+    assert phases == [("get_deps", "X"), ("pin_deps", "X"), ("counters", "C")]
+    assert trace["traceEvents"][1]["args"] == {"round": 0}
+
+
+def test_trace_dependency_getters(tmpdir, monkeypatch):
+    cache = DependencyCache(cache_dir=tmpdir.strpath)
+    ireq = InstallRequirement.from_line("six==1.11.0")
+    cache[ireq] = ["setuptools"]
+    monkeypatch.setattr(dependencies, "DEPENDENCY_CACHE", cache)
+    tracer = Tracer()
+    with use_tracer(tracer):
+        assert dependencies.get_dependencies(ireq) == {"setuptools"}
+    assert tracer.counters == {
+        "get_dependencies_from_snapshot.miss": 1,
+        "get_dependencies_from_cache.hit": 1,
+    }
+    assert [span["category"] for span in tracer.spans] == ["dependencies"] * 2